@@ -39,6 +39,16 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
         This limits the maximum change that can happen for control points in between two calls of this object.
     my_spline : object
         Stores the beta spline object generated by control points.
+    precompute_spline_basis : boolean
+        If true, knots of the beta spline and the matrix mapping control points to spline coefficients are
+        computed once, and muscle torque magnitudes are evaluated from them at the current element positions.
+    spline_knots : numpy.ndarray
+        1D array containing data with 'float' type. Knots of the beta spline. Only computed if
+        precompute_spline_basis is true.
+    spline_coefficient_matrix : numpy.ndarray
+        2D (number_of_control_points+2, number_of_control_points+2) array containing data with 'float' type.
+        Spline coefficients are a matrix-vector product of this matrix and control points. Only computed if
+        precompute_spline_basis is true.
     """
 
     def __init__(
@@ -75,6 +85,12 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
             This limits the maximum change that can happen for control points in between two calls of this object.
         **kwargs
             Arbitrary keyword arguments.
+            * torque_profile_recorder : defaultdict(list)
+                Dictionary to store time-history of muscle torques and beta-spline.
+            * precompute_spline_basis : boolean
+                If true, knots and coefficient matrix of the spline are computed once and beta spline
+                object is not created again when control points change. Spline is evaluated at the
+                current element positions, same as the beta spline object. Default is False.
         """
         super(MuscleTorquesWithVaryingBetaSplines, self).__init__()
 
@@ -120,6 +136,16 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
         # so that code wont crash.
         self.initial_call_flag = 0
 
+        # Knot locations of the spline are fixed, so spline coefficients are linear in control point values.
+        # Knots and coefficient matrix are computed once and reused every time control points change.
+        self.precompute_spline_basis = kwargs.get("precompute_spline_basis", False)
+        if self.precompute_spline_basis:
+            (
+                self.spline_knots,
+                self.spline_coefficient_matrix,
+            ) = self.compute_spline_coefficient_matrix(self.points_cached[0])
+            self.torque_magnitude_cache = None
+
     def apply_torques(self, system, time: np.float = 0.0):
 
         # Check if RL algorithm changed the points we fit the spline at this time step
@@ -142,15 +168,31 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
                 self.max_rate_of_change_of_activation,
             )
 
-            self.my_spline = make_interp_spline(
-                self.points_cached[0], self.points_cached[1]
-            )
-            cumulative_lengths = np.cumsum(system.lengths)
+            if self.precompute_spline_basis:
+                if self.torque_magnitude_cache is None:
+                    self.torque_magnitude_cache = np.zeros(system.n_elems)
 
-            # Compute the muscle torque magnitude from the beta spline.
-            self.torque_magnitude_cache = self.muscle_torque_scale * self.my_spline(
-                cumulative_lengths
-            )
+                # Compute the muscle torque magnitude from the precomputed knots and coefficient matrix.
+                FusedMuscleTorquesWithVaryingBetaSplines.compute_torque_magnitude_from_basis(
+                    self.points_cached,
+                    self.spline_knots,
+                    self.spline_coefficient_matrix,
+                    system.lengths,
+                    np.array([self.muscle_torque_scale], dtype=np.float64),
+                    np.ones(1, dtype=np.bool_),
+                    self.torque_magnitude_cache.reshape(1, -1),
+                )
+
+            else:
+                self.my_spline = make_interp_spline(
+                    self.points_cached[0], self.points_cached[1]
+                )
+                cumulative_lengths = np.cumsum(system.lengths)
+
+                # Compute the muscle torque magnitude from the beta spline.
+                self.torque_magnitude_cache = self.muscle_torque_scale * self.my_spline(
+                    cumulative_lengths
+                )
 
         self.compute_muscle_torques(
             self.torque_magnitude_cache, self.direction, system.external_torques,
@@ -172,6 +214,33 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
 
         self.counter += 1
 
+    @staticmethod
+    def compute_spline_coefficient_matrix(control_point_positions):
+        """
+        This function computes the knots and the coefficient matrix of the beta spline. Each column
+        of the matrix is the coefficients of the spline generated by setting one control point to one
+        and others to zero. Thus spline coefficients are a matrix-vector product of this matrix and
+        control points.
+        Parameters
+        ----------
+        control_point_positions : numpy.ndarray
+            1D (number_of_control_points+2,) array containing data with 'float' type.
+            Position of control points along the rod.
+        Returns
+        -------
+        spline_knots : numpy.ndarray
+            1D array containing data with 'float' type.
+        spline_coefficient_matrix : numpy.ndarray
+            2D (number_of_control_points+2, number_of_control_points+2) array containing data with 'float' type.
+        """
+        basis_spline = make_interp_spline(
+            control_point_positions, np.eye(control_point_positions.shape[0])
+        )
+        return (
+            np.ascontiguousarray(basis_spline.t),
+            np.ascontiguousarray(basis_spline.c),
+        )
+
     @staticmethod
     @njit(cache=True)
     def compute_muscle_torques(torque_magnitude, direction, external_torques):
@@ -195,7 +264,7 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
             external_torques[direction, k] += torque_magnitude[k]
 
     @staticmethod
-    @numba.njit()
+    @njit(cache=True)
     def filter_activation(signal, input_signal, max_signal_rate_of_change):
         """
         Filters the input signal. If change in new signal (input signal) greater than
@@ -214,4 +283,372 @@ class MuscleTorquesWithVaryingBetaSplines(NoForces):
         signal_difference = input_signal - signal
         signal += np.sign(signal_difference) * np.minimum(
             max_signal_rate_of_change, np.abs(signal_difference)
-        )
\ No newline at end of file
+        )
+
+
+class FusedMuscleTorquesWithVaryingBetaSplines(NoForces):
+    """
+    This class compute the muscle torques in multiple directions using Beta splines.
+    It is equivalent to adding one MuscleTorquesWithVaryingBetaSplines for each direction,
+    but all directions share the same control point locations, so one spline (or one basis
+    matrix) is evaluated for all directions and torques are applied by a single Numba kernel.
+    Only the directions given by the user are applied, inactive directions should not be given.
+    Attributes
+    ----------
+    directions : numpy.ndarray
+        1D (n_directions,) array containing data with 'int' type.
+        Computed torques are applied in the directions of d1, d2, or d3, stored as 0, 1 or 2.
+    points_array_list : list
+        List of references to points_func_array variables, one for each direction.
+    base_length : float
+        Initial length of the arm.
+    muscle_torque_scale : numpy.ndarray
+        1D (n_directions,) array containing data with 'float' type.
+        Scaling factor for beta spline muscle torques in each direction.
+    torque_profile_recorder_list : list
+        List of defaultdict(list), one for each direction, to store time-history of muscle torques.
+    step_skip : int
+        Determines the data collection step.
+    counter : int
+        Used to determine the current call step of this object.
+    number_of_control_points : int
+        Number of control points used in beta spline. Note that these are the control points in the middle and there
+        are two more control points at the start and end of the rod, which are 0.
+    points_cached : numpy.ndarray
+        2D (n_directions+1, number_of_control_points+2) array containing data with 'float' type.
+        This array stores the location of control points in first row and in the following rows it stores the
+        values of control points selected at previous step for each direction.
+    max_rate_of_change_of_activation : float
+        This limits the maximum change that can happen for control points in between two calls of this object.
+    precompute_spline_basis : boolean
+        If true, knots of the beta spline and the matrix mapping control points to spline coefficients are
+        computed once, and muscle torque magnitudes are evaluated from them at the current element positions.
+    spline_knots : numpy.ndarray
+        1D array containing data with 'float' type. Knots of the beta spline. Only computed if
+        precompute_spline_basis is true.
+    spline_coefficient_matrix : numpy.ndarray
+        2D (number_of_control_points+2, number_of_control_points+2) array containing data with 'float' type.
+        Spline coefficients are a matrix-vector product of this matrix and control points. Only computed if
+        precompute_spline_basis is true.
+    torque_magnitude_cache : numpy.ndarray
+        2D (n_directions, n_elem) array containing data with 'float' type.
+        Muscle torque magnitudes in each direction.
+    """
+
+    def __init__(
+        self,
+        base_length,
+        number_of_control_points,
+        points_func_array_list,
+        muscle_torque_scale_list,
+        direction_list,
+        step_skip,
+        max_rate_of_change_of_activation=0.01,
+        **kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        base_length : float
+            Initial length of the arm.
+        number_of_control_points : int
+            Number of control points used in beta spline. Note that these are the control points in the middle and there
+            are two more control points at the start and end of the rod, which are 0.
+        points_func_array_list : list
+            List of numpy.ndarray or callable objects, one for each direction. Each of them stores the control points
+            selected by the controller.
+        muscle_torque_scale_list : list
+            List of scaling factors for beta spline muscle torques, one for each direction.
+        direction_list : list
+            List of directions, computed torques are applied in the "normal", "binormal", "tangent".
+        step_skip  : int
+            Determines the data collection step.
+        max_rate_of_change_of_activation : float
+            This limits the maximum change that can happen for control points in between two calls of this object.
+        **kwargs
+            Arbitrary keyword arguments.
+            * torque_profile_recorder_list : list
+                List of dictionaries, one for each direction, to store time-history of muscle torques.
+            * precompute_spline_basis : boolean
+                If true, knots and coefficient matrix of the spline are computed once. Spline is evaluated at
+                the current element positions, same as the beta spline object. Default is False.
+        """
+        super(FusedMuscleTorquesWithVaryingBetaSplines, self).__init__()
+
+        assert len(points_func_array_list) == len(direction_list) and len(
+            muscle_torque_scale_list
+        ) == len(direction_list), (
+            "Number of points_func_array, muscle_torque_scale and direction inputs should be same."
+        )
+
+        direction_indices = {"normal": 0, "binormal": 1, "tangent": 2}
+        for direction in direction_list:
+            if direction not in direction_indices:
+                raise NameError(
+                    "Please type normal, binormal or tangent as muscle torque direction. Input should be string."
+                )
+        self.directions = np.array(
+            [direction_indices[direction] for direction in direction_list], dtype=int
+        )
+        self.n_directions = self.directions.shape[0]
+
+        self.points_array_list = [
+            points_func_array
+            if hasattr(points_func_array, "__call__")
+            else (lambda points_func_array: lambda time_v: points_func_array)(
+                points_func_array
+            )
+            for points_func_array in points_func_array_list
+        ]
+
+        self.base_length = base_length
+        self.muscle_torque_scale = np.array(muscle_torque_scale_list, dtype=np.float64)
+
+        self.torque_profile_recorder_list = kwargs.get(
+            "torque_profile_recorder_list", [None for _ in range(self.n_directions)]
+        )
+        self.step_skip = step_skip
+        self.counter = 0  # for recording data from the muscles
+        self.number_of_control_points = number_of_control_points
+        self.points_cached = np.zeros(
+            (self.n_directions + 1, self.number_of_control_points + 2)
+        )  # This caches the control points. Note that first and last control points are zero.
+        self.points_cached[0, :] = np.linspace(
+            0, self.base_length, self.number_of_control_points + 2
+        )  # position of control points along the rod.
+
+        # Max rate of change of activation determines, maximum change in activation
+        # signal in one time-step.
+        self.max_rate_of_change_of_activation = max_rate_of_change_of_activation
+
+        # Purpose of this flag is to just generate spline even the control points are zero
+        # so that code wont crash.
+        self.initial_call_flag = 0
+
+        self.precompute_spline_basis = kwargs.get("precompute_spline_basis", False)
+        if self.precompute_spline_basis:
+            (
+                self.spline_knots,
+                self.spline_coefficient_matrix,
+            ) = MuscleTorquesWithVaryingBetaSplines.compute_spline_coefficient_matrix(
+                self.points_cached[0]
+            )
+
+    def apply_torques(self, system, time: np.float = 0.0):
+
+        # Check if RL algorithm changed the points of any direction at this time step.
+        # Spline is evaluated once for all directions, but only the torques of directions
+        # with changed points are updated, same as using one object for each direction.
+        points_changed = np.array(
+            [
+                not np.array_equal(
+                    self.points_cached[i + 1, 1:-1], self.points_array_list[i](time)
+                )
+                or self.initial_call_flag == 0
+                for i in range(self.n_directions)
+            ]
+        )
+
+        if points_changed.any():
+            if self.initial_call_flag == 0:
+                self.torque_magnitude_cache = np.zeros(
+                    (self.n_directions, system.n_elems)
+                )
+            self.initial_call_flag = 1
+
+            # Apply filter to the activation signal, to prevent drastic changes in activation signal.
+            for i in np.flatnonzero(points_changed):
+                MuscleTorquesWithVaryingBetaSplines.filter_activation(
+                    self.points_cached[i + 1, 1:-1],
+                    np.array((self.points_array_list[i](time))),
+                    self.max_rate_of_change_of_activation,
+                )
+
+            if self.precompute_spline_basis:
+                # Compute the muscle torque magnitudes from the precomputed knots and coefficient matrix.
+                self.compute_torque_magnitude_from_basis(
+                    self.points_cached,
+                    self.spline_knots,
+                    self.spline_coefficient_matrix,
+                    system.lengths,
+                    self.muscle_torque_scale,
+                    points_changed,
+                    self.torque_magnitude_cache,
+                )
+
+            else:
+                # One vector valued spline for all directions.
+                self.my_spline = make_interp_spline(
+                    self.points_cached[0], self.points_cached[1:].T
+                )
+                cumulative_lengths = np.cumsum(system.lengths)
+                torque_magnitude = self.my_spline(cumulative_lengths).T
+
+                # Compute the muscle torque magnitude from the beta spline.
+                self.torque_magnitude_cache[points_changed] = (
+                    self.muscle_torque_scale[points_changed].reshape(-1, 1)
+                    * torque_magnitude[points_changed]
+                )
+
+        self.compute_muscle_torques(
+            self.torque_magnitude_cache, self.directions, system.external_torques,
+        )
+
+        if self.counter % self.step_skip == 0:
+            for i in range(self.n_directions):
+                if self.torque_profile_recorder_list[i] is not None:
+                    self.torque_profile_recorder_list[i]["time"].append(time)
+
+                    self.torque_profile_recorder_list[i]["torque_mag"].append(
+                        self.torque_magnitude_cache[i].copy()
+                    )
+                    self.torque_profile_recorder_list[i]["torque"].append(
+                        system.external_torques.copy()
+                    )
+                    self.torque_profile_recorder_list[i]["element_position"].append(
+                        np.cumsum(system.lengths)
+                    )
+
+        self.counter += 1
+
+    @staticmethod
+    @njit(cache=True)
+    def compute_torque_magnitude_from_basis(
+        points_cached,
+        spline_knots,
+        spline_coefficient_matrix,
+        lengths,
+        muscle_torque_scale,
+        points_changed,
+        torque_magnitude,
+    ):
+        """
+        This Numba function computes the muscle torque magnitudes of directions with changed control points,
+        using the precomputed knots and coefficient matrix of the beta spline. Spline is evaluated at the
+        current element positions, cumulative sum of element lengths, same as the beta spline object.
+        Parameters
+        ----------
+        points_cached : numpy.ndarray
+            2D (n_directions+1, number_of_control_points+2) array containing data with 'float' type.
+            Location of control points in first row and values of control points of each direction in the
+            following rows.
+        spline_knots : numpy.ndarray
+            1D array containing data with 'float' type.
+        spline_coefficient_matrix : numpy.ndarray
+            2D (number_of_control_points+2, number_of_control_points+2) array containing data with 'float' type.
+        lengths : numpy.ndarray
+            1D (n_elem,) array containing data with 'float' type.
+            Current element lengths of the rod.
+        muscle_torque_scale : numpy.ndarray
+            1D (n_directions,) array containing data with 'float' type.
+        points_changed : numpy.ndarray
+            1D (n_directions,) array containing data with 'bool' type.
+        torque_magnitude : numpy.ndarray
+            2D (n_directions, n_elem) array containing data with 'float' type.
+            Computed muscle torque values, only rows of changed directions are updated.
+        Returns
+        -------
+        """
+
+        n_coefficients = spline_coefficient_matrix.shape[0]
+        n_points = spline_coefficient_matrix.shape[1]
+        degree = spline_knots.shape[0] - n_coefficients - 1
+
+        # Spline coefficients of changed directions.
+        coefficients = np.zeros((points_changed.shape[0], n_coefficients))
+        for i in range(points_changed.shape[0]):
+            if not points_changed[i]:
+                continue
+            for m in range(n_coefficients):
+                for j in range(n_points):
+                    coefficients[i, m] += (
+                        spline_coefficient_matrix[m, j] * points_cached[i + 1, j]
+                    )
+
+        basis = np.zeros(degree + 1)
+        left = np.zeros(degree + 1)
+        right = np.zeros(degree + 1)
+        element_position = 0.0
+        blocksize = lengths.shape[0]
+        for k in range(blocksize):
+            element_position += lengths[k]
+            interval = _evaluate_spline_basis(
+                spline_knots, degree, element_position, basis, left, right
+            )
+            for i in range(points_changed.shape[0]):
+                if not points_changed[i]:
+                    continue
+                spline_value = 0.0
+                for r in range(degree + 1):
+                    spline_value += coefficients[i, interval - degree + r] * basis[r]
+                torque_magnitude[i, k] = muscle_torque_scale[i] * spline_value
+
+    @staticmethod
+    @njit(cache=True)
+    def compute_muscle_torques(torque_magnitude, directions, external_torques):
+        """
+        This Numba function updates external torques in all given directions.
+        Parameters
+        ----------
+        torque_magnitude : numpy.ndarray
+            2D (n_directions, n_elem) array containing data with 'float' type.
+            Computed muscle torque values.
+        directions : numpy.ndarray
+            1D (n_directions,) array containing data with 'int' type.
+            Determines which component of torque vector updated for each direction.
+        external_torques : numpy.ndarray
+            2D (3, n_elem) array containing data with 'float' type.
+        Returns
+        -------
+        """
+
+        blocksize = torque_magnitude.shape[1]
+        for i in range(directions.shape[0]):
+            direction = directions[i]
+            for k in range(blocksize):
+                external_torques[direction, k] += torque_magnitude[i, k]
+
+
+@njit(cache=True)
+def _evaluate_spline_basis(knots, degree, position, basis, left, right):
+    """
+    This Numba function evaluates the non-zero B-spline basis functions at the given position, using the
+    Cox-de Boor recursion. Positions outside of the knots are extrapolated from the first or last polynomial
+    piece, same as scipy BSpline.
+    Parameters
+    ----------
+    knots : numpy.ndarray
+        1D array containing data with 'float' type.
+    degree : int
+        Degree of the spline.
+    position : float
+        Position along the rod where basis functions are evaluated.
+    basis : numpy.ndarray
+        1D (degree+1,) array containing data with 'float' type.
+        Values of the basis functions interval-degree, ..., interval.
+    left : numpy.ndarray
+        1D (degree+1,) array containing data with 'float' type. Work array.
+    right : numpy.ndarray
+        1D (degree+1,) array containing data with 'float' type. Work array.
+    Returns
+    -------
+    int
+        Index of the knot interval containing position.
+    """
+    n_coefficients = knots.shape[0] - degree - 1
+    interval = degree
+    while interval < n_coefficients - 1 and position >= knots[interval + 1]:
+        interval += 1
+
+    basis[0] = 1.0
+    for j in range(1, degree + 1):
+        left[j] = position - knots[interval + 1 - j]
+        right[j] = knots[interval + j] - position
+        saved = 0.0
+        for r in range(j):
+            temp = basis[r] / (right[r + 1] + left[j - r])
+            basis[r] = saved + right[r + 1] * temp
+            saved = left[j - r] * temp
+        basis[j] = saved
+
+    return interval
@@ -5,8 +5,6 @@ import numpy as np
 import sys
 
 import argparse
-import matplotlib
-import matplotlib.pyplot as plt
 
 # Import stable baseline
 from stable_baselines.bench.monitor import Monitor, load_results
@@ -14,10 +12,19 @@ from stable_baselines.common.policies import MlpPolicy
 from stable_baselines.ddpg.policies import MlpPolicy as MlpPolicy_DDPG
 from stable_baselines.td3.policies import MlpPolicy as MlpPolicy_TD3
 from stable_baselines.sac.policies import MlpPolicy as MlpPolicy_SAC
-from stable_baselines import TRPO, DDPG, PPO1, TD3, SAC
+from stable_baselines import TRPO, DDPG, PPO1, PPO2, TD3, SAC
+
+# Numba kernels are loaded from the cache directory shared by all cases, it is set before the environment is
+# imported. Run numba_warm_up.py once to compile them.
+from numba_warm_up import set_cache_directory
+
+set_cache_directory()
 
 # Import simulation environment
 from set_environment import Environment
+from sweep_scheduler import get_stop_callback
+from batched_environment import BatchedEnvironment
+from shared_memory_vec_env import SharedMemoryVecEnv
 
 
 def get_valid_filename(s):
@@ -44,6 +51,9 @@ def plot_results(log_folder, title="Learning Curve"):
     :param log_folder: (str) the save location of the results to plot
     :param title: (str) the title of the task to plot
     """
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import ts2xy
+
     x, y = ts2xy(load_results(log_folder), "timesteps")
     y = moving_average(y, window=50)
     # Truncate x
@@ -76,6 +86,19 @@ parser.add_argument(
     "--algo_name", type=str, default="TRPO",
 )
 
+parser.add_argument(
+    "--n_batched_envs", type=int, default=1,
+)
+
+parser.add_argument(
+    "--n_envs", type=int, default=1,
+)
+
+# Verbosity of the messages of training environments, see Environment.
+parser.add_argument(
+    "--verbosity", type=str, default="summary",
+)
+
 args = parser.parse_args()
 
 if args.algo_name == "TRPO":
@@ -104,6 +127,21 @@ elif args.algo_name == "SAC":
     batchsize = "train_freq"
     offpolicy = True
 
+# Number of environments collecting rollouts for one policy update.
+n_vec_envs = max(args.n_batched_envs, args.n_envs)
+if n_vec_envs > 1:
+    # Batched environment and worker pool are vectorized environments, PPO2 is the only
+    # algorithm used here that supports vectorized environments.
+    if args.algo_name != "PPO":
+        raise ValueError(
+            "Vectorized environments are only supported with PPO, not "
+            + args.algo_name
+        )
+    if args.n_batched_envs > 1 and args.n_envs > 1:
+        raise ValueError("Use either n_batched_envs or n_envs, not both.")
+    algo = PPO2
+    batchsize = "n_steps"
+
 # Mode 2 corresponds to fixed rotated fixed target
 args.mode = 2
 
@@ -128,7 +166,7 @@ print("rate of change", max_rate_of_change_of_activation)
 # If True, train. Otherwise run trained policy
 args.TRAIN = True
 
-env = Environment(
+env_kwargs = dict(
     final_time=final_time,
     num_steps_per_update=num_steps_per_update,
     number_of_control_points=number_of_control_points,
@@ -145,6 +183,11 @@ env = Environment(
     NU=30,
     dim=3.5,
     max_rate_of_change_of_activation=max_rate_of_change_of_activation,
+    precompute_spline_basis=True,
+    reuse_simulator=True,
+    block_integration=True,
+    rollback_on_nan=True,
+    verbosity=args.verbosity if args.TRAIN else "verbose",
 )
 
 name = str(args.algo_name) + "_3d-tracking_id"
@@ -153,11 +196,27 @@ identifer = name + "-" + str(args.timesteps_per_batch) + "_" + str(args.SEED)
 if args.TRAIN:
     log_dir = "./log_" + identifer + "/"
     os.makedirs(log_dir, exist_ok=True)
-    env = Monitor(env, log_dir)
-
-
-from stable_baselines.results_plotter import ts2xy, plot_results
-from stable_baselines import results_plotter
+    if args.n_batched_envs > 1:
+        env = BatchedEnvironment(
+            args.n_batched_envs, monitor_dir=log_dir, seed=args.SEED, **env_kwargs
+        )
+    elif args.n_envs > 1:
+        # Each worker writes its own <rank>.monitor.csv in log_dir.
+        env = SharedMemoryVecEnv(
+            args.n_envs,
+            seed=args.SEED,
+            monitor_dir=log_dir,
+            **env_kwargs
+        )
+    else:
+        # Metrics of the episodes are written as extra columns of the monitor file.
+        env = Monitor(
+            Environment(seed=args.SEED, **env_kwargs),
+            log_dir,
+            info_keywords=Environment.episode_metric_names,
+        )
+else:
+    env = Environment(seed=args.SEED, **env_kwargs)
 
 if args.TRAIN:
     if offpolicy:
@@ -177,11 +236,23 @@ if args.TRAIN:
             "policy": MLP,
             batchsize: args.timesteps_per_batch,
         }
+        if n_vec_envs > 1:
+            # PPO2 collects n_steps transitions from each environment.
+            items[batchsize] = args.timesteps_per_batch // n_vec_envs
 
     model = algo(env=env, verbose=1, seed=args.SEED, **items)
     model.set_env(env)
 
-    model.learn(total_timesteps=int(args.total_timesteps))
+    # If this command is run by a sweep with pruning, training stops when its configuration is pruned.
+    model.learn(
+        total_timesteps=int(args.total_timesteps),
+        callback=get_stop_callback(log_dir),
+    )
+    # Plotting modules are imported after training, so training processes do not import matplotlib.
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import plot_results
+    from stable_baselines import results_plotter
+
     # library helper
     plot_results(
         [log_dir],
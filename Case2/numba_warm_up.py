@@ -0,0 +1,97 @@
+__doc__ = """This file is for compiling the Numba kernels of the environment ahead of training. Kernels of Elastica and
+of this repo are compiled with cache=True, so compiled code is stored on disk and loaded by other processes. Numba
+compiles a kernel for the types it is called with, so kernels are compiled by running a short episode with the
+options of the training script, see set_environment.warm_up_environment. Compiled kernels are stored in a cache
+directory shared by all cases and all processes. Run this file once before training to fill the cache, i.e.
+python numba_warm_up.py --cache_directory ~/.cache/elastica_rl_control/numba
+then new processes load kernels from the cache instead of compiling them, and after warm_up is called in a
+process, first reset and step of a new environment do not compile or load any kernel."""
+
+import argparse
+import os
+import sys
+import time
+
+# Numba reads the cache directory from this environment variable, processes started afterwards inherit it.
+CACHE_DIRECTORY_VARIABLE = "NUMBA_CACHE_DIR"
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "elastica_rl_control", "numba"
+)
+
+
+def set_cache_directory(cache_directory=None):
+    """
+    This function sets the Numba cache directory of this process and of the processes started by it, and
+    returns it. Cache directory of a kernel is chosen when the kernel is defined, so this function has to be
+    called before Elastica and the environment are imported.
+
+    Parameters
+    ----------
+    cache_directory : str
+        If None, NUMBA_CACHE_DIR is used if it is set, otherwise DEFAULT_CACHE_DIRECTORY. Default is None.
+
+    Returns
+    -------
+    str
+
+    """
+    if cache_directory is None:
+        cache_directory = os.environ.get(
+            CACHE_DIRECTORY_VARIABLE, DEFAULT_CACHE_DIRECTORY
+        )
+    cache_directory = os.path.abspath(os.path.expanduser(cache_directory))
+    os.makedirs(cache_directory, exist_ok=True)
+    os.environ[CACHE_DIRECTORY_VARIABLE] = cache_directory
+
+    numba_config = sys.modules.get("numba.core.config")
+    if numba_config is not None and numba_config.CACHE_DIR != cache_directory:
+        numba_config.CACHE_DIR = cache_directory
+        if "elastica" in sys.modules:
+            print(
+                "Numba cache directory is set after elastica is imported, kernels which are already "
+                "defined are cached in their previous directory."
+            )
+    return cache_directory
+
+
+def warm_up(n_steps=2, **kwargs):
+    """
+    This function compiles the kernels used by the environment of this case, or loads them from the cache, and
+    returns the time it takes. It is called by sweep workers before they take commands.
+
+    Parameters
+    ----------
+    n_steps : int
+        Number of steps of the warm-up episode. Default is 2.
+    kwargs
+        Options overriding the options of the warm-up environment.
+
+    Returns
+    -------
+    float
+
+    """
+    start = time.time()
+    # Environment is imported here, so the cache directory can be set before.
+    from set_environment import warm_up_environment
+
+    warm_up_environment(n_steps, **kwargs)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cache_directory", type=str, default=None,
+    )
+    parser.add_argument(
+        "--n_steps", type=int, default=2,
+    )
+    args = parser.parse_args()
+
+    print("Numba cache directory: " + set_cache_directory(args.cache_directory))
+    print("Kernels are compiled or loaded in %0.3f seconds" % warm_up(args.n_steps))
+    print(
+        "First reset and step of a new environment take %0.3f seconds"
+        % warm_up(args.n_steps)
+    )
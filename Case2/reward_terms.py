@@ -0,0 +1,124 @@
+__doc__ = """This file is for reward shaping terms computed over the whole arm. Distances of all nodes to the target are
+computed in a single Numba kernel, so adding shaping terms does not add Python loops over nodes to the step. This
+case has no obstacles, so there are no obstacle terms."""
+
+import numpy as np
+from numba import njit
+
+# Names of the reward terms, in the order of the weights and values arrays.
+REWARD_TERMS = (
+    "tip_distance",  # distance between the arm tip and the target
+    "mean_node_distance",  # mean distance between arm nodes and the target
+    "max_node_distance",  # largest distance between arm nodes and the target
+)
+
+
+class RewardTerms:
+    """
+    Weighted sum of reward shaping terms. Term values are computed every step from the arm positions, and reward
+    is the sum of the values multiplied by their weights. Node distances are computed together in one pass over
+    the nodes.
+
+    Attributes
+    ----------
+    weights : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Weights of the terms in REWARD_TERMS.
+    values : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Values of the terms at the last compute call.
+    """
+
+    def __init__(self, weights):
+        """
+
+        Parameters
+        ----------
+        weights : dict
+            Weight of each term, names are in REWARD_TERMS. Terms which are not given have zero weight.
+        """
+        unknown_terms = set(weights) - set(REWARD_TERMS)
+        if unknown_terms:
+            raise ValueError(
+                "Unknown reward terms "
+                + ", ".join(sorted(unknown_terms))
+                + ", reward terms are "
+                + ", ".join(REWARD_TERMS)
+            )
+        self.weights = np.array(
+            [float(weights.get(name, 0.0)) for name in REWARD_TERMS]
+        )
+        self.values = np.zeros(len(REWARD_TERMS))
+
+    def compute(self, position_collection, target_position):
+        """
+        This method computes values of the terms and returns the weighted sum of them.
+
+        Parameters
+        ----------
+        position_collection : numpy.ndarray
+            2D (3, n_nodes) array containing data with 'float' type. Positions of the arm nodes.
+        target_position : numpy.ndarray
+            1D (3,) array containing data with 'float' type.
+
+        Returns
+        -------
+        float
+
+        """
+        return _compute_reward_terms(
+            position_collection, target_position, self.weights, self.values
+        )
+
+    def get_values(self):
+        """
+        Returns values of the terms at the last compute call.
+
+        Returns
+        -------
+        dict
+
+        """
+        return dict(zip(REWARD_TERMS, self.values.tolist()))
+
+
+@njit(cache=True)
+def _compute_reward_terms(position_collection, target_position, weights, values):
+    """
+    This function computes values of the reward terms in the order of REWARD_TERMS and returns their weighted sum.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    target_position : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    weights : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type.
+    values : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Values of the terms are written in this array.
+
+    Returns
+    -------
+    float
+
+    """
+    n_nodes = position_collection.shape[1]
+    distance = 0.0
+    distance_sum = 0.0
+    max_distance = 0.0
+    for j in range(n_nodes):
+        distance = np.sqrt(
+            (position_collection[0, j] - target_position[0]) ** 2
+            + (position_collection[1, j] - target_position[1]) ** 2
+            + (position_collection[2, j] - target_position[2]) ** 2
+        )
+        distance_sum += distance
+        if distance > max_distance:
+            max_distance = distance
+    values[0] = distance
+    values[1] = distance_sum / n_nodes
+    values[2] = max_distance
+
+    reward = 0.0
+    for k in range(values.shape[0]):
+        reward += weights[k] * values[k]
+    return reward
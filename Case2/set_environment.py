@@ -10,10 +10,20 @@ from gym import spaces
 import copy
 import sys
 
-from post_processing import plot_video_with_sphere, plot_video_with_sphere_2D
 
 from MuscleTorquesWithBspline.BsplineMuscleTorques import (
-    MuscleTorquesWithVaryingBetaSplines,
+    FusedMuscleTorquesWithVaryingBetaSplines,
+)
+from block_integrator import BlockIntegrator
+from columnar_recorder import ColumnarRecorder
+from step_profiler import StepProfiler
+from environment_log import EnvironmentLog
+from random_streams import get_seed_sequence
+from reward_terms import RewardTerms
+from stable_time_step import (
+    check_divergence,
+    compute_contact_stiffness,
+    compute_stable_time_step,
 )
 
 from elastica._calculus import _isnan_check
@@ -25,6 +35,114 @@ class BaseSimulator(BaseSystemCollection, Constraints, Connections, Forcing, Cal
     pass
 
 
+def save_state(obj, copy_dictionaries=True):
+    """
+    Returns copies of array, scalar and dictionary attributes of an object, which can
+    be restored in place by restore_state.
+
+    Parameters
+    ----------
+    obj : object
+        Elastica system, forcing, constraint, connection or call back object.
+    copy_dictionaries : bool
+        If false, dictionary attributes are not copied. Default is True.
+
+    Returns
+    -------
+    dict
+        Copies of attributes of the object.
+    """
+    state = {}
+    for name, value in vars(obj).items():
+        if isinstance(value, np.ndarray):
+            state[name] = value.copy()
+        elif isinstance(value, dict):
+            if copy_dictionaries:
+                state[name] = copy.deepcopy(value)
+        elif value is None or isinstance(value, (bool, int, float, np.number)):
+            state[name] = value
+    return state
+
+
+def get_recorders(obj):
+    """
+    Returns dictionaries and columnar recorders of an object, in which call backs and muscle torques record data.
+
+    Parameters
+    ----------
+    obj : object
+        Elastica system, forcing, constraint, connection or call back object.
+
+    Returns
+    -------
+    list
+        Dictionary and ColumnarRecorder attributes of the object and dictionaries in list attributes of the
+        object.
+    """
+    recorders = []
+    for value in vars(obj).values():
+        if isinstance(value, (dict, ColumnarRecorder)):
+            recorders.append(value)
+        elif isinstance(value, list):
+            recorders.extend(item for item in value if isinstance(item, dict))
+    return recorders
+
+
+def restore_state(obj, state):
+    """
+    Restores attributes of an object saved by save_state. Arrays and dictionaries are
+    restored in place, since they can be views or referenced by other objects.
+
+    Parameters
+    ----------
+    obj : object
+        Elastica system, forcing, constraint, connection or call back object.
+    state : dict
+        Copies of attributes of the object returned by save_state.
+
+    Returns
+    -------
+
+    """
+    for name, value in state.items():
+        current = getattr(obj, name, None)
+        if isinstance(value, np.ndarray) and isinstance(current, np.ndarray):
+            current[...] = value
+        elif isinstance(value, dict) and isinstance(current, dict):
+            current.clear()
+            current.update(copy.deepcopy(value))
+        else:
+            setattr(obj, name, copy.copy(value))
+
+
+def compute_norm_and_direction(vector, norm_buffer, out):
+    """
+    Writes norm and direction of a vector to out without creating temporary arrays. Direction is zero if
+    norm is zero. Vector is copied to norm_buffer, a contiguous array, so the norm is same as numpy.linalg.norm.
+
+    Parameters
+    ----------
+    vector : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    norm_buffer : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    out : numpy.ndarray
+        1D (4,) array containing data with 'float' type. Norm is written to the first element and direction
+        to the rest.
+
+    Returns
+    -------
+
+    """
+    norm_buffer[:] = vector
+    norm = np.sqrt(norm_buffer.dot(norm_buffer))
+    out[0] = norm
+    if norm != 0.0:
+        np.divide(norm_buffer, norm, out=out[1:])
+    else:
+        out[1:] = 0.0
+
+
 class Environment(gym.Env):
     """
 
@@ -72,6 +190,12 @@ class Environment(gym.Env):
     observation_space : spaces.Box
         1D ( total_number_of_states,) array containing data with 'float' type.
         State information of the systems are stored in this variable.
+    observation_buffer : numpy.ndarray
+        1D ( total_number_of_states,) array containing data with 'float' type.
+        Preallocated array that get_state writes the state information into.
+    rod_state_indices : numpy.ndarray
+        1D (n_rod_state,) array containing data with 'int' type.
+        Indices of arm (Cosserat rod) nodes used for state information.
     mode : int
         There are 4 modes available.
         mode=1 fixed target position to be reached (default)
@@ -109,12 +233,30 @@ class Environment(gym.Env):
         Contains the control points for generating spline muscle torques in tangent direction.
     torque_profile_list_for_muscle_in_tangent_dir : defaultdict(list)
         Records, muscle torques and control points in tangent direction throughout the simulation.
-    post_processing_dict_rod : defaultdict(list)
+    post_processing_dict_rod : ColumnarRecorder
         Contains the data collected by rod callback class. It stores the time-history data of rod and only initialized
         if COLLECT_DATA_FOR_POSTPROCESSING=True.
-    post_processing_dict_sphere : defaultdict(list)
+    post_processing_dict_sphere : ColumnarRecorder
         Contains the data collected by target sphere callback class. It stores the time-history data of rod and only
         initialized if COLLECT_DATA_FOR_POSTPROCESSING=True.
+    seed_sequence : numpy.random.SeedSequence
+        Seed sequence of the random number generator.
+    rng : numpy.random.Generator
+        Random number generator of the environment. Target positions and velocities, sampled actions and
+        obstacles are drawn from it.
+    log : EnvironmentLog
+        Prints messages of the environment with the verbosity given by the verbosity keyword argument.
+    episode_target_position : numpy.ndarray
+        1D (3,) array containing data with 'float' type. Target position sampled at the last reset.
+    episode_metrics : dict
+        Metrics of the current episode, reset by reset and updated by each step: final_distance is the distance between
+        the arm tip and the target at the last step, final_orientation_distance is the orientation distance between the
+        arm tip and the target at the last step, on_goal_time is the time in seconds the tip is within 0.05 of the
+        target (sampled every learning step) and nan_terminated is true if the episode is stopped because of NaN.
+    reward_terms : RewardTerms
+        Reward shaping terms added to the reward of each step. None if reward_terms is not given.
+    step_profiler : StepProfiler
+        Profiler of the phases of step calls. None if profile_step is false.
     step_skip : int
         Determines the data collection step for callback functions. Callback functions collect data every step_skip.
     """
@@ -122,6 +264,15 @@ class Environment(gym.Env):
     # Required for OpenAI Gym interface
     metadata = {"render.modes": ["human"]}
 
+    # Names of the metrics of the episode, which are given in the info dictionary of each step. They can be
+    # written in the monitor file by stable-baselines Monitor with info_keywords=episode_metric_names.
+    episode_metric_names = (
+        "final_distance",
+        "final_orientation_distance",
+        "on_goal_time",
+        "nan_terminated",
+    )
+
     """
     FOUR modes: (specified by mode)
     1. fixed target position to be reached (default: need target_position parameter)
@@ -194,9 +345,86 @@ class Environment(gym.Env):
                 1D (6,) array containing data with 'float' type.
                 boundary used if mode=2,4. It determines the rectangular space, that target can move and  minimum
                 and maximum of this space are given for x, y, and z coordinates. (xmin, xmax, ymin, ymax, zmin, zmax)
+            * precompute_spline_basis : boolean
+                If true, muscle torques are computed from spline knots and coefficients computed once, instead of
+                creating a new spline every time control points change. Default is False.
+            * reuse_simulator : boolean
+                If true, simulator is built once and later resets restore its initial state in place, only
+                the target is re-sampled. Default is False.
+            * block_integration : boolean
+                If true, time steps of one step call are integrated inside a single Numba kernel by the
+                BlockIntegrator. Requires precompute_spline_basis. If simulator has blocks not supported by the
+                BlockIntegrator, for example call backs added if COLLECT_DATA_FOR_POSTPROCESSING is true,
+                Elastica stepper is used. Default is False.
+            * adaptive_time_step : boolean
+                If true, number of time steps in each step call is selected from the stable time step of the
+                arm, estimated from its current stiffness, element lengths, damping and contact stiffness.
+                Control interval, num_steps_per_update * time_step, is not changed. It is not used if
+                COLLECT_DATA_FOR_POSTPROCESSING is true, since call backs record data every step_skip time steps.
+                Time step is larger than sim_dt only if sim_dt is smaller than the estimated stable time step.
+                sim_dt of the training script (2e-4 with 20 elements) is already at the estimated stable time
+                step, so with the default time_step_safety_factor this mode does not reduce the number of time
+                steps of the training configuration, it helps only if sim_dt is decreased. Default is False.
+            * time_step_safety_factor : float
+                Estimated stable time step is multiplied by this factor, if adaptive_time_step is true.
+                Default is 0.8.
+            * cfl_number : float
+                Arm nodes cannot move more than cfl_number times the element length in one time step, if
+                adaptive_time_step is true. Default is 0.5.
+            * max_num_steps_per_update : int
+                Maximum number of time steps in each step call, if adaptive_time_step is true. Default is
+                num_steps_per_update, time step is not smaller than sim_dt. Larger values let the time step
+                drop below sim_dt when the estimated stable time step is smaller.
+            * rollback_on_nan : boolean
+                If true, state of the simulation is saved before each step call. If the arm diverges during the
+                integration, NaN or motion faster than cfl_number element lengths or radians in one time step,
+                the state is restored and the step is integrated again with half of the time step. Default is
+                False.
+            * max_rollback_retries : int
+                Maximum number of times a step is integrated again, if rollback_on_nan is true. If the arm still
+                diverges, NaN is handled as before. Default is 3.
+            * profile_step : boolean
+                If true, durations of the phases of each step call are recorded in a ring buffer. Durations of
+                the step are given in the info dictionary as step_profile and statistics of the recorded steps
+                are returned by get_profile. If false, profiling costs one attribute check per phase. Default is
+                False.
+            * profile_buffer_size : int
+                Number of steps stored by the profiler, if profile_step is true. Default is 1000.
+            * seed : int or numpy.random.SeedSequence
+                Seed of the random number generator of the environment. Default is None, seed is drawn from
+                the global numpy random number generator, so np.random.seed makes the environment
+                reproducible.
+            * reward_terms : dict
+                Weights of reward shaping terms computed over the whole arm, which are added to the reward of
+                each step. Terms are "tip_distance", "mean_node_distance" and "max_node_distance", see
+                reward_terms.REWARD_TERMS. This case has no obstacle terms, other names raise ValueError. Values
+                of the terms are given in the info dictionary as reward_terms. Default is None, reward is not
+                changed.
+            * verbosity : str or int
+                Verbosity of the messages of the environment, one of "quiet" (nothing is printed), "warning"
+                (NaN and divergence warnings), "summary" (warnings and one line for every log_summary_interval
+                episodes) or "verbose" (every message). Summary of each episode is also given in the info
+                dictionary of the last step as episode_summary. Default is "verbose".
+            * log_summary_interval : int
+                Number of episodes summarized in one line, if verbosity is "summary". Default is 10.
+            * log_prefix : str
+                Printed at the beginning of each message, i.e. to tell workers apart. Default is "".
+            * return_state_view : boolean
+                If true, get_state returns a read-only view of the preallocated observation buffer, which is
+                overwritten by the next get_state call. Caller has to copy the state if it keeps it. If false,
+                a copy of the observation buffer is returned. Default is False.
+            * recorder_memmap_directory : str
+                If not None, arm and target data collected for post-processing are recorded in memory-mapped
+                .npy files in this directory, instead of arrays in memory. Default is None.
 
         """
         super(Environment, self).__init__()
+        # Messages are printed by the log, so they can be batched or turned off in training runs.
+        self.log = EnvironmentLog(
+            kwargs.get("verbosity", "verbose"),
+            kwargs.get("log_summary_interval", 10),
+            kwargs.get("log_prefix", ""),
+        )
         self.dim = dim
         # Integrator type
         self.StatefulStepper = PositionVerlet()
@@ -206,7 +434,7 @@ class Environment(gym.Env):
         self.h_time_step = sim_dt  # this is a stable time step
         self.total_steps = int(self.final_time / self.h_time_step)
         self.time_step = np.float64(float(self.final_time) / self.total_steps)
-        print("Total steps", self.total_steps)
+        self.log.info("Total steps %d", self.total_steps)
 
         # Video speed
         self.rendering_fps = 60
@@ -227,7 +455,7 @@ class Environment(gym.Env):
         # learning step define through num_steps_per_update
         self.num_steps_per_update = num_steps_per_update
         self.total_learning_steps = int(self.total_steps / self.num_steps_per_update)
-        print("Total learning steps", self.total_learning_steps)
+        self.log.info("Total learning steps %d", self.total_learning_steps)
 
         if self.dim == 2.0:
             # normal direction activation (2D)
@@ -270,6 +498,18 @@ class Environment(gym.Env):
             dtype=np.float64,
         )
 
+        # get_state writes states into a preallocated buffer, arm is sampled at these nodes.
+        self.rod_state_indices = np.arange(0, n_elem + 1, num_points)
+        self.observation_buffer = np.zeros(self.observation_space.shape)
+        self.observation_view = self.observation_buffer.view()
+        self.observation_view.flags.writeable = False
+        self.norm_buffer = np.zeros(3)
+        self.return_state_view = kwargs.get("return_state_view", False)
+
+        # Call backs record data for post-processing into arrays allocated for the number of frames
+        # of an episode, or into memory-mapped files in this directory.
+        self.recorder_memmap_directory = kwargs.get("recorder_memmap_directory", None)
+
         # here we specify 4 tasks that can possibly used
         self.mode = mode
 
@@ -306,9 +546,55 @@ class Environment(gym.Env):
 
         self.NU = kwargs.get("NU", 10)
 
+        # If true, muscle torques use spline knots and coefficients computed once instead of
+        # generating a new spline every time control points change.
+        self.precompute_spline_basis = kwargs.get("precompute_spline_basis", False)
+
+        # If true, simulator is built in the first reset and its initial state is restored
+        # in later resets instead of building a new simulator.
+        self.reuse_simulator = kwargs.get("reuse_simulator", False)
+        self.simulator = None
+        self.simulator_snapshot = None
+
+        # If true, time steps of one step call are integrated by a compiled kernel instead of
+        # calling the Elastica stepper for each time step.
+        self.block_integration = kwargs.get("block_integration", False)
+        self.block_integrator = None
+
+        # If true, time step is selected in each step call from the stable time step of the arm,
+        # control interval is fixed.
+        self.adaptive_time_step = kwargs.get("adaptive_time_step", False)
+        self.time_step_safety_factor = kwargs.get("time_step_safety_factor", 0.8)
+        self.cfl_number = kwargs.get("cfl_number", 0.5)
+        self.max_num_steps_per_update = kwargs.get(
+            "max_num_steps_per_update", self.num_steps_per_update
+        )
+        self.control_interval = self.num_steps_per_update * self.time_step
+        self.contact_stiffness = 0.0
+
+        # If true, simulation is rolled back and the step is integrated again with a smaller
+        # time step if the arm diverges.
+        self.rollback_on_nan = kwargs.get("rollback_on_nan", False)
+        self.max_rollback_retries = kwargs.get("max_rollback_retries", 3)
+
+        # If true, durations of the phases of step calls are recorded.
+        self.step_profiler = (
+            StepProfiler(kwargs.get("profile_buffer_size", 1000))
+            if kwargs.get("profile_step", False)
+            else None
+        )
+
+        # Random numbers of the environment are drawn from its own generator, so environments of
+        # vectorized and parallel runs can be seeded independently.
+        self.seed(kwargs.get("seed", None))
+
+        # Reward shaping terms of the whole arm, which are added to the reward of each step.
+        reward_terms = kwargs.get("reward_terms", None)
+        self.reward_terms = RewardTerms(reward_terms) if reward_terms else None
+
         self.n_elem = n_elem
 
-    def reset(self):
+    def reset(self, simulator=None):
         """
 
         This class method, resets and creates the simulation environment. First,
@@ -316,11 +602,80 @@ class Environment(gym.Env):
         Second, target and if there are obstacles are initialized and append to the
         simulation. Finally, call back functions are set for Elastica rods and rigid bodies.
 
+        Parameters
+        ----------
+        simulator : BaseSimulator
+            If given, systems of this environment are appended to this simulator, which can be shared by
+            many environments. Simulator is not finalized and it has to be finalized and integrated by the
+            caller. If it is the simulator this environment is already appended to, the caller restores the
+            simulator in place and only the target and control points are reset. If None, a new simulator is
+            created and finalized. Default is None.
+
+        Returns
+        -------
+
+        """
+        if (
+            simulator is None
+            and self.reuse_simulator
+            and self.simulator_snapshot is not None
+        ):
+            self.restore_simulator()
+        elif simulator is not None and simulator is self.simulator:
+            # Shared simulator is restored in place by its owner, i.e. BatchedEnvironment.
+            self.reset_target_and_control_points()
+        else:
+            self.build_simulator(simulator)
+
+        # set state
+        state = self.get_state()
+
+        # reset on_goal
+        self.on_goal = 0
+        # reset current_step
+        self.current_step = 0
+        # reset metrics of the episode
+        self.episode_metrics = dict(
+            final_distance=float(
+                np.linalg.norm(
+                    self.shearable_rod.position_collection[..., -1]
+                    - self.sphere.position_collection[..., 0]
+                )
+            ),
+            final_orientation_distance=0.0,
+            on_goal_time=0.0,
+            nan_terminated=False,
+        )
+        # reset time_tracker
+        self.time_tracker = np.float64(0.0)
+        # reset previous_action
+        self.previous_action = None
+
+        # After resetting the environment return state information
+        return state
+
+    def build_simulator(self, simulator=None):
+        """
+
+        This class method creates the simulation environment, it is called by reset. First,
+        Elastica rod (or arm) is initialized and boundary conditions acting on the rod defined.
+        Second, target and if there are obstacles are initialized and append to the
+        simulation. Finally, call back functions are set for Elastica rods and rigid bodies.
+
+        Parameters
+        ----------
+        simulator : BaseSimulator
+            If given, systems of this environment are appended to this simulator, see reset. Default is None.
+
         Returns
         -------
 
         """
-        self.simulator = BaseSimulator()
+        self.simulator_snapshot = None
+        if simulator is None:
+            self.simulator = BaseSimulator()
+        else:
+            self.simulator = simulator
 
         # setting up test params
         n_elem = self.n_elem
@@ -358,21 +713,7 @@ class Environment(gym.Env):
         # Now rod is ready for simulation, append rod to simulation
         self.simulator.append(self.shearable_rod)
         # self.mode = 4
-        if self.mode != 2:
-            # fixed target position to reach
-            target_position = self.target_position
-
-        if self.mode == 2 or self.mode == 4:
-            # random target position to reach with boundary
-            t_x = np.random.uniform(self.boundary[0], self.boundary[1])
-            t_y = np.random.uniform(self.boundary[2], self.boundary[3])
-            if self.dim == 2.0 or self.dim == 2.5:
-                t_z = np.random.uniform(self.boundary[4], self.boundary[5]) * 0
-            elif self.dim == 3.0 or self.dim == 3.5:
-                t_z = np.random.uniform(self.boundary[4], self.boundary[5])
-
-            print("Target position:", t_x, t_y, t_z)
-            target_position = np.array([t_x, t_y, t_z])
+        target_position = self.sample_target_position()
 
         # initialize sphere
         self.sphere = Sphere(
@@ -381,90 +722,11 @@ class Environment(gym.Env):
             density=1000,
         )
 
-        if self.mode == 3:
-            self.dir_indicator = 1
-            self.sphere_initial_velocity = self.target_v
-            self.sphere.velocity_collection[..., 0] = [
-                self.sphere_initial_velocity,
-                0.0,
-                0.0,
-            ]
-
-        if self.mode == 4:
-
-            self.trajectory_iteration = 0  # for changing directions
-            self.rand_direction_1 = np.pi * np.random.uniform(0, 2)
-            if self.dim == 2.0 or self.dim == 2.5:
-                self.rand_direction_2 = np.pi / 2.0
-            elif self.dim == 3.0 or self.dim == 3.5:
-                self.rand_direction_2 = np.pi * np.random.uniform(0, 2)
-
-            self.v_x = (
-                self.target_v
-                * np.cos(self.rand_direction_1)
-                * np.sin(self.rand_direction_2)
-            )
-            self.v_y = (
-                self.target_v
-                * np.sin(self.rand_direction_1)
-                * np.sin(self.rand_direction_2)
-            )
-            self.v_z = self.target_v * np.cos(self.rand_direction_2)
-
-            self.sphere.velocity_collection[..., 0] = [
-                self.v_x,
-                self.v_y,
-                self.v_z,
-            ]
-            self.boundaries = np.array(self.boundary)
-
-        if self.mode == 1:
-            theta_x = 0
-            theta_y = np.pi / 4
-            theta_z = 0
-        if self.mode == 2 or self.mode == 4:
-            theta_x = 0
-            theta_y = np.random.uniform(-np.pi / 2, np.pi / 2)
-            theta_z = 0
+        self.set_target_velocity()
 
-        # set the orientation of target sphere
-        theta = np.array([theta_x, theta_y, theta_z])
-        print(theta)
-        R = np.array(
-            [
-                [
-                    -np.sin(theta[1]),
-                    np.sin(theta[0]) * np.cos(theta[1]),
-                    np.cos(theta[0]) * np.cos(theta[1]),
-                ],
-                [
-                    np.cos(theta[1]) * np.cos(theta[2]),
-                    np.sin(theta[0]) * np.sin(theta[1]) * np.cos(theta[2])
-                    - np.sin(theta[2]) * np.cos(theta[0]),
-                    np.sin(theta[1]) * np.cos(theta[0]) * np.cos(theta[2])
-                    + np.sin(theta[0]) * np.sin(theta[2]),
-                ],
-                [
-                    np.sin(theta[2]) * np.cos(theta[1]),
-                    np.sin(theta[0]) * np.sin(theta[1]) * np.sin(theta[2])
-                    + np.cos(theta[0]) * np.cos(theta[2]),
-                    np.sin(theta[1]) * np.sin(theta[2]) * np.cos(theta[0])
-                    - np.sin(theta[0]) * np.cos(theta[2]),
-                ],
-            ]
-        )
-        self.sphere.director_collection[..., 0] = R
+        self.set_target_orientation()
         self.simulator.append(self.sphere)
 
-        Q = self.sphere.director_collection[..., 0]
-        # Compute target tip orientation using quaternions.
-        # We add target and arm tip orientations difference to reward function.
-        qw = np.sqrt(1 + Q[0, 0] + Q[1, 1] + Q[2, 2]) / 2
-        qx = (Q[2, 1] - Q[1, 2]) / (4 * qw)
-        qy = (Q[0, 2] - Q[2, 0]) / (4 * qw)
-        qz = (Q[1, 0] - Q[0, 1]) / (4 * qw)
-        self.target_tip_orientation = np.array([qw, qx, qy, qz])
-
         class WallBoundaryForSphere(FreeRod):
             """
 
@@ -525,51 +787,61 @@ class Environment(gym.Env):
         )
 
         # Add muscle torques acting on the arm for actuation.
-        # MuscleTorquesWithVaryingBetaSplines uses the control points selected by RL to
+        # FusedMuscleTorquesWithVaryingBetaSplines uses the control points selected by RL to
         # generate torques along the arm.
         self.torque_profile_list_for_muscle_in_normal_dir = defaultdict(list)
         self.spline_points_func_array_normal_dir = []
-        # Apply torques
-        self.simulator.add_forcing_to(self.shearable_rod).using(
-            MuscleTorquesWithVaryingBetaSplines,
-            base_length=base_length,
-            number_of_control_points=self.number_of_control_points,
-            points_func_array=self.spline_points_func_array_normal_dir,
-            muscle_torque_scale=self.alpha,
-            direction=str("normal"),
-            step_skip=self.step_skip,
-            max_rate_of_change_of_activation=self.max_rate_of_change_of_activation,
-            torque_profile_recorder=self.torque_profile_list_for_muscle_in_normal_dir,
-        )
-
         self.torque_profile_list_for_muscle_in_binormal_dir = defaultdict(list)
         self.spline_points_func_array_binormal_dir = []
-        # Apply torques
-        self.simulator.add_forcing_to(self.shearable_rod).using(
-            MuscleTorquesWithVaryingBetaSplines,
-            base_length=base_length,
-            number_of_control_points=self.number_of_control_points,
-            points_func_array=self.spline_points_func_array_binormal_dir,
-            muscle_torque_scale=self.alpha,
-            direction=str("binormal"),
-            step_skip=self.step_skip,
-            max_rate_of_change_of_activation=self.max_rate_of_change_of_activation,
-            torque_profile_recorder=self.torque_profile_list_for_muscle_in_binormal_dir,
-        )
-
         self.torque_profile_list_for_muscle_in_twist_dir = defaultdict(list)
         self.spline_points_func_array_twist_dir = []
+
+        # Only directions actuated by the RL are added to the simulation, control points
+        # of inactive directions are always zero.
+        muscle_torque_directions = {
+            "normal": (
+                self.spline_points_func_array_normal_dir,
+                self.alpha,
+                self.torque_profile_list_for_muscle_in_normal_dir,
+            ),
+            "binormal": (
+                self.spline_points_func_array_binormal_dir,
+                self.alpha,
+                self.torque_profile_list_for_muscle_in_binormal_dir,
+            ),
+            "tangent": (
+                self.spline_points_func_array_twist_dir,
+                self.beta,
+                self.torque_profile_list_for_muscle_in_twist_dir,
+            ),
+        }
+        if self.dim == 2.0:
+            active_directions = ["normal"]
+        elif self.dim == 2.5:
+            active_directions = ["normal", "tangent"]
+        elif self.dim == 3.0:
+            active_directions = ["normal", "binormal"]
+        elif self.dim == 3.5:
+            active_directions = ["normal", "binormal", "tangent"]
+
         # Apply torques
         self.simulator.add_forcing_to(self.shearable_rod).using(
-            MuscleTorquesWithVaryingBetaSplines,
+            FusedMuscleTorquesWithVaryingBetaSplines,
             base_length=base_length,
             number_of_control_points=self.number_of_control_points,
-            points_func_array=self.spline_points_func_array_twist_dir,
-            muscle_torque_scale=self.beta,
-            direction=str("tangent"),
+            points_func_array_list=[
+                muscle_torque_directions[direction][0] for direction in active_directions
+            ],
+            muscle_torque_scale_list=[
+                muscle_torque_directions[direction][1] for direction in active_directions
+            ],
+            direction_list=active_directions,
             step_skip=self.step_skip,
+            precompute_spline_basis=self.precompute_spline_basis,
             max_rate_of_change_of_activation=self.max_rate_of_change_of_activation,
-            torque_profile_recorder=self.torque_profile_list_for_muscle_in_twist_dir,
+            torque_profile_recorder_list=[
+                muscle_torque_directions[direction][2] for direction in active_directions
+            ],
         )
 
         # Call back function to collect arm data from simulation
@@ -579,7 +851,7 @@ class Environment(gym.Env):
             """
 
             def __init__(
-                self, step_skip: int, callback_params: dict,
+                self, step_skip: int, callback_params: ColumnarRecorder,
             ):
                 CallBackBaseClass.__init__(self)
                 self.every = step_skip
@@ -587,17 +859,13 @@ class Environment(gym.Env):
 
             def make_callback(self, system, time, current_step: int):
                 if current_step % self.every == 0:
-                    self.callback_params["time"].append(time)
-                    self.callback_params["step"].append(current_step)
-                    self.callback_params["position"].append(
-                        system.position_collection.copy()
-                    )
-                    self.callback_params["directors"].append(
-                        system.director_collection.copy()
-                    )
-                    self.callback_params["radius"].append(system.radius.copy())
-                    self.callback_params["com"].append(
-                        system.compute_position_center_of_mass()
+                    self.callback_params.append(
+                        time=time,
+                        step=current_step,
+                        position=system.position_collection,
+                        directors=system.director_collection,
+                        radius=system.radius,
+                        com=system.compute_position_center_of_mass(),
                     )
 
                     return
@@ -608,32 +876,34 @@ class Environment(gym.Env):
             Call back function for target sphere
             """
 
-            def __init__(self, step_skip: int, callback_params: dict):
+            def __init__(self, step_skip: int, callback_params: ColumnarRecorder):
                 CallBackBaseClass.__init__(self)
                 self.every = step_skip
                 self.callback_params = callback_params
 
             def make_callback(self, system, time, current_step: int):
                 if current_step % self.every == 0:
-                    self.callback_params["time"].append(time)
-                    self.callback_params["step"].append(current_step)
-                    self.callback_params["position"].append(
-                        system.position_collection.copy()
-                    )
-                    self.callback_params["directors"].append(
-                        system.director_collection.copy()
-                    )
-                    self.callback_params["radius"].append(copy.deepcopy(system.radius))
-                    self.callback_params["com"].append(
-                        system.compute_position_center_of_mass()
+                    self.callback_params.append(
+                        time=time,
+                        step=current_step,
+                        position=system.position_collection,
+                        directors=system.director_collection,
+                        radius=system.radius,
+                        com=system.compute_position_center_of_mass(),
                     )
 
                     return
 
         if self.COLLECT_DATA_FOR_POSTPROCESSING:
             # Collect data using callback function for postprocessing
-            self.post_processing_dict_rod = defaultdict(list)
-            # List which collected data will be append
+            # number of frames recorded in an episode
+            n_frames = self.total_steps // self.step_skip + 1
+            self.post_processing_dict_rod = ColumnarRecorder(
+                n_frames,
+                memmap_directory=self.recorder_memmap_directory,
+                prefix="rod",
+            )
+            # recorder in which collected data will be written
             # set the diagnostics for rod and collect data
             self.simulator.collect_diagnostics(self.shearable_rod).using(
                 ArmMuscleBasisCallBack,
@@ -641,8 +911,12 @@ class Environment(gym.Env):
                 callback_params=self.post_processing_dict_rod,
             )
 
-            self.post_processing_dict_sphere = defaultdict(list)
-            # List which collected data will be append
+            self.post_processing_dict_sphere = ColumnarRecorder(
+                n_frames,
+                memmap_directory=self.recorder_memmap_directory,
+                prefix="sphere",
+            )
+            # recorder in which collected data will be written
             # set the diagnostics for target sphere and collect data
             self.simulator.collect_diagnostics(self.sphere).using(
                 RigidSphereCallBack,
@@ -650,29 +924,318 @@ class Environment(gym.Env):
                 callback_params=self.post_processing_dict_sphere,
             )
 
-        # Finalize simulation environment. After finalize, you cannot add
-        # any forcing, constrain or call back functions
-        self.simulator.finalize()
+        if simulator is None:
+            # Finalize simulation environment. After finalize, you cannot add
+            # any forcing, constrain or call back functions
+            self.simulator.finalize()
+
+            # Contact stiffness acting on the arm is used to estimate the stable time step.
+            self.contact_stiffness = compute_contact_stiffness(
+                self.simulator, self.shearable_rod
+            )
+
+            # do_step, stages_and_updates will be used in step function
+            self.do_step, self.stages_and_updates = extend_stepper_interface(
+                self.StatefulStepper, self.simulator
+            )
+
+            self.block_integrator = None
+            if self.block_integration:
+                try:
+                    self.block_integrator = BlockIntegrator(
+                        self.simulator, self.time_step
+                    )
+                except NotImplementedError:
+                    # Simulator has blocks without compiled kernels, use Elastica stepper.
+                    pass
+
+            if self.reuse_simulator:
+                # Store initial state of the simulator, which is restored in later resets.
+                self.snapshot_simulator()
+
+    def snapshot_simulator(self):
+        """
+        This class method stores the initial state of systems, forcing, constraints, connections and call backs
+        of the simulator, which are restored by restore_simulator.
+
+        Returns
+        -------
+
+        """
+        self.simulator_snapshot = [
+            (obj, save_state(obj)) for obj in self.get_simulator_objects()
+        ]
+
+        # Call backs already recorded the initial state in finalize. Recorded data is not stored
+        # in the snapshot, initial state is recorded again by restore_simulator.
+        for obj, state in self.simulator_snapshot:
+            if isinstance(obj, CallBackBaseClass):
+                for value in state.values():
+                    if isinstance(value, dict):
+                        value.clear()
+
+    def get_simulator_objects(self):
+        """
+        This class method returns systems, forcing, constraints, connections and call backs of the simulator.
+
+        Returns
+        -------
+        list
 
-        # do_step, stages_and_updates will be used in step function
-        self.do_step, self.stages_and_updates = extend_stepper_interface(
-            self.StatefulStepper, self.simulator
+        """
+        return (
+            list(self.simulator._systems)
+            + [forcing for _, forcing in self.simulator._ext_forces_torques]
+            + [constraint for _, constraint in self.simulator._constraints]
+            + [connection[-1] for connection in self.simulator._connections]
+            + [callback for _, callback in self.simulator._callbacks]
         )
 
-        # set state
-        state = self.get_state()
+    def save_checkpoint(self):
+        """
+        This class method returns a checkpoint of the simulation, which is restored by restore_checkpoint.
+        Checkpoint contains copies of the states of the simulator objects and simulation time. Recorded data
+        is not copied, lengths of the recorded lists and columnar recorders are stored instead.
 
-        # reset on_goal
-        self.on_goal = 0
-        # reset current_step
-        self.current_step = 0
-        # reset time_tracker
-        self.time_tracker = np.float64(0.0)
-        # reset previous_action
-        self.previous_action = None
+        Returns
+        -------
+        tuple
+            Simulation time, states of the simulator objects and lengths of the recorded lists.
+        """
+        objects = self.get_simulator_objects()
+        states = [(obj, save_state(obj, copy_dictionaries=False)) for obj in objects]
+        recorded_lengths = [
+            (recorded_list, len(recorded_list))
+            for obj in objects
+            for recorder in get_recorders(obj)
+            for recorded_list in recorder.values()
+            if isinstance(recorded_list, list)
+        ]
+        # Columnar recorders are truncated same as lists.
+        recorded_lengths += [
+            (recorder, len(recorder))
+            for obj in objects
+            for recorder in get_recorders(obj)
+            if isinstance(recorder, ColumnarRecorder)
+        ]
+        return self.time_tracker, states, recorded_lengths
+
+    def restore_checkpoint(self, checkpoint):
+        """
+        This class method restores the simulation to a checkpoint returned by save_checkpoint. Data recorded
+        after the checkpoint is removed.
 
-        # After resetting the environment return state information
-        return state
+        Parameters
+        ----------
+        checkpoint : tuple
+            Checkpoint returned by save_checkpoint.
+
+        Returns
+        -------
+
+        """
+        time_tracker, states, recorded_lengths = checkpoint
+        for obj, state in states:
+            restore_state(obj, state)
+        for recorded_list, length in recorded_lengths:
+            del recorded_list[length:]
+        self.time_tracker = time_tracker
+
+    def restore_simulator(self):
+        """
+        This class method resets the simulation environment by restoring the initial state stored by
+        snapshot_simulator in place, instead of building a new simulator. Target is re-sampled.
+
+        Returns
+        -------
+
+        """
+        for obj, state in self.simulator_snapshot:
+            restore_state(obj, state)
+            for recorder in get_recorders(obj):
+                if isinstance(recorder, ColumnarRecorder):
+                    del recorder[:]
+
+        self.reset_target_and_control_points()
+
+        # Same as finalize, apply constraints and call backs at the initial time.
+        self.simulator._constrain_values(time=0.0)
+        self.simulator._constrain_rates(time=0.0)
+        self.simulator._callBack(time=0.0, current_step=0)
+
+    def reset_target_and_control_points(self):
+        """
+        This class method clears the control points and torque profiles referenced by the muscle torque forcing
+        and re-samples the target, after the simulator is restored in place.
+
+        Returns
+        -------
+
+        """
+        # Control points and torque profiles are referenced by muscle torque forcing, clear them in place.
+        for spline_points_func_array in (
+            self.spline_points_func_array_normal_dir,
+            self.spline_points_func_array_binormal_dir,
+            self.spline_points_func_array_twist_dir,
+        ):
+            del spline_points_func_array[:]
+        for torque_profile_list in (
+            self.torque_profile_list_for_muscle_in_normal_dir,
+            self.torque_profile_list_for_muscle_in_binormal_dir,
+            self.torque_profile_list_for_muscle_in_twist_dir,
+        ):
+            torque_profile_list.clear()
+
+        self.sphere.position_collection[..., 0] = self.sample_target_position()
+        self.set_target_velocity()
+        self.set_target_orientation()
+
+    def seed(self, seed=None):
+        """
+        This method seeds the random number generator of the environment.
+
+        Parameters
+        ----------
+        seed : int or numpy.random.SeedSequence
+            Seed. Default is None, seed is drawn from the global numpy random number generator.
+
+        Returns
+        -------
+        list
+            Entropy of the seed sequence.
+        """
+        self.seed_sequence = get_seed_sequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+        return [self.seed_sequence.entropy]
+
+    def sample_target_position(self):
+        """
+        Returns the target position. If mode is 2 or 4 target position is randomly sampled inside the boundary.
+
+        Returns
+        -------
+        numpy.ndarray
+            1D (3,) array containing data with 'float' type.
+        """
+        if self.mode != 2:
+            # fixed target position to reach
+            target_position = self.target_position
+
+        if self.mode == 2 or self.mode == 4:
+            # random target position to reach with boundary
+            t_x = self.rng.uniform(self.boundary[0], self.boundary[1])
+            t_y = self.rng.uniform(self.boundary[2], self.boundary[3])
+            if self.dim == 2.0 or self.dim == 2.5:
+                t_z = self.rng.uniform(self.boundary[4], self.boundary[5]) * 0
+            elif self.dim == 3.0 or self.dim == 3.5:
+                t_z = self.rng.uniform(self.boundary[4], self.boundary[5])
+
+            self.log.info("Target position: %s %s %s", t_x, t_y, t_z)
+            target_position = np.array([t_x, t_y, t_z])
+
+        self.episode_target_position = np.array(target_position, dtype=np.float64)
+        return target_position
+
+    def set_target_velocity(self):
+        """
+        Sets the target velocity. If mode is 3 target moves in a square path, if mode is 4 target velocity
+        direction is randomly sampled.
+
+        Returns
+        -------
+
+        """
+        if self.mode == 3:
+            self.dir_indicator = 1
+            self.sphere_initial_velocity = self.target_v
+            self.sphere.velocity_collection[..., 0] = [
+                self.sphere_initial_velocity,
+                0.0,
+                0.0,
+            ]
+
+        if self.mode == 4:
+
+            self.trajectory_iteration = 0  # for changing directions
+            self.rand_direction_1 = np.pi * self.rng.uniform(0, 2)
+            if self.dim == 2.0 or self.dim == 2.5:
+                self.rand_direction_2 = np.pi / 2.0
+            elif self.dim == 3.0 or self.dim == 3.5:
+                self.rand_direction_2 = np.pi * self.rng.uniform(0, 2)
+
+            self.v_x = (
+                self.target_v
+                * np.cos(self.rand_direction_1)
+                * np.sin(self.rand_direction_2)
+            )
+            self.v_y = (
+                self.target_v
+                * np.sin(self.rand_direction_1)
+                * np.sin(self.rand_direction_2)
+            )
+            self.v_z = self.target_v * np.cos(self.rand_direction_2)
+
+            self.sphere.velocity_collection[..., 0] = [
+                self.v_x,
+                self.v_y,
+                self.v_z,
+            ]
+            self.boundaries = np.array(self.boundary)
+
+    def set_target_orientation(self):
+        """
+        Sets the target orientation. If mode is 2 or 4 target orientation is randomly sampled.
+        Target tip orientation is stored as quaternions, which is used in the reward function.
+
+        Returns
+        -------
+
+        """
+        if self.mode == 1:
+            theta_x = 0
+            theta_y = np.pi / 4
+            theta_z = 0
+        if self.mode == 2 or self.mode == 4:
+            theta_x = 0
+            theta_y = self.rng.uniform(-np.pi / 2, np.pi / 2)
+            theta_z = 0
+
+        # set the orientation of target sphere
+        theta = np.array([theta_x, theta_y, theta_z])
+        self.log.info("Target orientation: %s", theta)
+        R = np.array(
+            [
+                [
+                    -np.sin(theta[1]),
+                    np.sin(theta[0]) * np.cos(theta[1]),
+                    np.cos(theta[0]) * np.cos(theta[1]),
+                ],
+                [
+                    np.cos(theta[1]) * np.cos(theta[2]),
+                    np.sin(theta[0]) * np.sin(theta[1]) * np.cos(theta[2])
+                    - np.sin(theta[2]) * np.cos(theta[0]),
+                    np.sin(theta[1]) * np.cos(theta[0]) * np.cos(theta[2])
+                    + np.sin(theta[0]) * np.sin(theta[2]),
+                ],
+                [
+                    np.sin(theta[2]) * np.cos(theta[1]),
+                    np.sin(theta[0]) * np.sin(theta[1]) * np.sin(theta[2])
+                    + np.cos(theta[0]) * np.cos(theta[2]),
+                    np.sin(theta[1]) * np.sin(theta[2]) * np.cos(theta[0])
+                    - np.sin(theta[0]) * np.cos(theta[2]),
+                ],
+            ]
+        )
+        self.sphere.director_collection[..., 0] = R
+
+        Q = self.sphere.director_collection[..., 0]
+        # Compute target tip orientation using quaternions.
+        # We add target and arm tip orientations difference to reward function.
+        qw = np.sqrt(1 + Q[0, 0] + Q[1, 1] + Q[2, 2]) / 2
+        qx = (Q[2, 1] - Q[1, 2]) / (4 * qw)
+        qy = (Q[0, 2] - Q[2, 0]) / (4 * qw)
+        qz = (Q[1, 0] - Q[0, 1]) / (4 * qw)
+        self.target_tip_orientation = np.array([qw, qx, qy, qz])
 
     def sampleAction(self):
         """
@@ -683,7 +1246,7 @@ class Environment(gym.Env):
         numpy.ndarray
             1D (3 * number_of_control_points,) array containing data with 'float' type, in range [-1, 1].
         """
-        random_action = (np.random.rand(1 * self.number_of_control_points) - 0.5) * 2
+        random_action = (self.rng.random(1 * self.number_of_control_points) - 0.5) * 2
         return random_action
 
     def get_state(self):
@@ -697,63 +1260,51 @@ class Environment(gym.Env):
             Size of the states depends on the problem.
         """
 
-        rod_state = self.shearable_rod.position_collection
-        r_s_a = rod_state[0]  # x_info
-        r_s_b = rod_state[1]  # y_info
-        r_s_c = rod_state[2]  # z_info
-
-        num_points = int(self.n_elem / self.obs_state_points)
-        ## get full 3D state information
-        rod_compact_state = np.concatenate(
-            (
-                r_s_a[0 : len(r_s_a) + 1 : num_points],
-                r_s_b[0 : len(r_s_b) + 1 : num_points],
-                r_s_c[0 : len(r_s_b) + 1 : num_points],
-            )
-        )
+        state = self.observation_buffer
+        n_rod_state = 3 * self.rod_state_indices.shape[0]
 
-        rod_compact_velocity = self.shearable_rod.velocity_collection[..., -1]
-        rod_compact_velocity_norm = np.array([np.linalg.norm(rod_compact_velocity)])
-        rod_compact_velocity_dir = np.where(
-            rod_compact_velocity_norm != 0,
-            rod_compact_velocity / rod_compact_velocity_norm,
-            0.0,
+        ## get full 3D state information, x, y and z of the sampled nodes
+        np.take(
+            self.shearable_rod.position_collection,
+            self.rod_state_indices,
+            axis=1,
+            out=state[:n_rod_state].reshape(3, -1),
+            mode="clip",
         )
 
-        sphere_compact_state = self.sphere.position_collection.flatten()  # 2
-        sphere_compact_velocity = self.sphere.velocity_collection.flatten()
-        sphere_compact_velocity_norm = np.array(
-            [np.linalg.norm(sphere_compact_velocity)]
-        )
-        sphere_compact_velocity_dir = np.where(
-            sphere_compact_velocity_norm != 0,
-            sphere_compact_velocity / sphere_compact_velocity_norm,
-            0.0,
+        # rod tip velocity norm and direction
+        compute_norm_and_direction(
+            self.shearable_rod.velocity_collection[..., -1],
+            self.norm_buffer,
+            state[n_rod_state : n_rod_state + 4],
         )
 
+        # rod tip orientation, it is a view of the state used for the reward
         Q = self.shearable_rod.director_collection[..., -1]
         qw = np.sqrt(1 + Q[0, 0] + Q[1, 1] + Q[2, 2]) / 2
         qx = (Q[2, 1] - Q[1, 2]) / (4 * qw)
         qy = (Q[0, 2] - Q[2, 0]) / (4 * qw)
         qz = (Q[1, 0] - Q[0, 1]) / (4 * qw)
-        self.rod_tip_orientation = np.array([qw, qx, qy, qz])
-
-        state = np.concatenate(
-            (
-                # rod information
-                rod_compact_state,
-                rod_compact_velocity_norm,
-                rod_compact_velocity_dir,
-                self.rod_tip_orientation,
-                # target information
-                sphere_compact_state,
-                sphere_compact_velocity_norm,
-                sphere_compact_velocity_dir,
-                self.target_tip_orientation,
-            )
+        self.rod_tip_orientation = state[n_rod_state + 4 : n_rod_state + 8]
+        self.rod_tip_orientation[0] = qw
+        self.rod_tip_orientation[1] = qx
+        self.rod_tip_orientation[2] = qy
+        self.rod_tip_orientation[3] = qz
+
+        # target information
+        state[n_rod_state + 8 : n_rod_state + 11] = self.sphere.position_collection[
+            :, 0
+        ]
+        compute_norm_and_direction(
+            self.sphere.velocity_collection[:, 0],
+            self.norm_buffer,
+            state[n_rod_state + 11 : n_rod_state + 15],
         )
+        state[n_rod_state + 15 : n_rod_state + 19] = self.target_tip_orientation
 
-        return state
+        if self.return_state_view:
+            return self.observation_view
+        return state.copy()
 
     def step(self, action):
         """
@@ -777,6 +1328,128 @@ class Environment(gym.Env):
         done: boolean
             Stops, simulation or training if done is true. This means, simulation reached final time or NaN is
             detected in the simulation.
+        info : dict
+            Contains ctime, the simulation time, and the metrics of the episode, see episode_metrics. Last step of
+            the episode also contains episode_summary, the reward and the metrics of the episode and the target
+            position.
+
+        """
+
+        if self.step_profiler is not None:
+            self.step_profiler.start()
+
+        self.set_action(action)
+        if self.step_profiler is not None:
+            self.step_profiler.mark("set_action")
+
+        if self.rollback_on_nan:
+            checkpoint = self.save_checkpoint()
+
+        number_of_steps, time_step = self.select_time_step()
+        self.integrate(number_of_steps, time_step)
+
+        if self.rollback_on_nan:
+            retries = 0
+            while (
+                check_divergence(self.shearable_rod, time_step, self.cfl_number)
+                and retries < self.max_rollback_retries
+            ):
+                # Roll back to the state before this step and integrate again with a smaller time step.
+                retries += 1
+                number_of_steps *= 2
+                time_step *= 0.5
+                self.log.warning(
+                    " Divergence detected, integrating the step again with time step %0.3e",
+                    time_step,
+                )
+                self.restore_checkpoint(checkpoint)
+                self.integrate(number_of_steps, time_step)
+
+        if self.step_profiler is not None:
+            self.step_profiler.mark("integration")
+            state, reward, done, info = self.finish_step(action)
+            info["step_profile"] = self.step_profiler.finish()
+            return state, reward, done, info
+
+        return self.finish_step(action)
+
+    def integrate(self, number_of_steps, time_step):
+        """
+        This method integrates the simulation number_of_steps time steps, using the BlockIntegrator if it is
+        available and Elastica stepper otherwise.
+
+        Parameters
+        ----------
+        number_of_steps : int
+            Number of time steps.
+        time_step : float
+            Time step.
+
+        Returns
+        -------
+
+        """
+        # Do multiple time step of simulation for <one learning step>
+        if self.block_integrator is not None:
+            self.time_tracker = self.block_integrator.integrate(
+                self.time_tracker, number_of_steps, time_step
+            )
+        else:
+            for _ in range(number_of_steps):
+                self.time_tracker = self.do_step(
+                    self.StatefulStepper,
+                    self.stages_and_updates,
+                    self.simulator,
+                    self.time_tracker,
+                    time_step,
+                )
+
+    def select_time_step(self):
+        """
+        This method returns the number of time steps and the time step used to integrate one step call. If
+        adaptive_time_step is true, time step is the largest time step smaller than the stable time step of
+        the arm, which divides the control interval into an integer number of time steps, and it is not
+        smaller than the control interval divided by max_num_steps_per_update.
+
+        Returns
+        -------
+        number_of_steps : int
+            Number of time steps.
+        time_step : float
+            Time step.
+        """
+        if not self.adaptive_time_step or self.COLLECT_DATA_FOR_POSTPROCESSING:
+            return self.num_steps_per_update, self.time_step
+
+        stable_time_step = compute_stable_time_step(
+            self.shearable_rod,
+            self.contact_stiffness,
+            self.time_step_safety_factor,
+            self.cfl_number,
+        )
+        if not stable_time_step > 0.0:
+            # Arm state is not valid (NaN), it is detected after the step.
+            return self.num_steps_per_update, self.time_step
+
+        number_of_steps = min(
+            max(int(np.ceil(self.control_interval / stable_time_step)), 1),
+            self.max_num_steps_per_update,
+        )
+        return number_of_steps, np.float64(self.control_interval / number_of_steps)
+
+    def set_action(self, action):
+        """
+        This method sets the control points of muscle torques using the actions selected by the controller.
+
+        Parameters
+        ----------
+        action :  numpy.ndarray
+            1D (n_torque_directions * number_of_control_points,) array containing data with 'float' type.
+            Action returns control points selected by control algorithm to the Elastica simulation. n_torque_directions
+            is number of torque directions, this is controlled by the dim.
+
+        Returns
+        -------
 
         """
 
@@ -826,15 +1499,33 @@ class Environment(gym.Env):
                 2 * self.number_of_control_points :
             ]
 
-        # Do multiple time step of simulation for <one learning step>
-        for _ in range(self.num_steps_per_update):
-            self.time_tracker = self.do_step(
-                self.StatefulStepper,
-                self.stages_and_updates,
-                self.simulator,
-                self.time_tracker,
-                self.time_step,
-            )
+    def finish_step(self, action):
+        """
+        This method updates the target, and returns state information, reward, and done boolean after the
+        simulation is integrated for one learning step.
+
+        Parameters
+        ----------
+        action :  numpy.ndarray
+            1D (n_torque_directions * number_of_control_points,) array containing data with 'float' type.
+            Action selected by the controller for this learning step.
+
+        Returns
+        -------
+        state : numpy.ndarray
+            1D (number_of_states) array containing data with 'float' type.
+            Size of the states depends on the problem.
+        reward : float
+            Reward after the integration.
+        done: boolean
+            Stops, simulation or training if done is true. This means, simulation reached final time or NaN is
+            detected in the simulation.
+        info : dict
+            Contains ctime, the simulation time, and the metrics of the episode, see episode_metrics. Last step of
+            the episode also contains episode_summary, the reward and the metrics of the episode and the target
+            position.
+
+        """
 
         if self.mode == 3:
             ##### (+1, 0, 0) -> (0, -1, 0) -> (-1, 0, 0) -> (0, +1, 0) -> (+1, 0, 0) #####
@@ -872,17 +1563,17 @@ class Environment(gym.Env):
                     ]
                     self.dir_indicator = 1
                 else:
-                    print("ERROR")
+                    self.log.warning(" Unknown target direction %s", self.dir_indicator)
 
         if self.mode == 4:
             self.trajectory_iteration += 1
             if self.trajectory_iteration == 500:
                 # print('changing direction')
-                self.rand_direction_1 = np.pi * np.random.uniform(0, 2)
+                self.rand_direction_1 = np.pi * self.rng.uniform(0, 2)
                 if self.dim == 2.0 or self.dim == 2.5:
                     self.rand_direction_2 = np.pi / 2.0
                 elif self.dim == 3.0 or self.dim == 3.5:
-                    self.rand_direction_2 = np.pi * np.random.uniform(0, 2)
+                    self.rand_direction_2 = np.pi * self.rng.uniform(0, 2)
 
                 self.v_x = (
                     self.target_v
@@ -903,10 +1594,15 @@ class Environment(gym.Env):
                 ]
                 self.trajectory_iteration = 0
 
+        if self.step_profiler is not None:
+            self.step_profiler.mark("target_update")
+
         self.current_step += 1
 
         # observe current state: current as sensed signal
         state = self.get_state()
+        if self.step_profiler is not None:
+            self.step_profiler.mark("get_state")
 
         dist = np.linalg.norm(
             self.shearable_rod.position_collection[..., -1]
@@ -922,21 +1618,32 @@ class Environment(gym.Env):
         orientation_penalty = -((orientation_dist) ** 2)
 
         reward = 1.0 * reward_dist + 0.5 * orientation_penalty
+        if self.reward_terms is not None:
+            reward += self.reward_terms.compute(
+                self.shearable_rod.position_collection,
+                self.sphere.position_collection[..., 0],
+            )
+
         """ Done is a boolean to reset the environment before episode is completed """
         done = False
 
+        if self.step_profiler is not None:
+            self.step_profiler.mark("reward")
+
         # Position of the rod cannot be NaN, it is not valid, stop the simulation
         invalid_values_condition = _isnan_check(self.shearable_rod.position_collection)
 
         if invalid_values_condition == True:
-            print(" Nan detected in the position, exiting simulation now")
-            self.shearable_rod.position_collection = np.zeros(
-                self.shearable_rod.position_collection.shape
-            )
+            self.log.warning(" Nan detected in the position, exiting simulation now")
+            self.episode_metrics["nan_terminated"] = True
+            self.shearable_rod.position_collection[...] = 0.0
             reward = -10000
             state = self.get_state()
             done = True
 
+        if self.step_profiler is not None:
+            self.step_profiler.mark("nan_check")
+
         if np.isclose(dist, 0.0, atol=0.05 * 2.0).all():
             reward += 0.5
             reward += 0.5 * (1 - orientation_dist)
@@ -946,6 +1653,9 @@ class Environment(gym.Env):
         # for this specific case, check on_goal parameter
         if np.isclose(dist, 0.0, atol=0.05).all():
             reward += 1.5
+            self.episode_metrics["on_goal_time"] += (
+                self.num_steps_per_update * self.time_step
+            )
             reward += 1.5 * (1 - orientation_dist)
             if np.isclose(orientation_dist, 0.0, atol=0.05).all():
                 reward += 1.5
@@ -953,29 +1663,74 @@ class Environment(gym.Env):
         if self.current_step >= self.total_learning_steps:
             done = True
             if reward > 0:
-                print(
-                    " Reward greater than 0! Reward: %0.3f, Distance: %0.3f, Orientation: %0.3f -- %0.3f, %0.3f "
-                    % (reward, dist, orientation_dist, reward_dist, orientation_penalty)
+                self.log.info(
+                    " Reward greater than 0! Reward: %0.3f, Distance: %0.3f, Orientation: %0.3f -- %0.3f, %0.3f ",
+                    reward,
+                    dist,
+                    orientation_dist,
+                    reward_dist,
+                    orientation_penalty,
                 )
             else:
-                print(
-                    " Finished simulation. Reward: %0.3f, Distance: %0.3f, Orientation: %0.3f -- %0.3f, %0.3f"
-                    % (reward, dist, orientation_dist, reward_dist, orientation_penalty)
+                self.log.info(
+                    " Finished simulation. Reward: %0.3f, Distance: %0.3f, Orientation: %0.3f -- %0.3f, %0.3f",
+                    reward,
+                    dist,
+                    orientation_dist,
+                    reward_dist,
+                    orientation_penalty,
                 )
         """ Done is a boolean to reset the environment before episode is completed """
 
         self.previous_action = action
 
+        if self.step_profiler is not None:
+            self.step_profiler.mark("reward")
+
         invalid_values_condition_state = _isnan_check(state)
         if invalid_values_condition_state == True:
-            print(
+            self.log.warning(
                 " Nan detected in the state other than position data, exiting simulation now"
             )
+            self.episode_metrics["nan_terminated"] = True
             reward = -10000
             state = np.zeros(state.shape)
             done = True
 
-        return state, reward, done, {"ctime": self.time_tracker}
+        if self.step_profiler is not None:
+            self.step_profiler.mark("nan_check")
+
+        self.episode_metrics["final_distance"] = float(dist)
+        self.episode_metrics["final_orientation_distance"] = float(orientation_dist)
+
+        info = {"ctime": self.time_tracker}
+        info.update(self.episode_metrics)
+        if self.reward_terms is not None:
+            info["reward_terms"] = self.reward_terms.get_values()
+        if done:
+            # Summary of the episode is given in the info dictionary, also if messages are turned off.
+            info["episode_summary"] = dict(
+                reward=float(reward),
+                target_position=self.episode_target_position,
+                **self.episode_metrics
+            )
+            self.log.episode(info["episode_summary"])
+
+        return state, reward, done, info
+
+    def get_profile(self):
+        """
+        This method returns statistics of the durations of the phases of step calls recorded by the profiler,
+        see StepProfiler.get_profile.
+
+        Returns
+        -------
+        dict
+            Statistics of the recorded steps. None if profile_step is false.
+        """
+        if self.step_profiler is None:
+            return None
+        return self.step_profiler.get_profile()
 
     def render(self, mode="human"):
         """
@@ -1011,6 +1766,8 @@ class Environment(gym.Env):
         """
 
         if self.COLLECT_DATA_FOR_POSTPROCESSING:
+            # Plotting modules are imported here, so training processes do not import matplotlib.
+            from post_processing import plot_video_with_sphere, plot_video_with_sphere_2D
 
             plot_video_with_sphere_2D(
                 [self.post_processing_dict_rod],
@@ -1068,3 +1825,54 @@ class Environment(gym.Env):
                 "call back function is not called anytime during simulation, "
                 "change COLLECT_DATA=True"
             )
+
+
+def warm_up_environment(n_steps=2, **kwargs):
+    """
+    This function compiles the Numba kernels used by the environment by running a short episode. Options are
+    the ones of the training script, so kernels are compiled for the same types as in training, and an
+    environment created afterwards in this process does not compile or load any kernel. Reward terms are
+    turned on with zero weight, so their kernel is compiled but reward is not changed. See numba_warm_up.py.
+
+    Parameters
+    ----------
+    n_steps : int
+        Number of steps after reset. Default is 2.
+    kwargs
+        Options overriding the options of the warm-up environment.
+
+    Returns
+    -------
+
+    """
+    settings = dict(
+        final_time=0.1,
+        num_steps_per_update=7,
+        number_of_control_points=6,
+        alpha=75,
+        beta=75,
+        mode=2,
+        target_position=[-0.4, 0.6, 0.2],
+        target_v=0.5,
+        boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+        E=1e7,
+        sim_dt=2.0e-4,
+        n_elem=20,
+        NU=30,
+        dim=3.5,
+        max_rate_of_change_of_activation=np.infty,
+        precompute_spline_basis=True,
+        reuse_simulator=True,
+        block_integration=True,
+        rollback_on_nan=True,
+        reward_terms=dict(tip_distance=0.0),
+        verbosity="quiet",
+        seed=0,
+    )
+    settings.update(kwargs)
+    env = Environment(**settings)
+    env.reset()
+    action = np.zeros(env.action_space.shape)
+    for _ in range(n_steps):
+        env.step(action)
+    env.close()
@@ -1,5 +1,9 @@
-__all__ = ["MuscleTorquesWithVaryingBetaSplines"]
+__all__ = [
+    "MuscleTorquesWithVaryingBetaSplines",
+    "FusedMuscleTorquesWithVaryingBetaSplines",
+]
 
 from MuscleTorquesWithBspline.BsplineMuscleTorques.muscle_torques_with_bspline import (
     MuscleTorquesWithVaryingBetaSplines,
+    FusedMuscleTorquesWithVaryingBetaSplines,
 )
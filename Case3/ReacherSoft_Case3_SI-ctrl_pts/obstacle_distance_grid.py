@@ -0,0 +1,959 @@
+__doc__ = """This file is for the contact between the arm (Cosserat rod) and static cylinders (obstacles) using a precomputed
+signed distance grid. Signed distances to the nearest obstacles and their gradients are computed once on a grid around
+the obstacles and cached to disk, contact forces are computed by trilinear interpolation of the grid instead of
+computing the distance between the rod elements and every cylinder."""
+
+import hashlib
+import os
+
+import numpy as np
+from numba import njit
+
+from static_obstacle_field import StaticObstacleField, _apply_static_obstacle_forces
+
+# Version of the grid file format, changing it invalidates cached grids.
+DISTANCE_GRID_VERSION = 1
+
+# Number of nearest cylinders stored at each grid node, element can be in contact with two crossing cylinders.
+NUMBER_OF_NEAREST_CYLINDERS = 2
+
+# Grids are cached in memory, so environments of the same process share them.
+_distance_grid_cache = {}
+
+
+class ObstacleDistanceGrid:
+    """
+    Signed distance grid of static cylinders. Cylinders are capsules around their axis segments, same as the
+    contact of Elastica. Signed distance, its gradient and index of the nearest and the second nearest cylinders
+    are stored at each grid node. Grid covers the bounding box of the cylinders expanded by band_distance, so
+    signed distance of points outside of the grid is larger than band_distance.
+
+    Attributes
+    ----------
+    key : str
+        Hash of the cylinder geometry and grid parameters, which is the name of the cached grid file.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type. Position of the first grid node.
+    spacing : float
+        Distance between grid nodes.
+    shape : tuple
+        Number of grid nodes in x, y and z directions.
+    band_distance : float
+        Signed distance, up to which grid is used.
+    values : numpy.ndarray
+        5D (nx, ny, nz, 2, 5) array containing data with 'float32' type. Signed distance, gradient of the signed
+        distance and index of the nearest and the second nearest cylinders at grid nodes.
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Start positions of cylinder axes.
+    cylinder_edges : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Cylinder axes.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    """
+
+    def __init__(self, cylinder_starts, cylinder_edges, cylinder_radii, band_distance, spacing):
+        """
+
+        Parameters
+        ----------
+        cylinder_starts : numpy.ndarray
+            2D (3, n_cylinders) array containing data with 'float' type. Start positions of cylinder axes.
+        cylinder_edges : numpy.ndarray
+            2D (3, n_cylinders) array containing data with 'float' type. Cylinder axes.
+        cylinder_radii : numpy.ndarray
+            1D (n_cylinders,) array containing data with 'float' type.
+        band_distance : float
+            Signed distance, up to which grid is used.
+        spacing : float
+            Distance between grid nodes.
+        """
+        self.cylinder_starts = np.ascontiguousarray(cylinder_starts, dtype=np.float64)
+        self.cylinder_edges = np.ascontiguousarray(cylinder_edges, dtype=np.float64)
+        self.cylinder_radii = np.ascontiguousarray(cylinder_radii, dtype=np.float64)
+        self.band_distance = float(band_distance)
+        self.spacing = float(spacing)
+
+        cylinder_ends = self.cylinder_starts + self.cylinder_edges
+        margin = self.cylinder_radii + self.band_distance + self.spacing
+        box_min = np.min(np.minimum(self.cylinder_starts, cylinder_ends) - margin, axis=1)
+        box_max = np.max(np.maximum(self.cylinder_starts, cylinder_ends) + margin, axis=1)
+        self.origin = box_min
+        self.shape = tuple(
+            int(n) for n in np.ceil((box_max - box_min) / self.spacing).astype(np.int64) + 1
+        )
+
+        key = hashlib.sha256()
+        key.update(
+            str((DISTANCE_GRID_VERSION, NUMBER_OF_NEAREST_CYLINDERS)).encode()
+        )
+        for array in (
+            self.cylinder_starts,
+            self.cylinder_edges,
+            self.cylinder_radii,
+            np.array([self.band_distance, self.spacing]),
+        ):
+            key.update(array.tobytes())
+        self.key = key.hexdigest()
+        self.values = None
+
+    def compute(self):
+        """
+        This method computes signed distances, gradients and nearest cylinders at grid nodes.
+
+        Returns
+        -------
+
+        """
+        values = np.zeros(
+            self.shape + (NUMBER_OF_NEAREST_CYLINDERS, 5), dtype=np.float32
+        )
+        _compute_distance_grid(
+            self.origin,
+            self.spacing,
+            self.cylinder_starts,
+            self.cylinder_edges,
+            self.cylinder_radii,
+            values,
+        )
+        self.values = values
+
+    def load(self, cache_directory):
+        """
+        This method loads the grid from the cache directory, grid is computed and saved if it is not cached.
+        Cached grid is memory-mapped, so processes using the same grid share it.
+
+        Parameters
+        ----------
+        cache_directory : str
+            Directory of cached grids.
+
+        Returns
+        -------
+
+        """
+        filename = os.path.join(cache_directory, self.key + ".npy")
+        shape = self.shape + (NUMBER_OF_NEAREST_CYLINDERS, 5)
+        if os.path.exists(filename):
+            values = np.load(filename, mmap_mode="r", allow_pickle=False)
+            if values.shape == shape and values.dtype == np.float32:
+                self.values = values
+                return
+
+        self.compute()
+        os.makedirs(cache_directory, exist_ok=True)
+        # Grid is written to a temporary file and renamed, so other processes never read a partial file.
+        temporary_filename = "%s.%d.tmp" % (filename, os.getpid())
+        with open(temporary_filename, "wb") as file:
+            np.save(file, self.values, allow_pickle=False)
+        os.replace(temporary_filename, filename)
+        self.values = np.load(filename, mmap_mode="r", allow_pickle=False)
+
+    def check_accuracy(self, number_of_samples=10000, seed=0):
+        """
+        This method compares the interpolated signed distance and contact normal with the exact ones, at random
+        points of the grid outside of the cylinders and closer to them than band_distance, where the rod can be
+        in contact.
+
+        Parameters
+        ----------
+        number_of_samples : int
+            Number of random points. Default is 10000.
+        seed : int
+            Seed of the random points. Default is 0.
+
+        Returns
+        -------
+        tuple
+            Errors of the signed distance and angles between interpolated and exact normals at the tested
+            points.
+        """
+        rng = np.random.default_rng(seed)
+        points = self.origin + rng.uniform(
+            self.spacing, (np.array(self.shape) - 2) * self.spacing, (number_of_samples, 3)
+        )
+        distance_errors = np.full(number_of_samples, np.nan)
+        normal_errors = np.full(number_of_samples, np.nan)
+        _check_distance_grid_accuracy(
+            np.asarray(self.values),
+            self.origin,
+            self.spacing,
+            self.band_distance,
+            self.cylinder_starts,
+            self.cylinder_edges,
+            self.cylinder_radii,
+            points,
+            distance_errors,
+            normal_errors,
+        )
+        tested = np.isfinite(distance_errors)
+        return distance_errors[tested], normal_errors[tested]
+
+
+def get_distance_grid(cylinders, band_distance, spacing, cache_directory=None):
+    """
+    Returns the signed distance grid of cylinders. Grid is loaded from the cache of the process or from
+    the cache directory, if grid of the same cylinders and parameters is cached, otherwise grid is computed.
+    Accuracy of the grid is checked and printed, when it is used first time in the process.
+
+    Parameters
+    ----------
+    cylinders : list
+        Cylinders.
+    band_distance : float
+        Signed distance, up to which grid is used.
+    spacing : float
+        Distance between grid nodes.
+    cache_directory : str
+        Directory of cached grids. Default is None, grid is not saved to disk.
+
+    Returns
+    -------
+    ObstacleDistanceGrid
+
+    """
+    cylinder_starts = np.zeros((3, len(cylinders)))
+    cylinder_edges = np.zeros((3, len(cylinders)))
+    for i, cylinder in enumerate(cylinders):
+        cylinder_edges[:, i] = cylinder.length * cylinder.director_collection[2, :, 0]
+        cylinder_starts[:, i] = (
+            cylinder.position_collection[:, 0] - 0.5 * cylinder_edges[:, i]
+        )
+    cylinder_radii = np.array([cylinder.radius for cylinder in cylinders], dtype=np.float64)
+
+    distance_grid = ObstacleDistanceGrid(
+        cylinder_starts, cylinder_edges, cylinder_radii, band_distance, spacing
+    )
+    if distance_grid.key in _distance_grid_cache:
+        return _distance_grid_cache[distance_grid.key]
+
+    if cache_directory is None:
+        distance_grid.compute()
+    else:
+        distance_grid.load(cache_directory)
+
+    # Largest errors are at the points, where the nearest cylinder changes.
+    distance_errors, normal_errors = distance_grid.check_accuracy()
+    print(
+        " Obstacle distance grid %s, distance error median %.1e, 99%% %.1e, max %.1e, "
+        "normal error 99%% %.1e rad"
+        % (
+            "x".join(str(n) for n in distance_grid.shape),
+            np.median(distance_errors),
+            np.percentile(distance_errors, 99),
+            np.max(distance_errors),
+            np.percentile(normal_errors, 99),
+        )
+    )
+    _distance_grid_cache[distance_grid.key] = distance_grid
+    return distance_grid
+
+
+class DistanceGridObstacleField(StaticObstacleField):
+    """
+    Forcing applying contact forces of static cylinders on the rod, using a signed distance grid of the cylinders.
+    Candidate cylinders of each rod element are the cylinders stored at the grid nodes around the element. For
+    each candidate, signed distance is interpolated at the nodes and the middle of the element, and the closest
+    point of the element is found by a parabola through these distances. Contact forces are computed at the
+    closest point with the contact model of ExternalContact.
+
+    Contact forces are approximated. Cylinders in contact with an element, which are not one of the two nearest
+    cylinders of the grid nodes around the element, are missed. Use compare_with_exact_contact to check the
+    forces.
+
+    Attributes
+    ----------
+    distance_grid : ObstacleDistanceGrid
+        Signed distance grid of the cylinders.
+    node_distances : numpy.ndarray
+        1D (n_nodes,) array containing data with 'float' type. Signed distances of rod nodes to the nearest
+        cylinder.
+    """
+
+    def __init__(self, cylinders, k, nu, contact_distance, spacing=0.01, cache_directory=None):
+        """
+
+        Parameters
+        ----------
+        cylinders : list
+            Cylinders, which are not appended to the simulator.
+        k : float
+            Contact stiffness.
+        nu : float
+            Contact damping.
+        contact_distance : float
+            Largest radius of the rod elements.
+        spacing : float
+            Distance between grid nodes. Default is 0.01.
+        cache_directory : str
+            Directory of cached grids. Default is None, grid is not saved to disk.
+        """
+        super().__init__(cylinders, k, nu)
+        # Grid covers the points, at which the element can be in contact with the cylinders.
+        self.distance_grid = get_distance_grid(
+            cylinders, contact_distance + 2.0 * spacing, spacing, cache_directory
+        )
+        self.node_distances = np.zeros(0)
+
+    def apply_forces(self, system, time: np.float64 = 0.0):
+        if self.node_distances.shape[0] != system.n_elems + 1:
+            self.node_distances = np.zeros(system.n_elems + 1)
+        _apply_distance_grid_forces(
+            system.position_collection,
+            system.velocity_collection,
+            system.lengths,
+            system.tangents,
+            system.radius,
+            system.internal_forces,
+            system.external_forces,
+            np.asarray(self.distance_grid.values),
+            self.distance_grid.origin,
+            np.float64(self.distance_grid.spacing),
+            np.float64(self.distance_grid.band_distance),
+            self.node_distances,
+            self.cylinder_forces,
+            np.float64(self.k),
+            np.float64(self.nu),
+        )
+
+    def compare_with_exact_contact(self, system):
+        """
+        This method computes contact forces of the cylinders on the current state of the rod using the grid, and
+        using the segment distances of ExternalContact. States of the rod are not changed.
+
+        Parameters
+        ----------
+        system : object
+            Rod-like object.
+
+        Returns
+        -------
+        tuple
+            Maximum difference of the nodal contact forces and maximum nodal contact force of ExternalContact.
+        """
+        contact_forces = []
+        for apply_forces in (self._apply_exact_forces, self.apply_forces):
+            external_forces = system.external_forces.copy()
+            cylinder_forces = self.cylinder_forces.copy()
+            apply_forces(system)
+            contact_forces.append(system.external_forces - external_forces)
+            system.external_forces[...] = external_forces
+            self.cylinder_forces[...] = cylinder_forces
+        exact_forces, grid_forces = contact_forces
+        return (
+            np.max(np.abs(grid_forces - exact_forces)),
+            np.max(np.abs(exact_forces)),
+        )
+
+    def _apply_exact_forces(self, system):
+        _apply_static_obstacle_forces(
+            system.position_collection,
+            system.velocity_collection,
+            system.lengths,
+            system.tangents,
+            system.radius,
+            system.internal_forces,
+            system.external_forces,
+            self.cylinder_positions,
+            self.cylinder_directors,
+            self.cylinder_radii,
+            self.cylinder_lengths,
+            self.cylinder_forces,
+            self.cylinder_velocities,
+            np.float64(self.k),
+            np.float64(self.nu),
+            False,
+            self.contact_counters,
+        )
+
+
+@njit(cache=True)
+def _compute_cylinder_distance(point, cylinder_start, cylinder_edge, cylinder_radius, gradient):
+    """
+    This function returns the signed distance of the point to a cylinder, gradient of the signed distance is
+    written to gradient.
+
+    Parameters
+    ----------
+    point : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    cylinder_start : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    cylinder_edge : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    cylinder_radius : float
+    gradient : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+
+    Returns
+    -------
+    float
+
+    """
+    # Closest point of the cylinder axis.
+    projection = 0.0
+    edge_length_squared = 0.0
+    for k in range(3):
+        projection += (point[k] - cylinder_start[k]) * cylinder_edge[k]
+        edge_length_squared += cylinder_edge[k] ** 2
+    t = min(max(projection / edge_length_squared, 0.0), 1.0)
+
+    for k in range(3):
+        gradient[k] = point[k] - cylinder_start[k] - t * cylinder_edge[k]
+    distance = np.sqrt(gradient[0] ** 2 + gradient[1] ** 2 + gradient[2] ** 2)
+    for k in range(3):
+        gradient[k] /= max(distance, 1e-14)
+    return distance - cylinder_radius
+
+
+@njit(cache=True)
+def _compute_distance_grid(
+    origin, spacing, cylinder_starts, cylinder_edges, cylinder_radii, values
+):
+    """
+    This function computes signed distances, gradients and indices of the nearest cylinders at grid nodes.
+    Index of a missing cylinder is -1, if there are less cylinders than stored at a node.
+
+    Parameters
+    ----------
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_edges : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+
+    Returns
+    -------
+
+    """
+    n_nearest = values.shape[3]
+    point = np.zeros(3)
+    gradient = np.zeros(3)
+    nearest_distances = np.zeros(n_nearest)
+    for ix in range(values.shape[0]):
+        point[0] = origin[0] + ix * spacing
+        for iy in range(values.shape[1]):
+            point[1] = origin[1] + iy * spacing
+            for iz in range(values.shape[2]):
+                point[2] = origin[2] + iz * spacing
+                nearest_distances[:] = np.inf
+                values[ix, iy, iz, :, 4] = -1.0
+                for j in range(cylinder_radii.shape[0]):
+                    signed_distance = _compute_cylinder_distance(
+                        point,
+                        cylinder_starts[:, j],
+                        cylinder_edges[:, j],
+                        cylinder_radii[j],
+                        gradient,
+                    )
+                    # Insert the cylinder into the sorted nearest cylinders.
+                    layer = n_nearest
+                    while layer > 0 and signed_distance < nearest_distances[layer - 1]:
+                        layer -= 1
+                    if layer == n_nearest:
+                        continue
+                    for shifted in range(n_nearest - 1, layer, -1):
+                        nearest_distances[shifted] = nearest_distances[shifted - 1]
+                        values[ix, iy, iz, shifted] = values[ix, iy, iz, shifted - 1]
+                    nearest_distances[layer] = signed_distance
+                    values[ix, iy, iz, layer, 0] = signed_distance
+                    values[ix, iy, iz, layer, 1:4] = gradient
+                    values[ix, iy, iz, layer, 4] = j
+
+
+@njit(cache=True)
+def _get_corner(index_x, index_y, index_z, weight_x, weight_y, weight_z, corner):
+    """
+    This function returns the grid indices and the interpolation weight of a corner of the grid cell.
+
+    Parameters
+    ----------
+    index_x : int
+    index_y : int
+    index_z : int
+    weight_x : float
+    weight_y : float
+    weight_z : float
+    corner : int
+        Corner of the cell, from 0 to 7.
+
+    Returns
+    -------
+    tuple
+
+    """
+    offset_x = corner & 1
+    offset_y = (corner >> 1) & 1
+    offset_z = (corner >> 2) & 1
+    corner_weight = (
+        (weight_x if offset_x else 1.0 - weight_x)
+        * (weight_y if offset_y else 1.0 - weight_y)
+        * (weight_z if offset_z else 1.0 - weight_z)
+    )
+    return index_x + offset_x, index_y + offset_y, index_z + offset_z, corner_weight
+
+
+@njit(cache=True)
+def _interpolate_cylinder_distance(
+    values, origin, spacing, band_distance, point, cylinder, gradient
+):
+    """
+    This function returns the interpolated signed distance of the point to a cylinder, interpolated gradient is
+    written to gradient. Distance is interpolated from the corners of the grid cell, at which the cylinder is
+    stored. If cylinder is stored at all corners, signed distances of the corners are corrected by half of their
+    gradients, so interpolation is exact for quadratic distances. Otherwise, signed distances of the corners are
+    extrapolated by their gradients. If point is outside of the grid or cylinder is not stored at any corner,
+    band_distance is returned.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    band_distance : float
+    point : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    cylinder : int
+    gradient : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+
+    Returns
+    -------
+    float
+
+    """
+    coordinate_x = (point[0] - origin[0]) / spacing
+    coordinate_y = (point[1] - origin[1]) / spacing
+    coordinate_z = (point[2] - origin[2]) / spacing
+    if not (
+        0.0 <= coordinate_x < values.shape[0] - 1
+        and 0.0 <= coordinate_y < values.shape[1] - 1
+        and 0.0 <= coordinate_z < values.shape[2] - 1
+    ):
+        return band_distance
+    index_x = int(coordinate_x)
+    index_y = int(coordinate_y)
+    index_z = int(coordinate_z)
+    weight_x = coordinate_x - index_x
+    weight_y = coordinate_y - index_y
+    weight_z = coordinate_z - index_z
+
+    total_weight = 0.0
+    distance = 0.0
+    correction = 0.0
+    gradient[:] = 0.0
+    for corner in range(8):
+        ix, iy, iz, corner_weight = _get_corner(
+            index_x, index_y, index_z, weight_x, weight_y, weight_z, corner
+        )
+        for layer in range(values.shape[3]):
+            if int(values[ix, iy, iz, layer, 4]) != cylinder:
+                continue
+            total_weight += corner_weight
+            distance += corner_weight * values[ix, iy, iz, layer, 0]
+            correction += (
+                corner_weight
+                * spacing
+                * (
+                    values[ix, iy, iz, layer, 1] * (coordinate_x - ix)
+                    + values[ix, iy, iz, layer, 2] * (coordinate_y - iy)
+                    + values[ix, iy, iz, layer, 3] * (coordinate_z - iz)
+                )
+            )
+            for k in range(3):
+                gradient[k] += corner_weight * values[ix, iy, iz, layer, 1 + k]
+            break
+
+    if total_weight == 0.0:
+        return band_distance
+    if total_weight > 1.0 - 1e-12:
+        distance += 0.5 * correction
+    else:
+        distance = (distance + correction) / total_weight
+
+    gradient_norm = np.sqrt(gradient[0] ** 2 + gradient[1] ** 2 + gradient[2] ** 2)
+    for k in range(3):
+        gradient[k] /= max(gradient_norm, 1e-14)
+    return distance
+
+
+@njit(cache=True)
+def _find_candidate_cylinders(values, origin, spacing, point, candidates, n_candidates):
+    """
+    This function adds the cylinders stored at the corners of the grid cell of the point to candidates, if they
+    are not added yet, and returns the number of candidates.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    point : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    candidates : numpy.ndarray
+        1D array containing data with 'int' type.
+    n_candidates : int
+        Number of candidates already added.
+
+    Returns
+    -------
+    int
+
+    """
+    coordinate_x = (point[0] - origin[0]) / spacing
+    coordinate_y = (point[1] - origin[1]) / spacing
+    coordinate_z = (point[2] - origin[2]) / spacing
+    if not (
+        0.0 <= coordinate_x < values.shape[0] - 1
+        and 0.0 <= coordinate_y < values.shape[1] - 1
+        and 0.0 <= coordinate_z < values.shape[2] - 1
+    ):
+        return n_candidates
+    for corner in range(8):
+        ix, iy, iz, _ = _get_corner(
+            int(coordinate_x), int(coordinate_y), int(coordinate_z), 0.0, 0.0, 0.0, corner
+        )
+        for layer in range(values.shape[3]):
+            cylinder = int(values[ix, iy, iz, layer, 4])
+            if cylinder < 0:
+                continue
+            added = False
+            for i in range(n_candidates):
+                if candidates[i] == cylinder:
+                    added = True
+            if not added and n_candidates < candidates.shape[0]:
+                candidates[n_candidates] = cylinder
+                n_candidates += 1
+    return n_candidates
+
+
+@njit(cache=True)
+def _interpolate_distance(values, origin, spacing, band_distance, point, gradient):
+    """
+    This function returns the interpolated signed distance of the point to the nearest cylinder and its index,
+    interpolated gradient is written to gradient. Distances to the nearest cylinders of the corners of the grid
+    cell are interpolated and the smallest one is returned. If point is outside of the grid or farther than
+    band_distance, band_distance and -1 are returned.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    band_distance : float
+    point : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    gradient : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+
+    Returns
+    -------
+    tuple
+
+    """
+    coordinate_x = (point[0] - origin[0]) / spacing
+    coordinate_y = (point[1] - origin[1]) / spacing
+    coordinate_z = (point[2] - origin[2]) / spacing
+    if not (
+        0.0 <= coordinate_x < values.shape[0] - 1
+        and 0.0 <= coordinate_y < values.shape[1] - 1
+        and 0.0 <= coordinate_z < values.shape[2] - 1
+    ):
+        return band_distance, -1
+    index_x = int(coordinate_x)
+    index_y = int(coordinate_y)
+    index_z = int(coordinate_z)
+
+    # Signed distance changes at most as fast as the position, so point is not in the band if the closest
+    # corner is far.
+    if (
+        values[int(coordinate_x + 0.5), int(coordinate_y + 0.5), int(coordinate_z + 0.5), 0, 0]
+        - spacing
+        > band_distance
+    ):
+        return band_distance, -1
+
+    signed_distance = band_distance
+    nearest = -1
+    cylinder_gradient = np.zeros(3)
+    for corner in range(8):
+        ix, iy, iz, _ = _get_corner(index_x, index_y, index_z, 0.0, 0.0, 0.0, corner)
+        cylinder = int(values[ix, iy, iz, 0, 4])
+        already_interpolated = False
+        for previous_corner in range(corner):
+            jx, jy, jz, _ = _get_corner(
+                index_x, index_y, index_z, 0.0, 0.0, 0.0, previous_corner
+            )
+            if int(values[jx, jy, jz, 0, 4]) == cylinder:
+                already_interpolated = True
+        if already_interpolated:
+            continue
+
+        cylinder_distance = _interpolate_cylinder_distance(
+            values, origin, spacing, band_distance, point, cylinder, cylinder_gradient
+        )
+        if cylinder_distance < signed_distance:
+            signed_distance = cylinder_distance
+            nearest = cylinder
+            gradient[:] = cylinder_gradient
+    return signed_distance, nearest
+
+
+@njit(cache=True)
+def _check_distance_grid_accuracy(
+    values,
+    origin,
+    spacing,
+    band_distance,
+    cylinder_starts,
+    cylinder_edges,
+    cylinder_radii,
+    points,
+    distance_errors,
+    normal_errors,
+):
+    """
+    This function computes errors of interpolated signed distances and normals at the points outside of the
+    cylinders and closer to them than band_distance. Errors of other points are not changed.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    band_distance : float
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_edges : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    points : numpy.ndarray
+        2D (n_points, 3) array containing data with 'float' type.
+    distance_errors : numpy.ndarray
+        1D (n_points,) array containing data with 'float' type.
+    normal_errors : numpy.ndarray
+        1D (n_points,) array containing data with 'float' type.
+
+    Returns
+    -------
+
+    """
+    cylinder_gradient = np.zeros(3)
+    exact_gradient = np.zeros(3)
+    gradient = np.zeros(3)
+    for i in range(points.shape[0]):
+        exact_distance = np.inf
+        for j in range(cylinder_radii.shape[0]):
+            cylinder_distance = _compute_cylinder_distance(
+                points[i],
+                cylinder_starts[:, j],
+                cylinder_edges[:, j],
+                cylinder_radii[j],
+                cylinder_gradient,
+            )
+            if cylinder_distance < exact_distance:
+                exact_distance = cylinder_distance
+                exact_gradient[:] = cylinder_gradient
+        if exact_distance < 0.0 or exact_distance > band_distance:
+            continue
+
+        signed_distance, _ = _interpolate_distance(
+            values, origin, spacing, band_distance, points[i], gradient
+        )
+        distance_errors[i] = abs(signed_distance - exact_distance)
+        cosine = (
+            gradient[0] * exact_gradient[0]
+            + gradient[1] * exact_gradient[1]
+            + gradient[2] * exact_gradient[2]
+        )
+        normal_errors[i] = np.arccos(min(max(cosine, -1.0), 1.0))
+
+
+@njit(cache=True)
+def _apply_distance_grid_forces(
+    position_collection,
+    velocity_collection,
+    lengths,
+    tangents,
+    radius,
+    internal_forces,
+    external_forces,
+    values,
+    origin,
+    spacing,
+    band_distance,
+    node_distances,
+    cylinder_forces,
+    contact_k,
+    contact_nu,
+):
+    """
+    This function applies contact forces of the cylinders on the rod using the signed distance grid. Contact
+    model is same as the contact of Elastica, cylinder velocities are zero.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    velocity_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    lengths : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    tangents : numpy.ndarray
+        2D (3, n_elems) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    internal_forces : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    external_forces : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    values : numpy.ndarray
+        5D (nx, ny, nz, n_nearest, 5) array containing data with 'float32' type.
+    origin : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    spacing : float
+    band_distance : float
+    node_distances : numpy.ndarray
+        1D (n_nodes,) array containing data with 'float' type.
+    cylinder_forces : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    contact_k : float
+    contact_nu : float
+
+    Returns
+    -------
+
+    """
+    # External forces of cylinders are reset every time step.
+    cylinder_forces[...] = 0.0
+
+    # Points outside of the grid are not in contact, so rod is not in contact if all nodes are on the same side
+    # of the grid.
+    for k in range(3):
+        if (
+            np.max(position_collection[k]) < origin[k]
+            or np.min(position_collection[k])
+            > origin[k] + (values.shape[k] - 1) * spacing
+        ):
+            return
+
+    gradient = np.zeros(3)
+    point = np.zeros(3)
+    distances = np.zeros(3)
+    for i in range(node_distances.shape[0]):
+        node_distances[i], _ = _interpolate_distance(
+            values, origin, spacing, band_distance, position_collection[:, i], gradient
+        )
+
+    # Candidate cylinders of each element are stored around the nodes and the middle of the element.
+    candidates = np.zeros((lengths.shape[0], 3 * 8 * values.shape[3]), dtype=np.int64)
+    n_candidates = np.zeros(lengths.shape[0], dtype=np.int64)
+    in_contact = np.zeros(cylinder_forces.shape[1], dtype=np.bool_)
+    for i in range(lengths.shape[0]):
+        # Signed distance changes at most as fast as the position, closest point of the element cannot be in
+        # contact if nodes are far. Margin is larger than the interpolation error.
+        if (
+            0.5 * (node_distances[i] + node_distances[i + 1] - lengths[i])
+            > radius[i] + 0.5 * spacing
+        ):
+            continue
+        for sample in range(3):
+            for k in range(3):
+                point[k] = (
+                    position_collection[k, i] + 0.5 * sample * lengths[i] * tangents[k, i]
+                )
+            n_candidates[i] = _find_candidate_cylinders(
+                values, origin, spacing, point, candidates[i], n_candidates[i]
+            )
+        for candidate in range(n_candidates[i]):
+            in_contact[candidates[i, candidate]] = True
+
+    # Cylinders and elements are in the same order as ExternalContact connections, since the normal force
+    # depends on the forces of the previous contacts.
+    for cylinder in range(cylinder_forces.shape[1]):
+        if not in_contact[cylinder]:
+            continue
+        for i in range(lengths.shape[0]):
+            is_candidate = False
+            for candidate in range(n_candidates[i]):
+                if candidates[i, candidate] == cylinder:
+                    is_candidate = True
+            if not is_candidate:
+                continue
+
+            # Closest point of the element, minimum of the parabola through distances of nodes and middle
+            # point.
+            for sample in range(3):
+                for k in range(3):
+                    point[k] = (
+                        position_collection[k, i]
+                        + 0.5 * sample * lengths[i] * tangents[k, i]
+                    )
+                distances[sample] = _interpolate_cylinder_distance(
+                    values, origin, spacing, band_distance, point, cylinder, gradient
+                )
+            curvature = 2.0 * (distances[0] - 2.0 * distances[1] + distances[2])
+            slope = distances[2] - distances[0] - curvature
+            if curvature > 0.0:
+                s = min(max(-slope / (2.0 * curvature), 0.0), 1.0)
+            elif distances[0] < distances[2]:
+                s = 0.0
+            else:
+                s = 1.0
+            for k in range(3):
+                point[k] = position_collection[k, i] + s * lengths[i] * tangents[k, i]
+            signed_distance = _interpolate_cylinder_distance(
+                values, origin, spacing, band_distance, point, cylinder, gradient
+            )
+
+            gamma = radius[i] - signed_distance
+            if gamma < -1e-5:
+                continue
+
+            # Same as _calculate_contact_forces of Elastica, distance vector from the rod to the cylinder is
+            # opposite of the gradient.
+            normal_force = 0.0
+            contact_damping_force = 0.0
+            for k in range(3):
+                rod_elemental_force = 0.5 * (
+                    external_forces[k, i]
+                    + external_forces[k, i + 1]
+                    + internal_forces[k, i]
+                    + internal_forces[k, i + 1]
+                )
+                normal_force -= (
+                    -rod_elemental_force + cylinder_forces[k, cylinder]
+                ) * gradient[k]
+                contact_damping_force -= (
+                    0.5 * (velocity_collection[k, i] + velocity_collection[k, i + 1])
+                ) * gradient[k]
+            normal_force = abs(min(normal_force, 0.0))
+            mask = (gamma > 0.0) * 1.0
+            magnitude = normal_force + 0.5 * mask * (
+                contact_nu * contact_damping_force + contact_k * gamma
+            )
+
+            for k in range(3):
+                net_contact_force = -magnitude * gradient[k]
+                if i == 0:
+                    external_forces[k, i] -= 0.5 * net_contact_force
+                    external_forces[k, i + 1] -= net_contact_force
+                    cylinder_forces[k, cylinder] += 1.5 * net_contact_force
+                else:
+                    external_forces[k, i] -= net_contact_force
+                    external_forces[k, i + 1] -= net_contact_force
+                    cylinder_forces[k, cylinder] += 2.0 * net_contact_force
@@ -0,0 +1,321 @@
+__doc__ = """This file is for running copies of the environment in worker processes. Observations, actions,
+rewards and done booleans are exchanged through shared memory buffers, so a single training run can collect
+rollouts on many cores. Worker pool is interfaced with stable-baselines as a vectorized environment (VecEnv),
+and it can be used with algorithms supporting vectorized environments such as PPO2."""
+
+import multiprocessing
+import os
+
+import numpy as np
+
+from stable_baselines.bench.monitor import Monitor
+from stable_baselines.common.vec_env import VecEnv
+
+from set_environment import Environment
+from random_streams import get_seed_sequence
+
+
+def _worker(
+    remote,
+    parent_remote,
+    rank,
+    seed,
+    env_kwargs,
+    monitor_dir,
+    shared_buffers,
+    observation_shape,
+    action_shape,
+):
+    """
+    Worker process, which owns one environment. Worker waits for commands sent by the
+    SharedMemoryVecEnv, reads actions from and writes observations, rewards and done booleans to
+    shared memory buffers.
+
+    Parameters
+    ----------
+    remote : multiprocessing.connection.Connection
+        Worker end of the pipe.
+    parent_remote : multiprocessing.connection.Connection
+        SharedMemoryVecEnv end of the pipe, closed in the worker.
+    rank : int
+        Index of the worker.
+    seed : numpy.random.SeedSequence
+        Seed sequence of the random number generator of the environment.
+    env_kwargs : dict
+        Keyword arguments to create the environment.
+    monitor_dir : str
+        If given, environment is wrapped by stable-baselines Monitor writing in this directory, metrics of
+        the episodes are written as extra columns.
+    shared_buffers : tuple
+        Shared memory buffers for observations, actions, rewards and dones.
+    observation_shape : tuple
+        Shape of the observations.
+    action_shape : tuple
+        Shape of the actions.
+
+    Returns
+    -------
+
+    """
+    parent_remote.close()
+
+    observations, actions, rewards, dones = _buffers_as_arrays(
+        shared_buffers, observation_shape, action_shape
+    )
+
+    # Each worker is seeded with a different but deterministic seed sequence.
+    # Messages of workers are prefixed by their rank.
+    env_kwargs = dict(
+        env_kwargs, log_prefix="%s[%d]" % (env_kwargs.get("log_prefix", ""), rank)
+    )
+    env = Environment(seed=seed, **env_kwargs)
+    if monitor_dir is not None:
+        env = Monitor(
+            env,
+            os.path.join(monitor_dir, str(rank)),
+            info_keywords=Environment.episode_metric_names,
+        )
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, done, info = env.step(actions[rank].copy())
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = observation
+                    observation = env.reset()
+                observations[rank] = observation
+                rewards[rank] = reward
+                dones[rank] = done
+                remote.send(info)
+            elif cmd == "reset":
+                observations[rank] = env.reset()
+                remote.send(None)
+            elif cmd == "seed":
+                remote.send(env.unwrapped.seed(data))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(cmd)
+    except KeyboardInterrupt:
+        print("SharedMemoryVecEnv worker: got KeyboardInterrupt")
+
+
+def _buffers_as_arrays(shared_buffers, observation_shape, action_shape):
+    """
+    Returns numpy arrays using the shared memory buffers.
+
+    Parameters
+    ----------
+    shared_buffers : tuple
+        Shared memory buffers for observations, actions, rewards and dones.
+    observation_shape : tuple
+        Shape of the observations.
+    action_shape : tuple
+        Shape of the actions.
+
+    Returns
+    -------
+    tuple
+        numpy.ndarray views of observations, actions, rewards and dones buffers.
+    """
+    observation_buffer, action_buffer, reward_buffer, done_buffer = shared_buffers
+    observations = np.frombuffer(observation_buffer, dtype=np.float64).reshape(
+        (-1,) + observation_shape
+    )
+    actions = np.frombuffer(action_buffer, dtype=np.float64).reshape(
+        (-1,) + action_shape
+    )
+    rewards = np.frombuffer(reward_buffer, dtype=np.float64)
+    dones = np.frombuffer(done_buffer, dtype=np.bool_)
+    return observations, actions, rewards, dones
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+
+    Vectorized environment, which runs each copy of the Environment in a separate worker process.
+    Observations, actions, rewards and dones of all environments are stored in shared memory buffers,
+    only the commands and info dictionaries are sent through pipes. Environments are reset by workers
+    when they are done, and terminal observation is given in the info dictionary.
+
+    Attributes
+    ----------
+    remotes : list
+        Pipes used to send commands to workers.
+    processes : list
+        Worker processes.
+    observations : numpy.ndarray
+        2D (num_envs, number_of_states) array containing data with 'float' type.
+        Shared memory buffer of observations.
+    actions : numpy.ndarray
+        2D (num_envs, action_size) array containing data with 'float' type.
+        Shared memory buffer of actions.
+    rewards : numpy.ndarray
+        1D (num_envs,) array containing data with 'float' type.
+        Shared memory buffer of rewards.
+    dones : numpy.ndarray
+        1D (num_envs,) array containing data with 'bool' type.
+        Shared memory buffer of done booleans.
+    """
+
+    def __init__(
+        self,
+        n_envs,
+        seed=0,
+        monitor_dir=None,
+        worker_kwargs=None,
+        start_method=None,
+        **env_kwargs
+    ):
+        """
+
+        Parameters
+        ----------
+        n_envs : int
+            Number of environments (worker processes).
+        seed : int or numpy.random.SeedSequence
+            Environment of worker with rank i is seeded with the i-th seed sequence spawned from this seed.
+            Default is 0.
+        monitor_dir : str
+            If given, each environment is wrapped by stable-baselines Monitor, writing <rank>.monitor.csv in
+            this directory. Default is None.
+        worker_kwargs : dict
+            Keyword arguments of environments, which are only used in workers. An environment is created in the
+            main process to determine observation and action spaces, these arguments are not passed to that
+            environment. Default is None.
+        start_method : str
+            Start method of worker processes, see multiprocessing.get_context. Default is None, the default start
+            method of the platform is used. Note that, spawn and forkserver requires the main script to be
+            guarded by if __name__ == "__main__".
+        **env_kwargs
+            Arbitrary keyword arguments, passed to each Environment.
+        """
+        self.closed = False
+        self.waiting = False
+
+        # Environment in the main process is only used to determine the spaces.
+        seed_sequence = get_seed_sequence(seed)
+        env = Environment(seed=seed_sequence, **env_kwargs)
+        observation_space = env.observation_space
+        action_space = env.action_space
+        obstacle_nest_key = getattr(env, "obstacle_nest_key", None)
+        del env
+        super(SharedMemoryVecEnv, self).__init__(
+            n_envs, observation_space, action_space
+        )
+
+        worker_env_kwargs = dict(env_kwargs)
+        # Workers load the obstacle nest of the environment in the main process from the nest cache, so they
+        # use the same nest even if other training runs generate new nests.
+        if obstacle_nest_key is not None:
+            worker_env_kwargs["obstacle_nest_key"] = obstacle_nest_key
+        if worker_kwargs is not None:
+            worker_env_kwargs.update(worker_kwargs)
+
+        context = multiprocessing.get_context(start_method)
+
+        observation_shape = observation_space.shape
+        action_shape = action_space.shape
+        shared_buffers = (
+            context.RawArray("d", n_envs * int(np.prod(observation_shape))),
+            context.RawArray("d", n_envs * int(np.prod(action_shape))),
+            context.RawArray("d", n_envs),
+            context.RawArray("b", n_envs),
+        )
+        self.observations, self.actions, self.rewards, self.dones = _buffers_as_arrays(
+            shared_buffers, observation_shape, action_shape
+        )
+
+        self.remotes, self.work_remotes = zip(*[context.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        seed_sequences = seed_sequence.spawn(n_envs)
+        for rank, (work_remote, remote) in enumerate(
+            zip(self.work_remotes, self.remotes)
+        ):
+            args = (
+                work_remote,
+                remote,
+                rank,
+                seed_sequences[rank],
+                worker_env_kwargs,
+                monitor_dir,
+                shared_buffers,
+                observation_shape,
+                action_shape,
+            )
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = context.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        for remote in self.remotes:
+            remote.recv()
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        self.actions[:] = actions
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        return (
+            self.observations.copy(),
+            self.rewards.copy(),
+            self.dones.copy(),
+            infos,
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def seed(self, seed=None):
+        seed_sequences = get_seed_sequence(seed).spawn(self.num_envs)
+        for remote, seed_sequence in zip(self.remotes, seed_sequences):
+            remote.send(("seed", seed_sequence))
+        return [remote.recv()[0] for remote in self.remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
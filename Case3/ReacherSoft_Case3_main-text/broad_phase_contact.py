@@ -0,0 +1,135 @@
+__doc__ = """This file is for the broad-phase test of the contact between the arm (Cosserat rod) and cylinders
+(obstacles). Before computing the contact forces of a rod-cylinder pair, bounding boxes of rod elements are tested
+against the bounding box of the cylinder, and the contact forces are not computed if no element can reach the
+cylinder."""
+
+import numpy as np
+from numba import njit
+
+from elastica.joint import ExternalContact
+
+# Elastica computes contact forces of elements closer than radii sum plus 1e-5, margin of bounding boxes is
+# larger to be safe from round-off errors.
+BROAD_PHASE_MARGIN = 2e-5
+
+
+class ExternalContactWithBroadPhase(ExternalContact):
+    """
+    ExternalContact between rod and cylinder with a broad-phase test. Every time step, bounding boxes of rod elements
+    are tested against the bounding box of the cylinder. If none of them intersect, rod-cylinder pair is culled and
+    narrow-phase contact is not computed. Contact forces are same as ExternalContact.
+
+    Attributes
+    ----------
+    contact_counters : numpy.ndarray
+        1D (2,) array containing data with 'int' type. Number of tested and culled rod-cylinder pairs. It can be
+        shared by many connections.
+    """
+
+    def __init__(self, k, nu, contact_counters=None):
+        """
+
+        Parameters
+        ----------
+        k : float
+            Contact stiffness.
+        nu : float
+            Contact damping.
+        contact_counters : numpy.ndarray
+            1D (2,) array containing data with 'int' type. Number of tested and culled rod-cylinder pairs are
+            added to this array. Default is None, new array is created.
+        """
+        super().__init__(k, nu)
+        if contact_counters is None:
+            contact_counters = np.zeros(2, dtype=np.int64)
+        self.contact_counters = contact_counters
+
+    def apply_forces(self, rod_one, index_one, cylinder_two, index_two):
+        if _cull_rod_cylinder_pair(
+            rod_one.position_collection,
+            rod_one.lengths,
+            rod_one.tangents,
+            rod_one.radius,
+            cylinder_two.position_collection,
+            cylinder_two.director_collection,
+            cylinder_two.radius,
+            cylinder_two.length,
+            self.contact_counters,
+        ):
+            return
+
+        super().apply_forces(rod_one, index_one, cylinder_two, index_two)
+
+
+@njit(cache=True)
+def _cull_rod_cylinder_pair(
+    position_collection,
+    lengths,
+    tangents,
+    radius,
+    cylinder_position,
+    cylinder_director,
+    cylinder_radius,
+    cylinder_length,
+    contact_counters,
+):
+    """
+    This function returns true if bounding boxes of all rod elements are separated from the bounding box of the
+    cylinder. Element i is the segment from its first node along lengths[i] * tangents[:, i], cylinder is the
+    segment along its axis, same as the narrow-phase contact of Elastica. Tested and culled pairs are counted in
+    contact_counters.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    lengths : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    tangents : numpy.ndarray
+        2D (3, n_elems) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    cylinder_position : numpy.ndarray
+        2D (3, 1) array containing data with 'float' type.
+    cylinder_director : numpy.ndarray
+        3D (3, 3, 1) array containing data with 'float' type.
+    cylinder_radius : float
+    cylinder_length : float
+    contact_counters : numpy.ndarray
+        1D (2,) array containing data with 'int' type.
+
+    Returns
+    -------
+    bool
+
+    """
+    contact_counters[0] += 1
+
+    # Bounding box of the cylinder.
+    box_min = np.empty(3)
+    box_max = np.empty(3)
+    for k in range(3):
+        start = (
+            cylinder_position[k, 0]
+            - 0.5 * cylinder_length * cylinder_director[2, k, 0]
+        )
+        end = start + cylinder_length * cylinder_director[2, k, 0]
+        box_min[k] = min(start, end) - cylinder_radius - BROAD_PHASE_MARGIN
+        box_max[k] = max(start, end) + cylinder_radius + BROAD_PHASE_MARGIN
+
+    for i in range(lengths.shape[0]):
+        separated = False
+        for k in range(3):
+            start = position_collection[k, i]
+            end = start + lengths[i] * tangents[k, i]
+            if (
+                min(start, end) - radius[i] > box_max[k]
+                or max(start, end) + radius[i] < box_min[k]
+            ):
+                separated = True
+                break
+        if not separated:
+            return False
+
+    contact_counters[1] += 1
+    return True
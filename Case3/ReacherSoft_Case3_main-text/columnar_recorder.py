@@ -0,0 +1,187 @@
+__doc__ = """This file is for recording the simulation data of call backs into preallocated arrays. Each recorded
+quantity is stored in one array with a row for each frame, instead of a list of copied arrays. Arrays can be
+memory-mapped .npy files for long evaluations."""
+
+import os
+
+import numpy as np
+
+
+class ColumnarRecorder:
+    """
+    Recorder storing quantities of a system in preallocated arrays, (n_frames, ...) for each quantity. Arrays are
+    allocated when the first frame is recorded, using the shapes and types of the recorded values. If more frames
+    than the capacity are recorded, arrays are grown. recorder[name] returns the recorded frames of a quantity,
+    so recorder can be used by post-processing in place of the defaultdict(list) of call backs.
+
+    Attributes
+    ----------
+    capacity : int
+        Number of frames arrays are allocated for.
+    n_frames : int
+        Number of recorded frames.
+    memmap_directory : str
+        If not None, arrays are memory-mapped .npy files in this directory, otherwise arrays are in memory.
+    prefix : str
+        File names of memory-mapped arrays are prefix_name.npy.
+    data : dict
+        Allocated arrays of recorded quantities, containing capacity frames.
+    """
+
+    def __init__(self, capacity, memmap_directory=None, prefix="recorder"):
+        """
+
+        Parameters
+        ----------
+        capacity : int
+            Number of frames arrays are allocated for.
+        memmap_directory : str
+            If not None, arrays are memory-mapped .npy files in this directory. Default is None.
+        prefix : str
+            File names of memory-mapped arrays are prefix_name.npy. Default is "recorder".
+        """
+        self.capacity = max(int(capacity), 1)
+        self.n_frames = 0
+        self.memmap_directory = memmap_directory
+        self.prefix = prefix
+        self.data = {}
+
+        if self.memmap_directory is not None:
+            os.makedirs(self.memmap_directory, exist_ok=True)
+
+    def append(self, **values):
+        """
+        This method records a frame, values are copied into the next row of the arrays.
+
+        Parameters
+        ----------
+        **values
+            Recorded quantities of the frame, float, int or numpy.ndarray.
+
+        Returns
+        -------
+
+        """
+        if not self.data:
+            for name, value in values.items():
+                value = np.asarray(value)
+                self.data[name] = self._allocate(
+                    name, (self.capacity,) + value.shape, value.dtype
+                )
+        elif self.n_frames == self.capacity:
+            self._grow(2 * self.capacity)
+
+        for name, value in values.items():
+            self.data[name][self.n_frames] = value
+        self.n_frames += 1
+
+    def _allocate(self, name, shape, dtype):
+        """
+        This method returns a new array for a recorded quantity.
+
+        Parameters
+        ----------
+        name : str
+            Name of the recorded quantity.
+        shape : tuple
+        dtype : numpy.dtype
+
+        Returns
+        -------
+        numpy.ndarray
+
+        """
+        if self.memmap_directory is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(
+            self.get_filename(name), mode="w+", dtype=dtype, shape=shape
+        )
+
+    def _grow(self, capacity):
+        """
+        This method allocates arrays for a larger capacity and copies the recorded frames.
+
+        Parameters
+        ----------
+        capacity : int
+            New number of frames arrays are allocated for.
+
+        Returns
+        -------
+
+        """
+        for name, array in self.data.items():
+            shape = (capacity,) + array.shape[1:]
+            if self.memmap_directory is None:
+                self.data[name] = np.empty(shape, dtype=array.dtype)
+                self.data[name][: self.n_frames] = array[: self.n_frames]
+            else:
+                # Memory-mapped file cannot be resized, recorded frames are copied from a temporary file.
+                filename = self.get_filename(name)
+                array.flush()
+                del array
+                self.data[name] = None
+                os.replace(filename, filename + ".tmp")
+                recorded = np.load(filename + ".tmp", mmap_mode="r")
+                self.data[name] = self._allocate(name, shape, recorded.dtype)
+                self.data[name][: self.n_frames] = recorded[: self.n_frames]
+                del recorded
+                os.remove(filename + ".tmp")
+        self.capacity = capacity
+
+    def get_filename(self, name):
+        """
+        Returns the file name of the memory-mapped array of a recorded quantity.
+
+        Parameters
+        ----------
+        name : str
+            Name of the recorded quantity.
+
+        Returns
+        -------
+        str
+
+        """
+        return os.path.join(self.memmap_directory, "%s_%s.npy" % (self.prefix, name))
+
+    def flush(self):
+        """
+        This method writes memory-mapped arrays to their files. Files contain capacity frames, first n_frames
+        frames are recorded.
+
+        Returns
+        -------
+
+        """
+        for array in self.data.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def __getitem__(self, name):
+        return self.data[name][: self.n_frames]
+
+    def __delitem__(self, frames):
+        # Same as deleting from the end of a list, del recorder[n:] removes frames recorded after the n-th frame.
+        start, stop, step = frames.indices(self.n_frames)
+        if stop != self.n_frames or step != 1:
+            raise ValueError("Only the last frames of a recorder can be removed.")
+        self.n_frames = min(start, self.n_frames)
+
+    def __len__(self):
+        return self.n_frames
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return [self[name] for name in self.data]
+
+    def items(self):
+        return [(name, self[name]) for name in self.data]
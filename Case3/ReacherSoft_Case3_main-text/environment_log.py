@@ -0,0 +1,148 @@
+__doc__ = """This file is for printing messages of the environment. Each message has a level and is printed only if its
+level is not above the verbosity of the log, so training runs with many parallel environments can turn messages off
+entirely. Episode summaries can be batched, so one line is printed for a number of episodes instead of one line for
+each episode."""
+
+import numpy as np
+
+# Verbosity levels, a message is printed if its level is not above the verbosity.
+QUIET = 0  # nothing is printed
+WARNING = 1  # NaN and divergence warnings
+SUMMARY = 2  # warnings and batched episode summaries
+VERBOSE = 3  # every message, i.e. target positions and summary of each episode
+
+VERBOSITY_LEVELS = {
+    "quiet": QUIET,
+    "warning": WARNING,
+    "summary": SUMMARY,
+    "verbose": VERBOSE,
+}
+
+
+def get_verbosity(verbosity):
+    """
+    Returns the verbosity level of a level name or a level.
+
+    Parameters
+    ----------
+    verbosity : str or int
+        One of "quiet", "warning", "summary", "verbose" or a level.
+
+    Returns
+    -------
+    int
+
+    """
+    if isinstance(verbosity, str):
+        if verbosity not in VERBOSITY_LEVELS:
+            raise ValueError(
+                "Unknown verbosity "
+                + verbosity
+                + ", verbosity is one of "
+                + ", ".join(VERBOSITY_LEVELS)
+            )
+        return VERBOSITY_LEVELS[verbosity]
+    return int(verbosity)
+
+
+class EnvironmentLog:
+    """
+    Log of the messages of an environment. Messages are formatted with the % operator only if they are printed,
+    so disabled messages cost a comparison.
+
+    Attributes
+    ----------
+    verbosity : int
+        Messages with a level above the verbosity are not printed.
+    summary_interval : int
+        Number of episodes summarized in one line, if verbosity is SUMMARY.
+    prefix : str
+        Printed at the beginning of each message, i.e. rank of the worker.
+    n_episodes : int
+        Number of finished episodes.
+    episode_summaries : list
+        Summaries of the finished episodes, which are not printed yet.
+    """
+
+    def __init__(self, verbosity=VERBOSE, summary_interval=10, prefix=""):
+        """
+
+        Parameters
+        ----------
+        verbosity : str or int
+            Verbosity level or its name. Default is VERBOSE.
+        summary_interval : int
+            Number of episodes summarized in one line, if verbosity is SUMMARY. Default is 10.
+        prefix : str
+            Printed at the beginning of each message. Default is "".
+        """
+        self.verbosity = get_verbosity(verbosity)
+        self.summary_interval = max(int(summary_interval), 1)
+        self.prefix = prefix
+        self.n_episodes = 0
+        self.episode_summaries = []
+
+    def is_enabled(self, level):
+        return level <= self.verbosity
+
+    def log(self, level, message, *args):
+        if level <= self.verbosity:
+            print(self.prefix + (message % args if args else message))
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def info(self, message, *args):
+        self.log(VERBOSE, message, *args)
+
+    def episode(self, summary):
+        """
+        This method records the summary of a finished episode. If verbosity is SUMMARY, means of the scalar
+        entries of the last summary_interval episodes are printed in one line.
+
+        Parameters
+        ----------
+        summary : dict
+            Summary of the episode, i.e. final reward and distance.
+
+        Returns
+        -------
+
+        """
+        self.n_episodes += 1
+        if self.verbosity != SUMMARY:
+            return
+        self.episode_summaries.append(summary)
+        if len(self.episode_summaries) >= self.summary_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        This method prints means of the scalar entries of the episode summaries, which are not printed yet.
+
+        Returns
+        -------
+
+        """
+        if not self.episode_summaries:
+            return
+        summaries = self.episode_summaries
+        self.episode_summaries = []
+        if self.verbosity < SUMMARY:
+            return
+        means = []
+        for name, value in summaries[0].items():
+            if np.ndim(value) != 0 or isinstance(value, str):
+                continue
+            means.append(
+                "%s: %0.3f" % (name, np.mean([summary[name] for summary in summaries]))
+            )
+        print(
+            "%s Episodes %d-%d, mean %s"
+            % (
+                self.prefix,
+                self.n_episodes - len(summaries) + 1,
+                self.n_episodes,
+                ", ".join(means),
+            )
+        )
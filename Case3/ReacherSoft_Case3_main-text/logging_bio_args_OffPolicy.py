@@ -7,9 +7,6 @@ import sys
 import argparse
 import ast
 
-import matplotlib
-import matplotlib.pyplot as plt
-
 # Import stable baseline
 from stable_baselines.bench.monitor import Monitor, load_results
 from stable_baselines.common.policies import MlpPolicy
@@ -18,8 +15,15 @@ from stable_baselines.td3.policies import MlpPolicy as MlpPolicy_TD3
 from stable_baselines.sac.policies import MlpPolicy as MlpPolicy_SAC
 from stable_baselines import TRPO, DDPG, PPO1, TD3, SAC
 
+# Numba kernels are loaded from the cache directory shared by all cases, it is set before the environment is
+# imported. Run numba_warm_up.py once to compile them.
+from numba_warm_up import set_cache_directory
+
+set_cache_directory()
+
 # Import simulation environment
 from set_environment import Environment
+from sweep_scheduler import get_stop_callback
 
 
 def get_valid_filename(s):
@@ -61,6 +65,9 @@ def plot_results(log_folder, title="Learning Curve"):
 
     """
 
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import ts2xy
+
     x, y = ts2xy(load_results(log_folder), "timesteps")
     y = moving_average(y, window=50)
     # Truncate x
@@ -190,6 +197,11 @@ parser.add_argument(
     "--tau", type=float, default=0.005,
 )
 
+# Verbosity of the messages of training environments, see Environment.
+parser.add_argument(
+    "--verbosity", type=str, default="summary",
+)
+
 args = parser.parse_args()
 args.final_time = 5.0
 
@@ -258,6 +270,8 @@ env = Environment(
     NU=args.NU,
     num_obstacles=8,
     COLLECT_CONTROL_POINTS_DATA=not args.TRAIN,
+    seed=args.SEED,
+    verbosity=args.verbosity if args.TRAIN else "verbose",
 )
 
 
@@ -282,11 +296,8 @@ identifer = (
 if args.TRAIN:
     log_dir = "./log_" + identifer + "/"
     os.makedirs(log_dir, exist_ok=True)
-    env = Monitor(env, log_dir)
-
-
-from stable_baselines.results_plotter import ts2xy, plot_results
-from stable_baselines import results_plotter
+    # Metrics of the episodes are written as extra columns of the monitor file.
+    env = Monitor(env, log_dir, info_keywords=Environment.episode_metric_names)
 
 if args.TRAIN:
     if offpolicy:
@@ -316,7 +327,16 @@ if args.TRAIN:
     model.set_env(env)
     print("Training for ", args.total_timesteps)
 
-    model.learn(total_timesteps=int(args.total_timesteps))
+    # If this command is run by a sweep with pruning, training stops when its configuration is pruned.
+    model.learn(
+        total_timesteps=int(args.total_timesteps),
+        callback=get_stop_callback(log_dir),
+    )
+    # Plotting modules are imported after training, so training processes do not import matplotlib.
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import plot_results
+    from stable_baselines import results_plotter
+
     # library helper
     plot_results(
         [log_dir],
@@ -1,14 +1,24 @@
 __doc__ = "This script is to train multiple policies, and or hyper parameter study."
 
-from multiprocessing import Pool
-import subprocess
-from datetime import datetime
-import time
+from sweep_scheduler import limit_threads, run_sweep
+
+num_procs = (
+    15  # make smaller than the number of cores to take advantage of multiple threads
+)
+# Thread pools of numerical libraries are created when numpy is imported (by sweep_pruning), and sweep
+# workers are forked from this process, so the number of threads of each worker is set first.
+threads_per_worker = limit_threads(num_procs)
+
+from numba_warm_up import set_cache_directory, warm_up
+from sweep_pruning import SuccessiveHalving
 
 run_offpolicy = True
 seed_list = [0, 1, 2, 3, 4]
 
 timesteps = 0.5e6
+# If True, configurations (algorithm and batch size) with dominated learning curves are stopped early with
+# successive halving at timesteps / 27, timesteps / 9 and timesteps / 3 training time steps.
+early_stopping = False
 
 batchsize_list_offpolicy = [50000, 5000000]
 algo_list_offpolicy = ["SAC"]
@@ -73,25 +83,16 @@ if run_offpolicy:
                     print(run_comand)
 
 
-def run_command_fun(command):
-    print(command)
-    print("command started at:", datetime.now())
-    start = time.time()
-    subprocess.run(command, shell=True)
-    # time.sleep(1)
-    done = time.time()
-    print(
-        "command finished at:",
-        datetime.now(),
-        "It took:",
-        (done - start) / 60,
-        "minutes",
-    )
-    print()
-
-
-num_procs = (
-    15  # make smaller than the number of cores to take advantage of multiple threads
+# Numba kernels are cached in a directory shared by all cases, each worker compiles or loads them
+# before it takes commands.
+set_cache_directory()
+# Commands are run on long-lived workers, commands finished in a previous run of this script are skipped.
+run_sweep(
+    run_comand_list,
+    num_procs=num_procs,
+    threads_per_worker=threads_per_worker,
+    status_file="sweep_status_OffPolicy.json",
+    log_directory="sweep_logs_OffPolicy",
+    warm_up=warm_up,
+    pruning=SuccessiveHalving(min_timesteps=timesteps / 27) if early_stopping else None,
 )
-pool = Pool(num_procs)
-pool.map(run_command_fun, run_comand_list)
@@ -0,0 +1,27 @@
+__doc__ = """This file is for seeding the random number generators of environments. Each environment owns a
+numpy.random.Generator created from a numpy.random.SeedSequence, and vectorized environments spawn independent
+seed sequences for their environments from a single seed."""
+
+import numpy as np
+
+
+def get_seed_sequence(seed=None):
+    """
+    Returns the seed sequence of a seed.
+
+    Parameters
+    ----------
+    seed : int or numpy.random.SeedSequence
+        Seed. If None, seed is drawn from the global numpy random number generator, so np.random.seed makes
+        the seed sequence reproducible. Default is None.
+
+    Returns
+    -------
+    numpy.random.SeedSequence
+
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 31 - 1)
+    return np.random.SeedSequence(seed)
@@ -0,0 +1,386 @@
+__doc__ = """This file is for the contact between the arm (Cosserat rod) and static cylinders (obstacles). Obstacles
+are fixed, so they are not systems of the simulator and they are not integrated. Axes and radii of all obstacles are
+stored in contiguous arrays and contact forces of all obstacles are computed in a single Numba kernel."""
+
+import numpy as np
+from numba import njit
+
+from elastica._elastica_numba._joint import (
+    _calculate_contact_forces,
+    _find_min_dist,
+    _prune_using_aabbs,
+)
+from elastica.external_forces import NoForces
+
+from broad_phase_contact import _cull_rod_cylinder_pair
+
+
+class StaticObstacleField(NoForces):
+    """
+    Forcing applying contact forces of static cylinders on the rod. Contact forces are same as ExternalContact
+    connections between the rod and each cylinder constrained by OneEndFixedRod: cylinders are processed in the
+    given order and reaction forces on cylinders are accumulated during one time step, since they are used by the
+    contact model. Cylinders are not appended to the simulator.
+
+    Attributes
+    ----------
+    cylinder_positions : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Center positions of cylinders.
+    cylinder_directors : numpy.ndarray
+        3D (3, 3, n_cylinders) array containing data with 'float' type. Directors of cylinders.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    cylinder_lengths : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    cylinder_forces : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Contact forces acting on cylinders in the
+        current time step.
+    cylinder_velocities : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Cylinders are fixed, velocities are zero.
+    k : float
+        Contact stiffness.
+    nu : float
+        Contact damping.
+    broad_phase : boolean
+        If true, rod-cylinder pairs are culled with the broad-phase test of ExternalContactWithBroadPhase before
+        the bounding box test of ExternalContact.
+    contact_counters : numpy.ndarray
+        1D (2,) array containing data with 'int' type. Number of tested and culled rod-cylinder pairs, if
+        broad_phase is true.
+    """
+
+    def __init__(self, cylinders, k, nu, broad_phase=False, contact_counters=None):
+        """
+
+        Parameters
+        ----------
+        cylinders : list
+            Cylinders, which are not appended to the simulator.
+        k : float
+            Contact stiffness.
+        nu : float
+            Contact damping.
+        broad_phase : boolean
+            If true, rod-cylinder pairs are culled with the broad-phase test. Default is False.
+        contact_counters : numpy.ndarray
+            1D (2,) array containing data with 'int' type. Number of tested and culled rod-cylinder pairs are
+            added to this array. Default is None, new array is created.
+        """
+        super().__init__()
+        n_cylinders = len(cylinders)
+        self.cylinder_positions = np.zeros((3, n_cylinders))
+        self.cylinder_directors = np.zeros((3, 3, n_cylinders))
+        for i, cylinder in enumerate(cylinders):
+            self.cylinder_positions[:, i] = cylinder.position_collection[:, 0]
+            self.cylinder_directors[:, :, i] = cylinder.director_collection[:, :, 0]
+        self.cylinder_radii = np.array(
+            [cylinder.radius for cylinder in cylinders], dtype=np.float64
+        )
+        self.cylinder_lengths = np.array(
+            [cylinder.length for cylinder in cylinders], dtype=np.float64
+        )
+        self.cylinder_forces = np.zeros((3, n_cylinders))
+        self.cylinder_velocities = np.zeros((3, n_cylinders))
+        self.k = k
+        self.nu = nu
+        self.broad_phase = broad_phase
+        if contact_counters is None:
+            contact_counters = np.zeros(2, dtype=np.int64)
+        self.contact_counters = contact_counters
+
+    def apply_forces(self, system, time: np.float64 = 0.0):
+        _apply_static_obstacle_forces(
+            system.position_collection,
+            system.velocity_collection,
+            system.lengths,
+            system.tangents,
+            system.radius,
+            system.internal_forces,
+            system.external_forces,
+            self.cylinder_positions,
+            self.cylinder_directors,
+            self.cylinder_radii,
+            self.cylinder_lengths,
+            self.cylinder_forces,
+            self.cylinder_velocities,
+            np.float64(self.k),
+            np.float64(self.nu),
+            self.broad_phase,
+            self.contact_counters,
+        )
+
+
+@njit(cache=True)
+def _apply_static_obstacle_forces(
+    position_collection,
+    velocity_collection,
+    lengths,
+    tangents,
+    radius,
+    internal_forces,
+    external_forces,
+    cylinder_positions,
+    cylinder_directors,
+    cylinder_radii,
+    cylinder_lengths,
+    cylinder_forces,
+    cylinder_velocities,
+    contact_k,
+    contact_nu,
+    broad_phase,
+    contact_counters,
+):
+    """
+    This function applies contact forces of all cylinders on the rod, same as ExternalContact.apply_forces
+    and ExternalContactWithBroadPhase.apply_forces for each cylinder.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    velocity_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    lengths : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    tangents : numpy.ndarray
+        2D (3, n_elems) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    internal_forces : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    external_forces : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    cylinder_positions : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_directors : numpy.ndarray
+        3D (3, 3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    cylinder_lengths : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    cylinder_forces : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_velocities : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    contact_k : float
+    contact_nu : float
+    broad_phase : bool
+    contact_counters : numpy.ndarray
+        1D (2,) array containing data with 'int' type.
+
+    Returns
+    -------
+
+    """
+    # External forces of cylinders are reset every time step.
+    cylinder_forces[...] = 0.0
+
+    for i in range(cylinder_radii.shape[0]):
+        cylinder_position = cylinder_positions[:, i : i + 1]
+        cylinder_director = cylinder_directors[:, :, i : i + 1]
+        if broad_phase and _cull_rod_cylinder_pair(
+            position_collection,
+            lengths,
+            tangents,
+            radius,
+            cylinder_position,
+            cylinder_director,
+            cylinder_radii[i],
+            cylinder_lengths[i],
+            contact_counters,
+        ):
+            continue
+
+        if _prune_using_aabbs(
+            position_collection,
+            radius,
+            lengths,
+            cylinder_position,
+            cylinder_director,
+            cylinder_radii[i],
+            cylinder_lengths[i],
+        ):
+            continue
+
+        x_cyl = (
+            cylinder_position[:, 0]
+            - 0.5 * cylinder_lengths[i] * cylinder_director[2, :, 0]
+        )
+
+        _calculate_contact_forces(
+            position_collection[:, :-1],
+            lengths * tangents,
+            x_cyl,
+            cylinder_lengths[i] * cylinder_director[2, :, 0],
+            radius + cylinder_radii[i],
+            lengths + cylinder_lengths[i],
+            internal_forces,
+            external_forces,
+            cylinder_forces[:, i : i + 1],
+            velocity_collection,
+            cylinder_velocities[:, i : i + 1],
+            contact_k,
+            contact_nu,
+        )
+
+
+def get_cylinder_segments(cylinders):
+    """
+    Returns axes of cylinders as segments, in the form used by compute_penetration_depth.
+
+    Parameters
+    ----------
+    cylinders : list
+        Cylinders.
+
+    Returns
+    -------
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Start of the axis of each cylinder.
+    cylinder_axes : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Axis of each cylinder, from start to end.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    """
+    n_cylinders = len(cylinders)
+    cylinder_starts = np.zeros((3, n_cylinders))
+    cylinder_axes = np.zeros((3, n_cylinders))
+    for i, cylinder in enumerate(cylinders):
+        cylinder_axes[:, i] = cylinder.length * cylinder.director_collection[2, :, 0]
+        cylinder_starts[:, i] = (
+            cylinder.position_collection[:, 0] - 0.5 * cylinder_axes[:, i]
+        )
+    cylinder_radii = np.array(
+        [cylinder.radius for cylinder in cylinders], dtype=np.float64
+    ).reshape(n_cylinders)
+    return cylinder_starts, cylinder_axes, cylinder_radii
+
+
+@njit(cache=True)
+def compute_clearance(
+    position_collection,
+    radius,
+    cylinder_starts,
+    cylinder_axes,
+    cylinder_radii,
+    clearance_cutoff,
+):
+    """
+    This function returns the smallest gap between the rod elements and the cylinders, which is the distance
+    between the element and the cylinder axis minus the sum of the radii, same as the contact model. Gap is
+    negative if the rod penetrates a cylinder. Pairs whose gap cannot be smaller than clearance_cutoff are
+    culled with a point-segment distance, so the result is not larger than clearance_cutoff.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_axes : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    clearance_cutoff : float
+
+    Returns
+    -------
+    float
+
+    """
+    clearance = clearance_cutoff
+    for i in range(cylinder_radii.shape[0]):
+        axis_length_squared = (
+            cylinder_axes[0, i] ** 2
+            + cylinder_axes[1, i] ** 2
+            + cylinder_axes[2, i] ** 2
+        )
+        for j in range(radius.shape[0]):
+            # Gap is not smaller than the distance between the element center and the cylinder axis
+            # minus the half length of the element and the radii, pairs which cannot reduce the
+            # clearance are skipped before computing the distance between the segments.
+            center_x = 0.5 * (position_collection[0, j] + position_collection[0, j + 1])
+            center_y = 0.5 * (position_collection[1, j] + position_collection[1, j + 1])
+            center_z = 0.5 * (position_collection[2, j] + position_collection[2, j + 1])
+            s = (
+                (center_x - cylinder_starts[0, i]) * cylinder_axes[0, i]
+                + (center_y - cylinder_starts[1, i]) * cylinder_axes[1, i]
+                + (center_z - cylinder_starts[2, i]) * cylinder_axes[2, i]
+            ) / axis_length_squared
+            s = min(max(s, 0.0), 1.0)
+            center_distance = np.sqrt(
+                (cylinder_starts[0, i] + s * cylinder_axes[0, i] - center_x) ** 2
+                + (cylinder_starts[1, i] + s * cylinder_axes[1, i] - center_y) ** 2
+                + (cylinder_starts[2, i] + s * cylinder_axes[2, i] - center_z) ** 2
+            )
+            element_half_length = 0.5 * np.sqrt(
+                (position_collection[0, j + 1] - position_collection[0, j]) ** 2
+                + (position_collection[1, j + 1] - position_collection[1, j]) ** 2
+                + (position_collection[2, j + 1] - position_collection[2, j]) ** 2
+            )
+            if (
+                center_distance - element_half_length - radius[j] - cylinder_radii[i]
+                >= clearance
+            ):
+                continue
+
+            distance_vector = _find_min_dist(
+                position_collection[:, j],
+                position_collection[:, j + 1] - position_collection[:, j],
+                cylinder_starts[:, i],
+                cylinder_axes[:, i],
+            )
+            gap = (
+                np.sqrt(
+                    distance_vector[0] ** 2
+                    + distance_vector[1] ** 2
+                    + distance_vector[2] ** 2
+                )
+                - radius[j]
+                - cylinder_radii[i]
+            )
+            if gap < clearance:
+                clearance = gap
+    return clearance
+
+
+@njit(cache=True)
+def compute_penetration_depth(
+    position_collection, radius, cylinder_starts, cylinder_axes, cylinder_radii
+):
+    """
+    This function returns the largest penetration depth of the rod elements into the cylinders, which is the
+    sum of the radii minus the distance between the element and the cylinder axis, same as the overlap used by
+    the contact model. Depth is zero if the rod does not touch any cylinder.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_axes : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+
+    Returns
+    -------
+    float
+
+    """
+    return max(
+        -compute_clearance(
+            position_collection,
+            radius,
+            cylinder_starts,
+            cylinder_axes,
+            cylinder_radii,
+            0.0,
+        ),
+        0.0,
+    )
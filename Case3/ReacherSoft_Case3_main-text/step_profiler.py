@@ -0,0 +1,128 @@
+__doc__ = """This file is for profiling the phases of the step method of the environment. Durations of phases of the
+last steps are stored in a fixed-size ring buffer, so profiling can be left on during long training runs without
+increasing memory."""
+
+from time import perf_counter
+
+import numpy as np
+
+# Phases of Environment.step, durations of a phase marked more than once in a step are added.
+STEP_PHASES = (
+    "set_action",
+    "integration",
+    "target_update",
+    "get_state",
+    "reward",
+    "nan_check",
+)
+
+
+class StepProfiler:
+    """
+    Profiler of the step method. start is called at the beginning of the step, mark is called at the end
+    of each phase and finish is called at the end of the step. Duration of a phase is the time since the end
+    of the previous phase. Marks outside of start and finish are ignored, so phases called without step
+    (i.e. by BatchedEnvironment) are not recorded.
+
+    Attributes
+    ----------
+    phases : tuple
+        Names of the phases.
+    phase_indices : dict
+        Column of each phase in the durations.
+    durations : numpy.ndarray
+        2D (capacity, n_phases + 1) array containing data with 'float' type. Durations of phases and total
+        duration (last column) of the last capacity steps in seconds, rows are used as a ring buffer.
+    n_steps : int
+        Number of recorded steps.
+    running : boolean
+        True between start and finish.
+    """
+
+    def __init__(self, capacity=1000, phases=STEP_PHASES):
+        """
+
+        Parameters
+        ----------
+        capacity : int
+            Number of steps stored in the ring buffer. Default is 1000.
+        phases : tuple
+            Names of the phases. Default is STEP_PHASES.
+        """
+        self.phases = tuple(phases)
+        self.phase_indices = {phase: i for i, phase in enumerate(self.phases)}
+        self.durations = np.zeros((max(int(capacity), 1), len(self.phases) + 1))
+        self.n_steps = 0
+        self.running = False
+        self._row = self.durations[0]
+        self._start_time = 0.0
+        self._last_time = 0.0
+
+    def start(self):
+        self._row = self.durations[self.n_steps % self.durations.shape[0]]
+        self._row[:] = 0.0
+        self.running = True
+        self._start_time = self._last_time = perf_counter()
+
+    def mark(self, phase):
+        if self.running:
+            time = perf_counter()
+            self._row[self.phase_indices[phase]] += time - self._last_time
+            self._last_time = time
+
+    def finish(self):
+        """
+        This method records the step and returns durations of its phases.
+
+        Returns
+        -------
+        dict
+            Durations of phases and total duration of the step in seconds.
+        """
+        self._row[-1] = perf_counter() - self._start_time
+        self.running = False
+        self.n_steps += 1
+        return dict(zip(self.phases + ("total",), self._row.tolist()))
+
+    def get_durations(self):
+        """
+        Returns durations of the recorded steps in the ring buffer, from the oldest to the newest step.
+
+        Returns
+        -------
+        numpy.ndarray
+            2D (n_recorded_steps, n_phases + 1) array containing data with 'float' type.
+        """
+        capacity = self.durations.shape[0]
+        if self.n_steps <= capacity:
+            return self.durations[: self.n_steps].copy()
+        start = self.n_steps % capacity
+        return np.concatenate((self.durations[start:], self.durations[:start]))
+
+    def get_profile(self):
+        """
+        Returns statistics of the durations of phases of the recorded steps in the ring buffer.
+
+        Returns
+        -------
+        dict
+            Number of profiled steps, number of recorded steps and mean, median, 99th percentile and maximum
+            duration of each phase and of the total step in seconds.
+        """
+        durations = self.get_durations()
+        profile = dict(n_steps=self.n_steps, n_recorded_steps=durations.shape[0])
+        for i, phase in enumerate(self.phases + ("total",)):
+            if durations.shape[0] == 0:
+                profile[phase] = None
+                continue
+            profile[phase] = dict(
+                mean=float(np.mean(durations[:, i])),
+                median=float(np.median(durations[:, i])),
+                percentile_99=float(np.percentile(durations[:, i], 99)),
+                max=float(np.max(durations[:, i])),
+            )
+        return profile
+
+    def clear(self):
+        self.n_steps = 0
+        self.running = False
@@ -0,0 +1,370 @@
+__doc__ = """This file is for setting a batch of environments, which are integrated together in one Elastica
+simulator. Batched environment is interfaced with stable-baselines as a vectorized environment (VecEnv),
+and it can be used with algorithms supporting vectorized environments such as PPO2."""
+
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from stable_baselines.common.vec_env import VecEnv
+
+from elastica.callback_functions import CallBackBaseClass
+from elastica.timestepper import extend_stepper_interface
+
+from set_environment import (
+    BaseSimulator,
+    Environment,
+    get_recorders,
+    restore_state,
+    save_state,
+)
+from columnar_recorder import ColumnarRecorder
+from random_streams import get_seed_sequence
+from stable_time_step import check_divergence, compute_contact_stiffness
+
+
+class BatchedEnvironment(VecEnv):
+    """
+
+    Vectorized environment, which contains many copies of the Environment. Arm and target (and obstacles
+    if there are) of all environments are appended to a single Elastica simulator, so one time step of
+    the simulator integrates all environments. Each environment has its own actions, states, rewards and
+    done booleans.
+
+    Since all environments share the same simulator, they are reset together. Episode length is same for all
+    environments, so they are done at the same step. If one environment is done earlier than the others, for
+    example because a NaN is detected, all environments are done and reset.
+
+    Each step follows the same sequence as Environment.step, so reuse_simulator, adaptive_time_step and
+    rollback_on_nan options of the environments are used for the shared simulator. Time step is the smallest
+    time step selected by the environments, and if any arm diverges, the step of all environments is
+    integrated again. block_integration is not used, since BlockIntegrator integrates a single arm, and
+    environments are integrated by the Elastica stepper. profile_step is not supported.
+
+    Attributes
+    ----------
+    envs : list
+        List of Environment objects.
+    simulator : BaseSimulator
+        Elastica simulator shared by all environments.
+    time_tracker : float
+        Current simulation time.
+    actions : numpy.ndarray
+        2D (num_envs, action_size) array containing data with 'float' type.
+        Actions given by step_async, used in the next step_wait.
+    episode_rewards : numpy.ndarray
+        1D (num_envs,) array containing data with 'float' type.
+        Sum of rewards of the current episode for each environment.
+    episode_lengths : numpy.ndarray
+        1D (num_envs,) array containing data with 'int' type.
+        Number of steps of the current episode for each environment.
+    monitor_file : file
+        If a monitor_dir is given, episode rewards, lengths, times and metrics are written in this file, in the
+        same format as the stable-baselines Monitor with info_keywords=Environment.episode_metric_names.
+    simulator_snapshot : list
+        Initial state of the simulator objects, restored in later resets if reuse_simulator is true.
+    """
+
+    def __init__(self, n_envs, *args, monitor_dir=None, seed=None, **kwargs):
+        """
+
+        Parameters
+        ----------
+        n_envs : int
+            Number of environments in the batch.
+        *args
+            Variable length arguments, passed to each Environment.
+        monitor_dir : str
+            If given, episode results are written in monitor.csv in this directory, which can be read by
+            stable-baselines load_results. Default is None.
+        seed : int or numpy.random.SeedSequence
+            Environments are seeded with seed sequences spawned from this seed. Default is None, seed is drawn
+            from the global numpy random number generator.
+        **kwargs
+            Arbitrary keyword arguments, passed to each Environment.
+        """
+        seed_sequences = get_seed_sequence(seed).spawn(n_envs)
+        self.envs = [Environment(*args, seed=seed_sequences[0], **kwargs)]
+        # Environments use the obstacle nest of the first environment, loaded from the nest cache.
+        obstacle_nest_key = getattr(self.envs[0], "obstacle_nest_key", None)
+        if obstacle_nest_key is not None:
+            kwargs = dict(kwargs, obstacle_nest_key=obstacle_nest_key)
+        self.envs += [
+            Environment(*args, seed=seed_sequence, **kwargs)
+            for seed_sequence in seed_sequences[1:]
+        ]
+        if self.envs[0].step_profiler is not None:
+            raise ValueError(
+                "profile_step is not supported by BatchedEnvironment, environments are integrated together."
+            )
+        super(BatchedEnvironment, self).__init__(
+            n_envs, self.envs[0].observation_space, self.envs[0].action_space
+        )
+
+        self.StatefulStepper = self.envs[0].StatefulStepper
+        self.time_step = self.envs[0].time_step
+        self.num_steps_per_update = self.envs[0].num_steps_per_update
+        self.reuse_simulator = self.envs[0].reuse_simulator
+        self.rollback_on_nan = self.envs[0].rollback_on_nan
+        self.max_rollback_retries = self.envs[0].max_rollback_retries
+        self.log = self.envs[0].log
+        self.simulator = None
+        self.simulator_snapshot = None
+        if self.envs[0].block_integration:
+            self.log.info(
+                " BlockIntegrator integrates a single arm, batched environments use the Elastica stepper."
+            )
+
+        self.actions = None
+        self.episode_rewards = np.zeros(n_envs)
+        self.episode_lengths = np.zeros(n_envs, dtype=int)
+
+        self.t_start = time.time()
+        self.monitor_file = None
+        if monitor_dir is not None:
+            self.monitor_file = open(os.path.join(monitor_dir, "monitor.csv"), "wt")
+            self.monitor_file.write(
+                "#%s\n" % json.dumps({"t_start": self.t_start, "env_id": None})
+            )
+            self.monitor_logger = csv.DictWriter(
+                self.monitor_file,
+                fieldnames=("r", "l", "t") + Environment.episode_metric_names,
+            )
+            self.monitor_logger.writeheader()
+            self.monitor_file.flush()
+
+    def reset(self):
+        """
+        This class method creates a new simulator and resets all environments using this simulator. If
+        reuse_simulator is true, simulator is created in the first reset and its initial state is restored in
+        later resets.
+
+        Returns
+        -------
+        numpy.ndarray
+            2D (num_envs, number_of_states) array containing data with 'float' type.
+        """
+        if self.reuse_simulator and self.simulator_snapshot is not None:
+            self.restore_simulator()
+            states = [env.reset(simulator=self.simulator) for env in self.envs]
+
+            # Same as finalize, apply constraints and call backs at the initial time.
+            self.simulator._constrain_values(time=0.0)
+            self.simulator._constrain_rates(time=0.0)
+            self.simulator._callBack(time=0.0, current_step=0)
+        else:
+            self.simulator = BaseSimulator()
+
+            states = [env.reset(simulator=self.simulator) for env in self.envs]
+
+            # Finalize simulation environment. After finalize, you cannot add
+            # any forcing, constrain or call back functions
+            self.simulator.finalize()
+
+            # do_step, stages_and_updates will be used in step_wait function
+            self.do_step, self.stages_and_updates = extend_stepper_interface(
+                self.StatefulStepper, self.simulator
+            )
+            for env in self.envs:
+                env.do_step = self.do_step
+                env.stages_and_updates = self.stages_and_updates
+                # Contact stiffness acting on the arm is used to estimate the stable time step.
+                env.contact_stiffness = compute_contact_stiffness(
+                    self.simulator, env.shearable_rod
+                )
+
+            if self.reuse_simulator:
+                self.snapshot_simulator()
+
+        self.time_tracker = np.float64(0.0)
+        self.episode_rewards[:] = 0.0
+        self.episode_lengths[:] = 0
+
+        return np.array(states)
+
+    def snapshot_simulator(self):
+        """
+        This class method stores the initial state of the objects of the shared simulator, same as
+        Environment.snapshot_simulator.
+
+        Returns
+        -------
+
+        """
+        self.simulator_snapshot = [
+            (obj, save_state(obj)) for obj in self.envs[0].get_simulator_objects()
+        ]
+
+        # Call backs already recorded the initial state in finalize. Recorded data is not stored
+        # in the snapshot, initial state is recorded again by reset.
+        for obj, state in self.simulator_snapshot:
+            if isinstance(obj, CallBackBaseClass):
+                for value in state.values():
+                    if isinstance(value, dict):
+                        value.clear()
+
+    def restore_simulator(self):
+        """
+        This class method restores the initial state of the objects of the shared simulator in place. Targets and
+        control points are reset by the environments.
+
+        Returns
+        -------
+
+        """
+        for obj, state in self.simulator_snapshot:
+            restore_state(obj, state)
+            for recorder in get_recorders(obj):
+                if isinstance(recorder, ColumnarRecorder):
+                    del recorder[:]
+
+    def select_time_step(self):
+        """
+        This method returns the number of time steps and the time step used to integrate one step of all
+        environments, the smallest time step selected by the environments.
+
+        Returns
+        -------
+        number_of_steps : int
+            Number of time steps.
+        time_step : float
+            Time step.
+        """
+        return max(env.select_time_step() for env in self.envs)
+
+    def integrate(self, number_of_steps, time_step):
+        """
+        This method integrates the shared simulator number_of_steps time steps.
+
+        Parameters
+        ----------
+        number_of_steps : int
+            Number of time steps.
+        time_step : float
+            Time step.
+
+        Returns
+        -------
+
+        """
+        for _ in range(number_of_steps):
+            self.time_tracker = self.do_step(
+                self.StatefulStepper,
+                self.stages_and_updates,
+                self.simulator,
+                self.time_tracker,
+                time_step,
+            )
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        """
+        This method integrates the simulator number of steps given in num_steps_per_update, using the actions
+        given in step_async, and returns state information, rewards and done booleans of all environments.
+
+        Returns
+        -------
+        states : numpy.ndarray
+            2D (num_envs, number_of_states) array containing data with 'float' type.
+        rewards : numpy.ndarray
+            1D (num_envs,) array containing data with 'float' type.
+        dones : numpy.ndarray
+            1D (num_envs,) array containing data with 'bool' type.
+        infos : list
+            List of info dictionaries of environments.
+        """
+        for env, action in zip(self.envs, self.actions):
+            env.set_action(action)
+
+        if self.rollback_on_nan:
+            # Simulator is shared, so checkpoint of one environment contains all environments.
+            time_tracker = self.time_tracker
+            checkpoint = self.envs[0].save_checkpoint()
+
+        number_of_steps, time_step = self.select_time_step()
+        self.integrate(number_of_steps, time_step)
+
+        if self.rollback_on_nan:
+            retries = 0
+            while (
+                any(
+                    check_divergence(env.shearable_rod, time_step, env.cfl_number)
+                    for env in self.envs
+                )
+                and retries < self.max_rollback_retries
+            ):
+                # Roll back to the state before this step and integrate again with a smaller time step.
+                retries += 1
+                number_of_steps *= 2
+                time_step *= 0.5
+                self.log.warning(
+                    " Divergence detected, integrating the step again with time step %0.3e",
+                    time_step,
+                )
+                self.envs[0].restore_checkpoint(checkpoint)
+                self.time_tracker = time_tracker
+                self.integrate(number_of_steps, time_step)
+
+        states = []
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, self.actions)):
+            env.time_tracker = self.time_tracker
+            state, rewards[i], dones[i], info = env.finish_step(action)
+            states.append(state)
+            infos.append(info)
+
+        self.episode_rewards += rewards
+        self.episode_lengths += 1
+
+        # Environments share the same simulator, so if one of them is done all of them are reset.
+        if dones.any():
+            dones[:] = True
+            for i, info in enumerate(infos):
+                info["terminal_observation"] = states[i]
+                info["episode"] = {
+                    "r": round(self.episode_rewards[i], 6),
+                    "l": self.episode_lengths[i],
+                    "t": round(time.time() - self.t_start, 6),
+                }
+                # Metrics of the episode are written as extra columns, same as Monitor with info_keywords.
+                for name in Environment.episode_metric_names:
+                    info["episode"][name] = info[name]
+                if self.monitor_file is not None:
+                    self.monitor_logger.writerow(info["episode"])
+            if self.monitor_file is not None:
+                self.monitor_file.flush()
+            states = self.reset()
+
+        return np.array(states), rewards, dones, infos
+
+    def close(self):
+        if self.monitor_file is not None:
+            self.monitor_file.close()
+
+    def seed(self, seed=None):
+        # Each environment is seeded with a seed sequence spawned from the seed.
+        seed_sequences = get_seed_sequence(seed).spawn(self.num_envs)
+        return [
+            env.seed(seed_sequence)[0]
+            for env, seed_sequence in zip(self.envs, seed_sequences)
+        ]
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.envs[i], attr_name) for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for i in self._get_indices(indices):
+            setattr(self.envs[i], attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [
+            getattr(self.envs[i], method_name)(*method_args, **method_kwargs)
+            for i in self._get_indices(indices)
+        ]
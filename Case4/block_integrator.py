@@ -0,0 +1,1081 @@
+__doc__ = """This file is for integrating a block of time steps of an Elastica simulator inside a single Numba kernel.
+Simulator stepper calls kinematic and dynamic steps, constraints, forcing and connections from Python at each
+time step. Block integrator calls the same Numba kernels of Elastica for the arm, target, obstacles, boundary
+conditions, muscle torques, external contact and static obstacles, but the time loop is compiled, so there is no Python overhead
+between time steps. Arrays of the blocks are bound once in a BlockState, so each call of the kernel only passes the
+state, number of time steps, time and time step. Only the blocks used by the environments are supported."""
+
+from operator import attrgetter
+
+import numpy as np
+from numba import njit, typeof, types
+from numba.experimental import structref
+
+from elastica._elastica_numba._rod._cosserat_rod import (
+    _compute_internal_forces,
+    _compute_internal_torques,
+    _update_accelerations,
+)
+from elastica._elastica_numba._rod._data_structures import (
+    overload_operator_kinematic_numba,
+    overload_operator_dynamic_numba,
+)
+from elastica._elastica_numba._joint import (
+    _calculate_contact_forces,
+    _prune_using_aabbs,
+)
+from elastica._linalg import _batch_matvec
+from elastica.boundary_conditions import OneEndFixedRod
+from elastica.joint import ExternalContact
+from elastica.rod import RodBase
+from elastica.rigidbody import Cylinder, Sphere
+
+# Cases without obstacles do not have the obstacle modules. Their blocks are always empty in these cases, and
+# isinstance checks against an empty tuple are false, so the kernels defined here are only compiled, never called.
+try:
+    from broad_phase_contact import (
+        ExternalContactWithBroadPhase,
+        _cull_rod_cylinder_pair,
+    )
+except ImportError:
+    ExternalContactWithBroadPhase = ()
+
+    @njit(cache=True)
+    def _cull_rod_cylinder_pair(*args):
+        return False
+
+try:
+    from static_obstacle_field import (
+        StaticObstacleField,
+        _apply_static_obstacle_forces,
+    )
+except ImportError:
+    StaticObstacleField = ()
+
+    @njit(cache=True)
+    def _apply_static_obstacle_forces(*args):
+        pass
+
+try:
+    from obstacle_distance_grid import (
+        DistanceGridObstacleField,
+        _apply_distance_grid_forces,
+    )
+except ImportError:
+    DistanceGridObstacleField = ()
+
+    @njit(cache=True)
+    def _apply_distance_grid_forces(*args):
+        pass
+
+from MuscleTorquesWithBspline.BsplineMuscleTorques import (
+    FusedMuscleTorquesWithVaryingBetaSplines,
+    MuscleTorquesWithVaryingBetaSplines,
+)
+
+# Numba kernels of the Elastica and muscle torque classes, bound here so that they can be called
+# from the block integration kernel.
+_constrain_values_one_end_fixed = OneEndFixedRod.compute_contrain_values
+_constrain_rates_one_end_fixed = OneEndFixedRod.compute_constrain_rates
+_filter_activation = MuscleTorquesWithVaryingBetaSplines.filter_activation
+_compute_torque_magnitude_from_basis = (
+    FusedMuscleTorquesWithVaryingBetaSplines.compute_torque_magnitude_from_basis
+)
+_compute_muscle_torques = FusedMuscleTorquesWithVaryingBetaSplines.compute_muscle_torques
+
+# Arrays of rigid bodies stored in rigid_body_states, in this order.
+_RIGID_BODY_ATTRIBUTES = (
+    "position_collection",
+    "director_collection",
+    "velocity_collection",
+    "omega_collection",
+    "dynamic_states.rate_collection",
+    "acceleration_collection",
+    "alpha_collection",
+    "inv_mass_second_moment_of_inertia",
+    "internal_forces",
+    "internal_torques",
+    "external_forces",
+    "external_torques",
+)
+
+# Attributes of WallBoundaryForSphere constraint of environments.
+_WALL_BOUNDARY_ATTRIBUTES = (
+    "x_boundary_low",
+    "x_boundary_high",
+    "y_boundary_low",
+    "y_boundary_high",
+    "z_boundary_low",
+    "z_boundary_high",
+)
+
+# Fields of BlockState, same as the attributes of BlockIntegrator with the same names.
+_BLOCK_STATE_FIELDS = (
+    "rod_kinematic_states",
+    "rod_states",
+    "rigid_body_states",
+    "fixed_constraints",
+    "wall_constraints",
+    "contacts",
+    "muscles",
+    "static_obstacles",
+    "distance_grid",
+    "records",
+)
+
+
+def _homogeneous_tuple(arrays):
+    """
+    Returns tuple of arrays, which can be indexed inside Numba kernels. Arrays are not copied,
+    tuple holds references to the arrays of the systems.
+
+    Parameters
+    ----------
+    arrays : list
+        List of numpy.ndarray with 'float' type.
+
+    Returns
+    -------
+    tuple
+
+    """
+    arrays = tuple(arrays)
+    if len(set(typeof(array) for array in arrays)) > 1:
+        raise NotImplementedError(
+            "Arrays of rigid bodies have different types, BlockIntegrator cannot index them."
+        )
+    return arrays
+
+
+@structref.register
+class BlockStateType(types.StructRef):
+    """
+    Numba type of BlockState.
+    """
+
+    def preprocess_fields(self, fields):
+        return tuple((name, types.unliteral(typ)) for name, typ in fields)
+
+
+class BlockState(structref.StructRefProxy):
+    """
+    BlockState holds the arrays and parameters of all blocks integrated by the BlockIntegrator. Numba passes
+    a BlockState to the block integration kernel as a single reference, so arrays of the systems are not typed
+    and hashed at every call.
+    """
+
+
+structref.define_proxy(
+    BlockState,
+    BlockStateType,
+    _BLOCK_STATE_FIELDS,
+)
+
+
+class BlockIntegrator:
+    """
+
+    Block integrator integrates the simulator number of time steps inside a single Numba kernel, using
+    the position Verlet scheme of Elastica. Integrated systems and their states are same as the Elastica
+    stepper, so both of them can be used on the same simulator.
+
+    Supported blocks are one Cosserat rod (arm), spheres and cylinders (target and obstacles), OneEndFixedRod
+    and WallBoundaryForSphere constraints, one FusedMuscleTorquesWithVaryingBetaSplines forcing acting on the rod
+    with precomputed spline basis, at most one StaticObstacleField or DistanceGridObstacleField forcing acting on
+    the rod, and ExternalContact connections between the rod and cylinders. Call backs
+    are not supported. If simulator contains any other block NotImplementedError is raised.
+
+    Arrays of systems are referenced, not copied. Fixed positions and directors of constraints, boundaries
+    and contact parameters are read once, when the integrator is created. All of them are bound to a BlockState
+    once, and control points of each block are written in place to the target points array of the state.
+
+    Attributes
+    ----------
+    rod : object
+        Rod-like object.
+    muscle_torques : FusedMuscleTorquesWithVaryingBetaSplines
+        Muscle torque forcing acting on the rod.
+    obstacle_field : StaticObstacleField
+        Static obstacle forcing acting on the rod, StaticObstacleField or DistanceGridObstacleField. None if
+        simulator does not have one.
+    time_step : float
+        Time step of the simulation.
+    rod_kinematic_states : tuple
+        Number of nodes, number of kinematic rates and rates of rod.
+    rod_states : tuple
+        Arrays of rod used to compute internal forces, torques and accelerations.
+    rigid_body_states : tuple
+        Number of nodes, number of kinematic rates, masses and arrays of rigid bodies. Arrays of all rigid
+        bodies are stored in a tuple for each attribute.
+    fixed_constraints : tuple
+        Indices of systems, fixed positions and fixed directors of OneEndFixedRod constraints. Index of rod
+        is 0 and index of i-th rigid body is i + 1.
+    wall_constraints : tuple
+        Indices of rigid bodies, radii and boundaries of WallBoundaryForSphere constraints.
+    contacts : tuple
+        Indices of cylinders, radii, lengths, contact parameters, broad-phase flags and counters of tested and
+        culled pairs of ExternalContact connections.
+    static_obstacles : tuple
+        Arrays and contact parameters of the StaticObstacleField forcing. Arrays are empty if simulator does not
+        have one.
+    distance_grid : tuple
+        Signed distance grid, arrays and contact parameters of the DistanceGridObstacleField forcing. Arrays are
+        empty if simulator does not have one.
+    contact_connections : list
+        ExternalContact connections, counters of ExternalContactWithBroadPhase connections are updated after
+        each block.
+    muscles : tuple
+        Arrays and parameters of the muscle torque forcing. Target control points, whether next step is the
+        initial call of the forcing and step counter are written to the arrays before each block.
+    records : tuple
+        Time, torque magnitudes, torques and element positions recorded at the recording steps of a block.
+        Arrays grow if a block has more recording steps than their length.
+    state : BlockState
+        Arrays and parameters bound once and passed to the block integration kernel.
+    """
+
+    def __init__(self, simulator, time_step):
+        """
+
+        Parameters
+        ----------
+        simulator : BaseSimulator
+            Finalized Elastica simulator.
+        time_step : float
+            Time step of the simulation.
+        """
+        self.time_step = time_step
+
+        if len(simulator._callbacks) > 0:
+            raise NotImplementedError("Call backs are not supported by BlockIntegrator.")
+
+        rods = [system for system in simulator._systems if isinstance(system, RodBase)]
+        if len(rods) != 1:
+            raise NotImplementedError("BlockIntegrator supports only one rod.")
+        self.rod = rods[0]
+        rigid_bodies = [system for system in simulator._systems if system is not self.rod]
+        if len(rigid_bodies) == 0:
+            raise NotImplementedError("BlockIntegrator requires at least one rigid body.")
+        for rigid_body in rigid_bodies:
+            if not isinstance(rigid_body, (Sphere, Cylinder)):
+                raise NotImplementedError(
+                    "{0} is not supported by BlockIntegrator.".format(rigid_body)
+                )
+        # Rod index is 0 and rigid body indices start from 1 in fixed constraints.
+        system_indices = {id(self.rod): 0}
+        for i, rigid_body in enumerate(rigid_bodies):
+            system_indices[id(rigid_body)] = i + 1
+
+        rod = self.rod
+        self.rod_kinematic_states = (
+            rod.kinematic_states.n_nodes,
+            rod.dynamic_states.n_kinematic_rates,
+            rod.dynamic_states.rate_collection,
+        )
+        self.rod_states = (
+            rod.position_collection,
+            rod.director_collection,
+            rod.velocity_collection,
+            rod.omega_collection,
+            rod.acceleration_collection,
+            rod.alpha_collection,
+            rod.volume,
+            rod.lengths,
+            rod.tangents,
+            rod.radius,
+            rod.rest_lengths,
+            rod.rest_voronoi_lengths,
+            rod.dilatation,
+            rod.dilatation_rate,
+            rod.voronoi_dilatation,
+            rod.sigma,
+            rod.rest_sigma,
+            rod.kappa,
+            rod.rest_kappa,
+            rod.shear_matrix,
+            rod.bend_matrix,
+            rod.mass,
+            rod.mass_second_moment_of_inertia,
+            rod.inv_mass_second_moment_of_inertia,
+            rod.internal_stress,
+            rod.internal_couple,
+            rod.dissipation_constant_for_forces,
+            rod.dissipation_constant_for_torques,
+            rod.damping_forces,
+            rod.damping_torques,
+            rod.internal_forces,
+            rod.internal_torques,
+            rod.external_forces,
+            rod.external_torques,
+        )
+
+        # Sphere accelerations are computed only from external forces and torques, cylinder accelerations
+        # are computed from internal and external forces and torques.
+        self.rigid_body_states = (
+            np.array(
+                [rigid_body.kinematic_states.n_nodes for rigid_body in rigid_bodies],
+                dtype=np.int64,
+            ),
+            np.array(
+                [rigid_body.dynamic_states.n_kinematic_rates for rigid_body in rigid_bodies],
+                dtype=np.int64,
+            ),
+            np.array(
+                [isinstance(rigid_body, Cylinder) for rigid_body in rigid_bodies],
+                dtype=np.bool_,
+            ),
+            np.array(
+                [rigid_body.mass[0] for rigid_body in rigid_bodies], dtype=np.float64
+            ),
+        ) + tuple(
+            _homogeneous_tuple(attrgetter(name)(rigid_body) for rigid_body in rigid_bodies)
+            for name in _RIGID_BODY_ATTRIBUTES
+        )
+
+        fixed_constraints = []
+        wall_constraints = []
+        for system_idx, constraint in simulator._constraints:
+            system = simulator._systems[system_idx]
+            if isinstance(constraint, OneEndFixedRod):
+                fixed_constraints.append((system_indices[id(system)], constraint))
+            elif (
+                all(hasattr(constraint, name) for name in _WALL_BOUNDARY_ATTRIBUTES)
+                and system is not self.rod
+            ):
+                wall_constraints.append((system_indices[id(system)] - 1, system, constraint))
+            else:
+                raise NotImplementedError(
+                    "{0} is not supported by BlockIntegrator.".format(constraint)
+                )
+        self.fixed_constraints = (
+            np.array([index for index, _ in fixed_constraints], dtype=np.int64),
+            np.array(
+                [constraint.fixed_position for _, constraint in fixed_constraints],
+                dtype=np.float64,
+            ).reshape(-1, 3),
+            np.array(
+                [constraint.fixed_directors for _, constraint in fixed_constraints],
+                dtype=np.float64,
+            ).reshape(-1, 3, 3),
+        )
+        self.wall_constraints = (
+            np.array([index for index, _, _ in wall_constraints], dtype=np.int64),
+            np.array(
+                [system.radius for _, system, _ in wall_constraints], dtype=np.float64
+            ),
+            np.array(
+                [
+                    [getattr(constraint, name) for name in _WALL_BOUNDARY_ATTRIBUTES]
+                    for _, _, constraint in wall_constraints
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 6),
+        )
+
+        muscle_torques_list = []
+        obstacle_field_list = []
+        for sys_idx, forcing in simulator._ext_forces_torques:
+            if simulator._systems[sys_idx] is not self.rod:
+                raise NotImplementedError(
+                    "{0} is not supported by BlockIntegrator.".format(forcing)
+                )
+            if (
+                isinstance(forcing, FusedMuscleTorquesWithVaryingBetaSplines)
+                and forcing.precompute_spline_basis
+            ):
+                muscle_torques_list.append(forcing)
+            elif isinstance(forcing, StaticObstacleField):
+                obstacle_field_list.append(forcing)
+            else:
+                raise NotImplementedError(
+                    "{0} is not supported by BlockIntegrator.".format(forcing)
+                )
+        if len(muscle_torques_list) != 1 or len(obstacle_field_list) > 1:
+            raise NotImplementedError(
+                "BlockIntegrator supports only one FusedMuscleTorquesWithVaryingBetaSplines forcing acting on the "
+                "rod, with precompute_spline_basis, and at most one StaticObstacleField or DistanceGridObstacleField "
+                "forcing."
+            )
+        self.muscle_torques = muscle_torques_list[0]
+
+        self.obstacle_field = obstacle_field_list[0] if obstacle_field_list else None
+        if isinstance(self.obstacle_field, DistanceGridObstacleField):
+            self.obstacle_field.node_distances = np.zeros(self.rod.n_elems + 1)
+            self.distance_grid = (
+                np.asarray(self.obstacle_field.distance_grid.values),
+                self.obstacle_field.distance_grid.origin,
+                np.float64(self.obstacle_field.distance_grid.spacing),
+                np.float64(self.obstacle_field.distance_grid.band_distance),
+                self.obstacle_field.node_distances,
+                self.obstacle_field.cylinder_forces,
+                np.float64(self.obstacle_field.k),
+                np.float64(self.obstacle_field.nu),
+            )
+        else:
+            self.distance_grid = (
+                np.zeros((0, 0, 0, 2, 5), dtype=np.float32),
+                np.zeros(3),
+                np.float64(1.0),
+                np.float64(0.0),
+                np.zeros(0),
+                np.zeros((3, 0)),
+                np.float64(0.0),
+                np.float64(0.0),
+            )
+        if self.obstacle_field is not None and not isinstance(
+            self.obstacle_field, DistanceGridObstacleField
+        ):
+            self.static_obstacles = (
+                self.obstacle_field.cylinder_positions,
+                self.obstacle_field.cylinder_directors,
+                self.obstacle_field.cylinder_radii,
+                self.obstacle_field.cylinder_lengths,
+                self.obstacle_field.cylinder_forces,
+                self.obstacle_field.cylinder_velocities,
+                np.float64(self.obstacle_field.k),
+                np.float64(self.obstacle_field.nu),
+                self.obstacle_field.broad_phase,
+                self.obstacle_field.contact_counters,
+            )
+        else:
+            self.static_obstacles = (
+                np.zeros((3, 0)),
+                np.zeros((3, 3, 0)),
+                np.zeros(0),
+                np.zeros(0),
+                np.zeros((3, 0)),
+                np.zeros((3, 0)),
+                np.float64(0.0),
+                np.float64(0.0),
+                False,
+                np.zeros(2, dtype=np.int64),
+            )
+
+        contact_bodies = []
+        contact_parameters = []
+        self.contact_connections = []
+        for first_sys_idx, second_sys_idx, _, _, connection in simulator._connections:
+            if (
+                not isinstance(connection, ExternalContact)
+                or simulator._systems[first_sys_idx] is not self.rod
+                or not isinstance(simulator._systems[second_sys_idx], Cylinder)
+            ):
+                raise NotImplementedError(
+                    "{0} is not supported by BlockIntegrator.".format(connection)
+                )
+            contact_bodies.append(simulator._systems[second_sys_idx])
+            contact_parameters.append((connection.k, connection.nu))
+            self.contact_connections.append(connection)
+        self.contacts = (
+            np.array(
+                [system_indices[id(body)] - 1 for body in contact_bodies], dtype=np.int64
+            ),
+            np.array([body.radius for body in contact_bodies], dtype=np.float64),
+            np.array([body.length for body in contact_bodies], dtype=np.float64),
+            np.array(contact_parameters, dtype=np.float64).reshape(-1, 2),
+            np.array(
+                [
+                    isinstance(connection, ExternalContactWithBroadPhase)
+                    for connection in self.contact_connections
+                ],
+                dtype=np.bool_,
+            ),
+            np.zeros((len(self.contact_connections), 2), dtype=np.int64),
+        )
+
+        muscle_torques = self.muscle_torques
+        if getattr(muscle_torques, "torque_magnitude_cache", None) is None:
+            muscle_torques.torque_magnitude_cache = np.zeros(
+                (muscle_torques.n_directions, self.rod.n_elems)
+            )
+        self.muscles = (
+            muscle_torques.points_cached,
+            np.zeros(
+                (muscle_torques.n_directions, muscle_torques.number_of_control_points)
+            ),
+            muscle_torques.spline_knots,
+            muscle_torques.spline_coefficient_matrix,
+            muscle_torques.muscle_torque_scale,
+            muscle_torques.torque_magnitude_cache,
+            muscle_torques.directions,
+            np.float64(muscle_torques.max_rate_of_change_of_activation),
+            np.int64(muscle_torques.step_skip),
+            any(
+                recorder is not None
+                for recorder in muscle_torques.torque_profile_recorder_list
+            ),
+            # Whether next step is the initial call of the forcing and step counter.
+            np.zeros(2, dtype=np.int64),
+        )
+        self.records = self.allocate_records(0)
+
+        self.state = self.build_state()
+
+    def allocate_records(self, number_of_records):
+        """
+        This method allocates the arrays of the torque profiles recorded in a block.
+
+        Parameters
+        ----------
+        number_of_records : int
+            Number of recording steps.
+
+        Returns
+        -------
+        tuple
+            Time, torque magnitudes, torques and element positions.
+        """
+        n_elems = self.rod.n_elems
+        return (
+            np.zeros(number_of_records),
+            np.zeros((number_of_records, self.muscle_torques.n_directions, n_elems)),
+            np.zeros((number_of_records, 3, n_elems)),
+            np.zeros((number_of_records, n_elems)),
+        )
+
+    def build_state(self, **fields):
+        """
+        This method binds the arrays and parameters of the integrator to a BlockState.
+
+        Parameters
+        ----------
+        **fields
+            Fields of the BlockState used instead of the attributes of the integrator.
+
+        Returns
+        -------
+        BlockState
+        """
+        return BlockState(
+            *(
+                fields[name] if name in fields else getattr(self, name)
+                for name in _BLOCK_STATE_FIELDS
+            )
+        )
+
+    def integrate(self, time, number_of_steps, time_step=None):
+        """
+        This method integrates the simulator number_of_steps time steps. Muscle torque profiles are
+        recorded in the same steps as the Elastica stepper.
+
+        Parameters
+        ----------
+        time : float
+            Current simulation time.
+        number_of_steps : int
+            Number of time steps to integrate.
+        time_step : float
+            Time step of this block. Default is None, time_step of the integrator is used.
+
+        Returns
+        -------
+        float
+            Simulation time after integration.
+        """
+        if time_step is None:
+            time_step = self.time_step
+        muscle_torques = self.muscle_torques
+        target_points = self.muscles[1]
+        muscle_flags = self.muscles[10]
+        recording = self.muscles[9]
+
+        if muscle_torques.torque_magnitude_cache is not self.muscles[5]:
+            # Muscle torque forcing allocated new torque magnitudes, bind them again.
+            self.muscles = (
+                self.muscles[:5]
+                + (muscle_torques.torque_magnitude_cache,)
+                + self.muscles[6:]
+            )
+            self.state = self.build_state()
+
+        # Control points are not changed during the block.
+        for i in range(muscle_torques.n_directions):
+            target_points[i] = muscle_torques.points_array_list[i](time)
+        muscle_flags[0] = muscle_torques.initial_call_flag == 0
+        muscle_flags[1] = muscle_torques.counter
+
+        # Torque profiles are recorded in the steps counter is divisible by step_skip.
+        number_of_records = 0
+        if recording:
+            number_of_records = (
+                muscle_torques.counter + number_of_steps - 1
+            ) // muscle_torques.step_skip - (
+                muscle_torques.counter - 1
+            ) // muscle_torques.step_skip
+            if number_of_records > self.records[0].shape[0]:
+                self.records = self.allocate_records(number_of_records)
+                self.state = self.build_state()
+
+        time = self.integrate_block(
+            self.state, number_of_steps, np.float64(time), np.float64(time_step)
+        )
+
+        # Counters of the block are added to the connections.
+        contact_counters = self.contacts[5]
+        for i, connection in enumerate(self.contact_connections):
+            if isinstance(connection, ExternalContactWithBroadPhase):
+                connection.contact_counters += contact_counters[i]
+        contact_counters[...] = 0
+
+        if number_of_steps > 0:
+            muscle_torques.initial_call_flag = 1
+        muscle_torques.counter += number_of_steps
+
+        record_time, record_torque_mag, record_torque, record_element_position = (
+            self.records
+        )
+        for k in range(number_of_records):
+            for i in range(muscle_torques.n_directions):
+                recorder = muscle_torques.torque_profile_recorder_list[i]
+                if recorder is not None:
+                    recorder["time"].append(record_time[k])
+                    recorder["torque_mag"].append(record_torque_mag[k, i].copy())
+                    recorder["torque"].append(record_torque[k].copy())
+                    recorder["element_position"].append(
+                        record_element_position[k].copy()
+                    )
+
+        return np.float64(time)
+
+    @staticmethod
+    @njit(cache=True)
+    def integrate_block(state, number_of_steps, time, dt):
+        """
+        This Numba function integrates the simulator number_of_steps time steps using position Verlet scheme.
+        Order of operations is same as the symplectic stepper of Elastica.
+
+        Parameters
+        ----------
+        state : BlockState
+            Arrays and parameters of the rod, rigid bodies, constraints, connections and forcing.
+        number_of_steps : int
+            Number of time steps to integrate.
+        time : float
+            Current simulation time.
+        dt : float
+            Time step of the simulation.
+
+        Returns
+        -------
+        float
+            Simulation time after integration.
+        """
+        rod_kinematic_states = state.rod_kinematic_states
+        rod_states = state.rod_states
+        rigid_body_states = state.rigid_body_states
+        fixed_constraints = state.fixed_constraints
+        wall_constraints = state.wall_constraints
+        contacts = state.contacts
+        static_obstacles = state.static_obstacles
+        distance_grid = state.distance_grid
+        (
+            points_cached,
+            target_points,
+            spline_knots,
+            spline_coefficient_matrix,
+            muscle_torque_scale,
+            torque_magnitude,
+            directions,
+            max_rate_of_change_of_activation,
+            step_skip,
+            recording,
+            muscle_flags,
+        ) = state.muscles
+        initial_call = muscle_flags[0] != 0
+        counter = muscle_flags[1]
+        record_time, record_torque_mag, record_torque, record_element_position = (
+            state.records
+        )
+        external_torques = rod_states[33]
+        lengths = rod_states[7]
+
+        points_changed = np.zeros(directions.shape[0], dtype=np.bool_)
+        record_idx = 0
+        prefac = 0.5 * dt
+
+        for step in range(number_of_steps):
+            _kinematic_step(rod_kinematic_states, rod_states, rigid_body_states, prefac)
+            time += prefac
+
+            _constrain_values(
+                rod_states, rigid_body_states, fixed_constraints, wall_constraints
+            )
+
+            _compute_rod_internal_forces_and_torques(rod_states)
+
+            # Connections are applied before forcing, same as BaseSimulator.
+            _apply_contact_forces(rod_states, rigid_body_states, contacts)
+
+            # Muscle torques, same as FusedMuscleTorquesWithVaryingBetaSplines.apply_torques.
+            any_points_changed = False
+            for i in range(directions.shape[0]):
+                points_changed[i] = initial_call
+                for j in range(target_points.shape[1]):
+                    if points_cached[i + 1, j + 1] != target_points[i, j]:
+                        points_changed[i] = True
+                any_points_changed = any_points_changed or points_changed[i]
+            if any_points_changed:
+                initial_call = False
+                for i in range(directions.shape[0]):
+                    if points_changed[i]:
+                        _filter_activation(
+                            points_cached[i + 1, 1:-1],
+                            target_points[i],
+                            max_rate_of_change_of_activation,
+                        )
+                _compute_torque_magnitude_from_basis(
+                    points_cached,
+                    spline_knots,
+                    spline_coefficient_matrix,
+                    lengths,
+                    muscle_torque_scale,
+                    points_changed,
+                    torque_magnitude,
+                )
+            _compute_muscle_torques(torque_magnitude, directions, external_torques)
+
+            # Static obstacles, same as StaticObstacleField.apply_forces.
+            if static_obstacles[2].shape[0] > 0:
+                _apply_static_obstacle_forces(
+                    rod_states[0],
+                    rod_states[2],
+                    lengths,
+                    rod_states[8],
+                    rod_states[9],
+                    rod_states[30],
+                    rod_states[32],
+                    *static_obstacles
+                )
+
+            # Static obstacles, same as DistanceGridObstacleField.apply_forces.
+            if distance_grid[0].shape[0] > 0:
+                _apply_distance_grid_forces(
+                    rod_states[0],
+                    rod_states[2],
+                    lengths,
+                    rod_states[8],
+                    rod_states[9],
+                    rod_states[30],
+                    rod_states[32],
+                    *distance_grid
+                )
+
+            if recording and (counter + step) % step_skip == 0:
+                record_time[record_idx] = time
+                record_torque_mag[record_idx] = torque_magnitude
+                record_torque[record_idx] = external_torques
+                record_element_position[record_idx] = np.cumsum(lengths)
+                record_idx += 1
+
+            _dynamic_step(rod_kinematic_states, rod_states, rigid_body_states, dt)
+
+            _constrain_rates(rod_states, rigid_body_states, fixed_constraints)
+
+            _kinematic_step(rod_kinematic_states, rod_states, rigid_body_states, prefac)
+            time += prefac
+
+            _constrain_values(
+                rod_states, rigid_body_states, fixed_constraints, wall_constraints
+            )
+
+        return time
+
+
+@njit(cache=True)
+def _kinematic_step(rod_kinematic_states, rod_states, rigid_body_states, prefac):
+    n_nodes, n_kinematic_rates, rates = rod_kinematic_states
+    overload_operator_kinematic_numba(
+        n_nodes, prefac, rod_states[0], rod_states[1], rates[:, :n_kinematic_rates]
+    )
+
+    n_nodes, n_kinematic_rates, _, _, positions, directors = rigid_body_states[:6]
+    rates = rigid_body_states[8]
+    for i in range(n_nodes.shape[0]):
+        overload_operator_kinematic_numba(
+            n_nodes[i],
+            prefac,
+            positions[i],
+            directors[i],
+            rates[i][:, : n_kinematic_rates[i]],
+        )
+
+
+@njit(cache=True)
+def _dynamic_step(rod_kinematic_states, rod_states, rigid_body_states, dt):
+    _, n_kinematic_rates, rates = rod_kinematic_states
+    _update_rod_accelerations(rod_states)
+    overload_operator_dynamic_numba(
+        n_kinematic_rates, dt, rates, rates[:, n_kinematic_rates:]
+    )
+
+    n_kinematic_rates = rigid_body_states[1]
+    rates = rigid_body_states[8]
+    _update_rigid_body_accelerations(rigid_body_states)
+    for i in range(n_kinematic_rates.shape[0]):
+        overload_operator_dynamic_numba(
+            n_kinematic_rates[i], dt, rates[i], rates[i][:, n_kinematic_rates[i] :]
+        )
+
+
+@njit(cache=True)
+def _constrain_values(rod_states, rigid_body_states, fixed_constraints, wall_constraints):
+    positions, directors, velocities = rigid_body_states[4:7]
+
+    system_indices, fixed_positions, fixed_directors = fixed_constraints
+    for i in range(system_indices.shape[0]):
+        if system_indices[i] == 0:
+            _constrain_values_one_end_fixed(
+                rod_states[0], fixed_positions[i], rod_states[1], fixed_directors[i]
+            )
+        else:
+            _constrain_values_one_end_fixed(
+                positions[system_indices[i] - 1],
+                fixed_positions[i],
+                directors[system_indices[i] - 1],
+                fixed_directors[i],
+            )
+
+    # Same as WallBoundaryForSphere, velocity is reflected at the boundaries.
+    rigid_body_indices, radii, boundaries = wall_constraints
+    for i in range(rigid_body_indices.shape[0]):
+        position = positions[rigid_body_indices[i]]
+        velocity = velocities[rigid_body_indices[i]]
+        for j in range(3):
+            if (position[j, 0] - radii[i]) < boundaries[i, 2 * j]:
+                velocity[j, 0] = -velocity[j, 0]
+            if (position[j, 0] + radii[i]) > boundaries[i, 2 * j + 1]:
+                velocity[j, 0] = -velocity[j, 0]
+
+
+@njit(cache=True)
+def _constrain_rates(rod_states, rigid_body_states, fixed_constraints):
+    velocities, omegas = rigid_body_states[6:8]
+
+    system_indices = fixed_constraints[0]
+    for i in range(system_indices.shape[0]):
+        if system_indices[i] == 0:
+            _constrain_rates_one_end_fixed(rod_states[2], rod_states[3])
+        else:
+            _constrain_rates_one_end_fixed(
+                velocities[system_indices[i] - 1], omegas[system_indices[i] - 1]
+            )
+
+
+@njit(cache=True)
+def _compute_rod_internal_forces_and_torques(rod_states):
+    (
+        position_collection,
+        director_collection,
+        velocity_collection,
+        omega_collection,
+        _,
+        _,
+        volume,
+        lengths,
+        tangents,
+        radius,
+        rest_lengths,
+        rest_voronoi_lengths,
+        dilatation,
+        dilatation_rate,
+        voronoi_dilatation,
+        sigma,
+        rest_sigma,
+        kappa,
+        rest_kappa,
+        shear_matrix,
+        bend_matrix,
+        _,
+        mass_second_moment_of_inertia,
+        _,
+        internal_stress,
+        internal_couple,
+        dissipation_constant_for_forces,
+        dissipation_constant_for_torques,
+        damping_forces,
+        damping_torques,
+        internal_forces,
+        internal_torques,
+        _,
+        _,
+    ) = rod_states
+
+    _compute_internal_forces(
+        position_collection,
+        volume,
+        lengths,
+        tangents,
+        radius,
+        rest_lengths,
+        rest_voronoi_lengths,
+        dilatation,
+        voronoi_dilatation,
+        director_collection,
+        sigma,
+        rest_sigma,
+        shear_matrix,
+        internal_stress,
+        velocity_collection,
+        dissipation_constant_for_forces,
+        damping_forces,
+        internal_forces,
+    )
+
+    _compute_internal_torques(
+        position_collection,
+        velocity_collection,
+        tangents,
+        lengths,
+        rest_lengths,
+        director_collection,
+        rest_voronoi_lengths,
+        bend_matrix,
+        rest_kappa,
+        kappa,
+        voronoi_dilatation,
+        mass_second_moment_of_inertia,
+        omega_collection,
+        internal_stress,
+        internal_couple,
+        dilatation,
+        dilatation_rate,
+        dissipation_constant_for_torques,
+        damping_torques,
+        internal_torques,
+    )
+
+
+@njit(cache=True)
+def _update_rod_accelerations(rod_states):
+    acceleration_collection = rod_states[4]
+    alpha_collection = rod_states[5]
+    dilatation = rod_states[12]
+    mass = rod_states[21]
+    inv_mass_second_moment_of_inertia = rod_states[23]
+    internal_forces = rod_states[30]
+    internal_torques = rod_states[31]
+    external_forces = rod_states[32]
+    external_torques = rod_states[33]
+
+    _update_accelerations(
+        acceleration_collection,
+        internal_forces,
+        external_forces,
+        mass,
+        alpha_collection,
+        inv_mass_second_moment_of_inertia,
+        internal_torques,
+        external_torques,
+        dilatation,
+    )
+
+
+@njit(cache=True)
+def _update_rigid_body_accelerations(rigid_body_states):
+    (
+        _,
+        _,
+        include_internal,
+        masses,
+        _,
+        _,
+        _,
+        _,
+        _,
+        accelerations,
+        alphas,
+        inv_mass_second_moment_of_inertias,
+        internal_forces,
+        internal_torques,
+        external_forces,
+        external_torques,
+    ) = rigid_body_states
+
+    # Same as update_accelerations of Sphere and Cylinder.
+    for i in range(masses.shape[0]):
+        if include_internal[i]:
+            accelerations[i][...] = (internal_forces[i] + external_forces[i]) / masses[i]
+            alphas[i][...] = _batch_matvec(
+                inv_mass_second_moment_of_inertias[i],
+                (internal_torques[i] + external_torques[i]),
+            )
+        else:
+            accelerations[i][...] = external_forces[i] / masses[i]
+            alphas[i][...] = _batch_matvec(
+                inv_mass_second_moment_of_inertias[i], external_torques[i]
+            )
+
+        external_force = external_forces[i]
+        external_torque = external_torques[i]
+        external_force *= 0.0
+        external_torque *= 0.0
+
+
+@njit(cache=True)
+def _apply_contact_forces(rod_states, rigid_body_states, contacts):
+    position_collection = rod_states[0]
+    velocity_collection = rod_states[2]
+    lengths = rod_states[7]
+    tangents = rod_states[8]
+    radius = rod_states[9]
+    internal_forces = rod_states[30]
+    external_forces = rod_states[32]
+    positions, directors, velocities = rigid_body_states[4:7]
+    rigid_body_external_forces = rigid_body_states[14]
+    (
+        rigid_body_indices,
+        cylinder_radii,
+        cylinder_lengths,
+        contact_parameters,
+        broad_phase,
+        contact_counters,
+    ) = contacts
+
+    # Same as ExternalContactWithBroadPhase and ExternalContact.apply_forces.
+    for i in range(rigid_body_indices.shape[0]):
+        cylinder_position = positions[rigid_body_indices[i]]
+        cylinder_director = directors[rigid_body_indices[i]]
+        if broad_phase[i] and _cull_rod_cylinder_pair(
+            position_collection,
+            lengths,
+            tangents,
+            radius,
+            cylinder_position,
+            cylinder_director,
+            cylinder_radii[i],
+            cylinder_lengths[i],
+            contact_counters[i],
+        ):
+            continue
+
+        if _prune_using_aabbs(
+            position_collection,
+            radius,
+            lengths,
+            cylinder_position,
+            cylinder_director,
+            cylinder_radii[i],
+            cylinder_lengths[i],
+        ):
+            continue
+
+        x_cyl = (
+            cylinder_position[:, 0]
+            - 0.5 * cylinder_lengths[i] * cylinder_director[2, :, 0]
+        )
+
+        _calculate_contact_forces(
+            position_collection[:, :-1],
+            lengths * tangents,
+            x_cyl,
+            cylinder_lengths[i] * cylinder_director[2, :, 0],
+            radius + cylinder_radii[i],
+            lengths + cylinder_lengths[i],
+            internal_forces,
+            external_forces,
+            rigid_body_external_forces[rigid_body_indices[i]],
+            velocity_collection,
+            velocities[rigid_body_indices[i]],
+            contact_parameters[i, 0],
+            contact_parameters[i, 1],
+        )
@@ -7,19 +7,25 @@ import sys
 import argparse
 import ast
 
-import matplotlib
-import matplotlib.pyplot as plt
-
 # Import stable baseline
 from stable_baselines.bench.monitor import Monitor, load_results
 from stable_baselines.common.policies import MlpPolicy
 from stable_baselines.ddpg.policies import MlpPolicy as MlpPolicy_DDPG
 from stable_baselines.td3.policies import MlpPolicy as MlpPolicy_TD3
 from stable_baselines.sac.policies import MlpPolicy as MlpPolicy_SAC
-from stable_baselines import TRPO, DDPG, PPO1, TD3, SAC
+from stable_baselines import TRPO, DDPG, PPO1, PPO2, TD3, SAC
+
+# Numba kernels are loaded from the cache directory shared by all cases, it is set before the environment is
+# imported. Run numba_warm_up.py once to compile them.
+from numba_warm_up import set_cache_directory
+
+set_cache_directory()
 
 # Import simulation environment
 from set_environment import Environment
+from sweep_scheduler import get_stop_callback
+from batched_environment import BatchedEnvironment
+from shared_memory_vec_env import SharedMemoryVecEnv
 
 
 def get_valid_filename(s):
@@ -61,6 +67,9 @@ def plot_results(log_folder, title="Learning Curve"):
 
     """
 
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import ts2xy
+
     x, y = ts2xy(load_results(log_folder), "timesteps")
     y = moving_average(y, window=50)
     # Truncate x
@@ -180,6 +189,19 @@ parser.add_argument(
     "--algo_name", type=str, default="TRPO",
 )
 
+parser.add_argument(
+    "--n_batched_envs", type=int, default=1,
+)
+
+parser.add_argument(
+    "--n_envs", type=int, default=1,
+)
+
+# Verbosity of the messages of training environments, see Environment.
+parser.add_argument(
+    "--verbosity", type=str, default="summary",
+)
+
 parser.add_argument(
     "--number_of_control_points", type=int, default=4,
 )
@@ -236,6 +258,21 @@ elif args.algo_name == "SAC":
     batchsize = "train_freq"
     offpolicy = True
 
+# Number of environments collecting rollouts for one policy update.
+n_vec_envs = max(args.n_batched_envs, args.n_envs)
+if n_vec_envs > 1:
+    # Batched environment and worker pool are vectorized environments, PPO2 is the only
+    # algorithm used here that supports vectorized environments.
+    if args.algo_name != "PPO":
+        raise ValueError(
+            "Vectorized environments are only supported with PPO, not "
+            + args.algo_name
+        )
+    if args.n_batched_envs > 1 and args.n_envs > 1:
+        raise ValueError("Use either n_batched_envs or n_envs, not both.")
+    algo = PPO2
+    batchsize = "n_steps"
+
 
 # target position
 args.target_position = [-0.8, 0.5, 0.35]
@@ -248,7 +285,7 @@ args.NU = 30
 args.target_v = 0.5
 args.boundary = [-0.6, 0.6, 0.3, 0.9, -0.6, 0.6]
 
-env = Environment(
+env_kwargs = dict(
     final_time=args.final_time,
     num_steps_per_update=args.num_steps_per_update,
     number_of_control_points=args.number_of_control_points,
@@ -265,6 +302,13 @@ env = Environment(
     NU=args.NU,
     num_obstacles=12,
     GENERATE_NEW_OBSTACLES=True,
+    precompute_spline_basis=True,
+    reuse_simulator=True,
+    block_integration=True,
+    rollback_on_nan=True,
+    contact_broad_phase=True,
+    static_obstacles=True,
+    verbosity=args.verbosity if args.TRAIN else "verbose",
 )
 
 name = str(args.algo_name) + "_nested_regular_id-"
@@ -291,11 +335,29 @@ identifer = (
 if args.TRAIN:
     log_dir = "./log_" + identifer + "/"
     os.makedirs(log_dir, exist_ok=True)
-    env = Monitor(env, log_dir)
-
-
-from stable_baselines.results_plotter import ts2xy, plot_results
-from stable_baselines import results_plotter
+    if args.n_batched_envs > 1:
+        env = BatchedEnvironment(
+            args.n_batched_envs, monitor_dir=log_dir, seed=args.SEED, **env_kwargs
+        )
+    elif args.n_envs > 1:
+        # Each worker writes its own <rank>.monitor.csv in log_dir.
+        env = SharedMemoryVecEnv(
+            args.n_envs,
+            seed=args.SEED,
+            monitor_dir=log_dir,
+            # Obstacles are generated once in the main process and loaded by workers.
+            worker_kwargs=dict(GENERATE_NEW_OBSTACLES=False),
+            **env_kwargs
+        )
+    else:
+        # Metrics of the episodes are written as extra columns of the monitor file.
+        env = Monitor(
+            Environment(seed=args.SEED, **env_kwargs),
+            log_dir,
+            info_keywords=Environment.episode_metric_names,
+        )
+else:
+    env = Environment(seed=args.SEED, **env_kwargs)
 
 
 if args.TRAIN:
@@ -317,12 +379,24 @@ if args.TRAIN:
             "policy": MLP,
             batchsize: args.timesteps_per_batch,
         }
+        if n_vec_envs > 1:
+            # PPO2 collects n_steps transitions from each environment.
+            items[batchsize] = args.timesteps_per_batch // n_vec_envs
     model = algo(env=env, verbose=1, seed=args.SEED, **items)
 
     model.set_env(env)
     print("Training for ", args.total_timesteps)
 
-    model.learn(total_timesteps=int(args.total_timesteps))
+    # If this command is run by a sweep with pruning, training stops when its configuration is pruned.
+    model.learn(
+        total_timesteps=int(args.total_timesteps),
+        callback=get_stop_callback(log_dir),
+    )
+    # Plotting modules are imported after training, so training processes do not import matplotlib.
+    import matplotlib.pyplot as plt
+    from stable_baselines.results_plotter import plot_results
+    from stable_baselines import results_plotter
+
     # library helper
     plot_results(
         [log_dir],
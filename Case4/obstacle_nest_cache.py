@@ -0,0 +1,116 @@
+__doc__ = """This file is for caching obstacle nests (randomly positioned and oriented cylinders) on disk. Each nest is
+stored as a plain .npy array named by the hash of its content, so a nest is never overwritten by another one and
+processes using the same nest share a read-only memory-mapped file instead of parsing a pickled npz file."""
+
+import hashlib
+import os
+
+import numpy as np
+
+# Version of the nest file format, changing it changes hashes of nests.
+OBSTACLE_NEST_VERSION = 1
+
+# Columns of the nest array, each row is an obstacle.
+OBSTACLE_NEST_COLUMNS = {
+    "obstacle_start": slice(0, 3),
+    "obstacle_direction": slice(3, 6),
+    "obstacle_normal": slice(6, 9),
+    "obstacle_length": 9,
+    "obstacle_radii": 10,
+}
+NUMBER_OF_OBSTACLE_NEST_COLUMNS = 11
+
+# Nests are cached in memory, so environments of the same process load the nest once.
+_obstacle_nest_cache = {}
+
+
+def get_obstacle_nest_key(nest):
+    """
+    Returns the hash of an obstacle nest, which is the name of the cached nest file.
+
+    Parameters
+    ----------
+    nest : numpy.ndarray
+        2D (n_obstacles, NUMBER_OF_OBSTACLE_NEST_COLUMNS) array containing data with 'float' type.
+
+    Returns
+    -------
+    str
+
+    """
+    nest = np.ascontiguousarray(nest, dtype=np.float64)
+    digest = hashlib.sha256()
+    digest.update(np.array([OBSTACLE_NEST_VERSION] + list(nest.shape)).tobytes())
+    digest.update(nest.tobytes())
+    return digest.hexdigest()
+
+
+def save_obstacle_nest(cache_directory, **obstacles):
+    """
+    This function saves an obstacle nest to the cache directory and returns its key. Nest is written to a
+    temporary file and renamed, so other processes never read a partial file. If the same nest is already
+    cached, file is not changed.
+
+    Parameters
+    ----------
+    cache_directory : str
+        Directory of cached nests.
+    **obstacles
+        Arrays or lists of obstacle_start, obstacle_direction, obstacle_normal, obstacle_length and
+        obstacle_radii.
+
+    Returns
+    -------
+    str
+
+    """
+    n_obstacles = len(obstacles["obstacle_radii"])
+    nest = np.zeros((n_obstacles, NUMBER_OF_OBSTACLE_NEST_COLUMNS))
+    for name, columns in OBSTACLE_NEST_COLUMNS.items():
+        nest[:, columns] = np.array(obstacles[name], dtype=np.float64).reshape(
+            nest[:, columns].shape
+        )
+    key = get_obstacle_nest_key(nest)
+
+    filename = os.path.join(cache_directory, key + ".npy")
+    if not os.path.exists(filename):
+        os.makedirs(cache_directory, exist_ok=True)
+        temporary_filename = "%s.%d.tmp" % (filename, os.getpid())
+        with open(temporary_filename, "wb") as file:
+            np.save(file, nest, allow_pickle=False)
+        os.replace(temporary_filename, filename)
+    return key
+
+
+def load_obstacle_nest(cache_directory, key):
+    """
+    This function loads a cached obstacle nest. Nest file is memory-mapped read-only and loaded once in a
+    process. Content of the file is checked against its key when it is loaded.
+
+    Parameters
+    ----------
+    cache_directory : str
+        Directory of cached nests.
+    key : str
+        Key of the nest returned by save_obstacle_nest.
+
+    Returns
+    -------
+    dict
+        Read-only arrays of obstacle_start, obstacle_direction, obstacle_normal (n_obstacles, 3) and
+        obstacle_length, obstacle_radii (n_obstacles,).
+
+    """
+    if key not in _obstacle_nest_cache:
+        filename = os.path.join(cache_directory, key + ".npy")
+        nest = np.load(filename, mmap_mode="r", allow_pickle=False)
+        if (
+            nest.ndim != 2
+            or nest.shape[1] != NUMBER_OF_OBSTACLE_NEST_COLUMNS
+            or get_obstacle_nest_key(nest) != key
+        ):
+            raise ValueError("Cached obstacle nest " + filename + " is corrupted.")
+        _obstacle_nest_cache[key] = {
+            name: nest[:, columns] for name, columns in OBSTACLE_NEST_COLUMNS.items()
+        }
+    return _obstacle_nest_cache[key]
@@ -0,0 +1,212 @@
+__doc__ = """This file is for reward shaping terms computed over the whole arm. Distances of all nodes to the target and
+clearance of all elements to the obstacles are computed in a single Numba kernel, so adding shaping terms does not
+add Python loops over nodes or obstacles to the step."""
+
+import numpy as np
+from numba import njit
+
+from static_obstacle_field import compute_clearance
+
+# Names of the reward terms, in the order of the weights and values arrays.
+REWARD_TERMS = (
+    "tip_distance",  # distance between the arm tip and the target
+    "mean_node_distance",  # mean distance between arm nodes and the target
+    "max_node_distance",  # largest distance between arm nodes and the target
+    "obstacle_clearance",  # smallest gap between arm elements and obstacles, at most clearance_cutoff
+    "obstacle_penetration",  # largest overlap between arm elements and obstacles
+)
+
+
+class RewardTerms:
+    """
+    Weighted sum of reward shaping terms. Term values are computed every step from the arm positions, and reward
+    is the sum of the values multiplied by their weights. Terms with zero weight are not computed, except node
+    distances, which are computed together in one pass over the nodes.
+
+    Attributes
+    ----------
+    weights : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Weights of the terms in REWARD_TERMS.
+    values : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Values of the terms at the last compute call.
+    clearance_cutoff : float
+        Obstacle clearance is not larger than this distance, so the term is constant far from the obstacles.
+    use_obstacle_terms : boolean
+        True if obstacle_clearance or obstacle_penetration has a weight.
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Start of the axis of each obstacle.
+    cylinder_axes : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type. Axis of each obstacle.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    """
+
+    def __init__(self, weights, clearance_cutoff=0.1):
+        """
+
+        Parameters
+        ----------
+        weights : dict
+            Weight of each term, names are in REWARD_TERMS. Terms which are not given have zero weight.
+        clearance_cutoff : float
+            Obstacle clearance is not larger than this distance. Default is 0.1.
+        """
+        unknown_terms = set(weights) - set(REWARD_TERMS)
+        if unknown_terms:
+            raise ValueError(
+                "Unknown reward terms "
+                + ", ".join(sorted(unknown_terms))
+                + ", reward terms are "
+                + ", ".join(REWARD_TERMS)
+            )
+        self.weights = np.array(
+            [float(weights.get(name, 0.0)) for name in REWARD_TERMS]
+        )
+        self.values = np.zeros(len(REWARD_TERMS))
+        self.clearance_cutoff = float(clearance_cutoff)
+        self.use_obstacle_terms = bool(
+            weights.get("obstacle_clearance", 0.0)
+            or weights.get("obstacle_penetration", 0.0)
+        )
+        self.set_obstacles(np.zeros((3, 0)), np.zeros((3, 0)), np.zeros(0))
+
+    def set_obstacles(self, cylinder_starts, cylinder_axes, cylinder_radii):
+        """
+        This method sets the obstacles used by the obstacle terms, see static_obstacle_field.get_cylinder_segments.
+
+        Parameters
+        ----------
+        cylinder_starts : numpy.ndarray
+            2D (3, n_cylinders) array containing data with 'float' type.
+        cylinder_axes : numpy.ndarray
+            2D (3, n_cylinders) array containing data with 'float' type.
+        cylinder_radii : numpy.ndarray
+            1D (n_cylinders,) array containing data with 'float' type.
+
+        Returns
+        -------
+
+        """
+        self.cylinder_starts = np.ascontiguousarray(cylinder_starts, dtype=np.float64)
+        self.cylinder_axes = np.ascontiguousarray(cylinder_axes, dtype=np.float64)
+        self.cylinder_radii = np.ascontiguousarray(cylinder_radii, dtype=np.float64)
+
+    def compute(self, position_collection, radius, target_position):
+        """
+        This method computes values of the terms and returns the weighted sum of them.
+
+        Parameters
+        ----------
+        position_collection : numpy.ndarray
+            2D (3, n_nodes) array containing data with 'float' type. Positions of the arm nodes.
+        radius : numpy.ndarray
+            1D (n_elems,) array containing data with 'float' type. Radii of the arm elements.
+        target_position : numpy.ndarray
+            1D (3,) array containing data with 'float' type.
+
+        Returns
+        -------
+        float
+
+        """
+        return _compute_reward_terms(
+            position_collection,
+            radius,
+            target_position,
+            self.cylinder_starts,
+            self.cylinder_axes,
+            self.cylinder_radii,
+            self.clearance_cutoff,
+            self.use_obstacle_terms,
+            self.weights,
+            self.values,
+        )
+
+    def get_values(self):
+        """
+        Returns values of the terms at the last compute call.
+
+        Returns
+        -------
+        dict
+
+        """
+        return dict(zip(REWARD_TERMS, self.values.tolist()))
+
+
+@njit(cache=True)
+def _compute_reward_terms(
+    position_collection,
+    radius,
+    target_position,
+    cylinder_starts,
+    cylinder_axes,
+    cylinder_radii,
+    clearance_cutoff,
+    use_obstacle_terms,
+    weights,
+    values,
+):
+    """
+    This function computes values of the reward terms in the order of REWARD_TERMS and returns their weighted sum.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    radius : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    target_position : numpy.ndarray
+        1D (3,) array containing data with 'float' type.
+    cylinder_starts : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_axes : numpy.ndarray
+        2D (3, n_cylinders) array containing data with 'float' type.
+    cylinder_radii : numpy.ndarray
+        1D (n_cylinders,) array containing data with 'float' type.
+    clearance_cutoff : float
+    use_obstacle_terms : bool
+    weights : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type.
+    values : numpy.ndarray
+        1D (n_terms,) array containing data with 'float' type. Values of the terms are written in this array.
+
+    Returns
+    -------
+    float
+
+    """
+    n_nodes = position_collection.shape[1]
+    distance = 0.0
+    distance_sum = 0.0
+    max_distance = 0.0
+    for j in range(n_nodes):
+        distance = np.sqrt(
+            (position_collection[0, j] - target_position[0]) ** 2
+            + (position_collection[1, j] - target_position[1]) ** 2
+            + (position_collection[2, j] - target_position[2]) ** 2
+        )
+        distance_sum += distance
+        if distance > max_distance:
+            max_distance = distance
+    values[0] = distance
+    values[1] = distance_sum / n_nodes
+    values[2] = max_distance
+
+    clearance = clearance_cutoff
+    if use_obstacle_terms:
+        clearance = compute_clearance(
+            position_collection,
+            radius,
+            cylinder_starts,
+            cylinder_axes,
+            cylinder_radii,
+            clearance_cutoff,
+        )
+    values[3] = clearance
+    values[4] = max(-clearance, 0.0)
+
+    reward = 0.0
+    for k in range(values.shape[0]):
+        reward += weights[k] * values[k]
+    return reward
@@ -0,0 +1,329 @@
+__doc__ = """This file is for estimating the stable time step of the position Verlet scheme for the arm (Cosserat rod).
+Stable time step is estimated for the current state of the rod from the stiffness and damping of elements and
+nodes, and from the external contact stiffness. It is used by the environments to select the number of time steps
+in each control interval. Bare arms of the cases diverge at about 1.1-1.15 times the estimate, so it is not
+loose, and sim_dt of the training scripts is already close to it."""
+
+import numpy as np
+from numba import njit
+
+from elastica.joint import ExternalContact
+
+# Cases without obstacles do not have static_obstacle_field, isinstance checks against an empty tuple are false.
+try:
+    from static_obstacle_field import StaticObstacleField
+except ImportError:
+    StaticObstacleField = ()
+
+
+def compute_contact_stiffness(simulator, rod):
+    """
+    Returns the sum of contact stiffness of ExternalContact connections and StaticObstacleField obstacles of the
+    rod. It is an upper bound of the contact stiffness acting on a node of the rod.
+
+    Parameters
+    ----------
+    simulator : BaseSimulator
+        Finalized Elastica simulator.
+    rod : object
+        Rod-like object.
+
+    Returns
+    -------
+    float
+
+    """
+    contact_stiffness = 0.0
+    for first_sys_idx, second_sys_idx, _, _, connection in simulator._connections:
+        if isinstance(connection, ExternalContact) and (
+            simulator._systems[first_sys_idx] is rod
+            or simulator._systems[second_sys_idx] is rod
+        ):
+            contact_stiffness += connection.k
+    for sys_idx, forcing in simulator._ext_forces_torques:
+        if isinstance(forcing, StaticObstacleField) and simulator._systems[sys_idx] is rod:
+            contact_stiffness += forcing.k * forcing.cylinder_radii.shape[0]
+    return contact_stiffness
+
+
+def compute_stable_time_step(
+    rod, contact_stiffness=0.0, safety_factor=0.8, cfl_number=0.5
+):
+    """
+    Returns the stable time step of the rod for its current state.
+
+    Parameters
+    ----------
+    rod : object
+        Rod-like object.
+    contact_stiffness : float
+        Contact stiffness acting on nodes of the rod, see compute_contact_stiffness. Default is 0.0.
+    safety_factor : float
+        Estimated stable time step is multiplied by the safety factor. Default is 0.8.
+    cfl_number : float
+        Nodes cannot move more than cfl_number times the element length in one time step. Default is 0.5.
+
+    Returns
+    -------
+    float
+
+    """
+    return _compute_stable_time_step(
+        rod.mass,
+        rod.mass_second_moment_of_inertia,
+        rod.shear_matrix,
+        rod.bend_matrix,
+        rod.lengths,
+        rod.dilatation,
+        rod.rest_voronoi_lengths,
+        rod.voronoi_dilatation,
+        rod.dissipation_constant_for_forces,
+        rod.dissipation_constant_for_torques,
+        rod.velocity_collection,
+        np.float64(contact_stiffness),
+        np.float64(safety_factor),
+        np.float64(cfl_number),
+    )
+
+
+@njit(cache=True)
+def _damped_stable_time_step(omega_square, gamma):
+    """
+    Returns stable time step of position Verlet scheme for a damped oscillator
+    x'' = - omega_square x - gamma x'. Damping force is explicit, stable time step is
+    2 (sqrt(1 + zeta^2) - zeta) / omega where zeta = gamma / (2 omega).
+
+    Parameters
+    ----------
+    omega_square : float
+        Square of the natural frequency.
+    gamma : float
+        Damping rate.
+
+    Returns
+    -------
+    float
+
+    """
+    return 4.0 / (gamma + np.sqrt(gamma * gamma + 4.0 * omega_square))
+
+
+@njit(cache=True)
+def _compute_stable_time_step(
+    mass,
+    mass_second_moment_of_inertia,
+    shear_matrix,
+    bend_matrix,
+    lengths,
+    dilatation,
+    rest_voronoi_lengths,
+    voronoi_dilatation,
+    dissipation_constant_for_forces,
+    dissipation_constant_for_torques,
+    velocity_collection,
+    contact_stiffness,
+    safety_factor,
+    cfl_number,
+):
+    """
+    This function estimates the highest frequencies of nodes (translation) and elements (rotation) from the
+    rows of the stiffness and damping matrices (Gershgorin bound) and returns the smallest stable time step.
+
+    Parameters
+    ----------
+    mass : numpy.ndarray
+        1D (n_nodes,) array containing data with 'float' type.
+    mass_second_moment_of_inertia : numpy.ndarray
+        3D (3, 3, n_elems) array containing data with 'float' type.
+    shear_matrix : numpy.ndarray
+        3D (3, 3, n_elems) array containing data with 'float' type.
+    bend_matrix : numpy.ndarray
+        3D (3, 3, n_voronoi) array containing data with 'float' type.
+    lengths : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    dilatation : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    rest_voronoi_lengths : numpy.ndarray
+        1D (n_voronoi,) array containing data with 'float' type.
+    voronoi_dilatation : numpy.ndarray
+        1D (n_voronoi,) array containing data with 'float' type.
+    dissipation_constant_for_forces : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    dissipation_constant_for_torques : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    velocity_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    contact_stiffness : float
+    safety_factor : float
+    cfl_number : float
+
+    Returns
+    -------
+    float
+
+    """
+    n_elems = lengths.shape[0]
+    n_voronoi = rest_voronoi_lengths.shape[0]
+
+    # Translational and bending stiffness of elements and voronoi domains.
+    translational_stiffness = np.empty(n_elems)
+    for k in range(n_elems):
+        translational_stiffness[k] = (
+            max(shear_matrix[0, 0, k], shear_matrix[1, 1, k], shear_matrix[2, 2, k])
+            / lengths[k]
+        )
+    bending_stiffness = np.empty(n_voronoi)
+    for k in range(n_voronoi):
+        bending_stiffness[k] = max(
+            bend_matrix[0, 0, k], bend_matrix[1, 1, k], bend_matrix[2, 2, k]
+        ) / (rest_voronoi_lengths[k] * voronoi_dilatation[k])
+
+    stable_time_step = np.inf
+
+    # Translation of nodes.
+    for i in range(n_elems + 1):
+        stiffness = contact_stiffness
+        damping = 0.0
+        if i > 0:
+            stiffness += 2.0 * translational_stiffness[i - 1]
+            damping += 0.5 * dissipation_constant_for_forces[i - 1] * lengths[i - 1]
+        if i < n_elems:
+            stiffness += 2.0 * translational_stiffness[i]
+            damping += 0.5 * dissipation_constant_for_forces[i] * lengths[i]
+        stable_time_step = min(
+            stable_time_step,
+            _damped_stable_time_step(stiffness / mass[i], damping / mass[i]),
+        )
+
+    # Rotation of elements. Angular accelerations are scaled by dilatation.
+    for i in range(n_elems):
+        inertia = (
+            min(
+                mass_second_moment_of_inertia[0, 0, i],
+                mass_second_moment_of_inertia[1, 1, i],
+                mass_second_moment_of_inertia[2, 2, i],
+            )
+            / dilatation[i]
+        )
+        stiffness = max(shear_matrix[0, 0, i], shear_matrix[1, 1, i]) * lengths[i]
+        if i > 0:
+            stiffness += 2.0 * bending_stiffness[i - 1]
+        if i < n_voronoi:
+            stiffness += 2.0 * bending_stiffness[i]
+        damping = dissipation_constant_for_torques[i] * lengths[i]
+        stable_time_step = min(
+            stable_time_step,
+            _damped_stable_time_step(stiffness / inertia, damping / inertia),
+        )
+
+    stable_time_step *= safety_factor
+
+    # Nodes cannot move more than cfl_number times the element length in one time step.
+    max_velocity = 0.0
+    for i in range(n_elems + 1):
+        max_velocity = max(
+            max_velocity,
+            np.sqrt(
+                velocity_collection[0, i] ** 2
+                + velocity_collection[1, i] ** 2
+                + velocity_collection[2, i] ** 2
+            ),
+        )
+    if max_velocity > 0.0:
+        stable_time_step = min(
+            stable_time_step, cfl_number * lengths.min() / max_velocity
+        )
+
+    return stable_time_step
+
+
+def check_divergence(rod, time_step, cfl_number=0.5):
+    """
+    Returns true if the state of the rod is not finite, or if nodes move more than cfl_number times the
+    element length or elements rotate more than cfl_number radians in one time step. Arm cannot move that
+    fast, it only happens if the integration is unstable, before the state becomes NaN.
+
+    Parameters
+    ----------
+    rod : object
+        Rod-like object.
+    time_step : float
+        Time step used to integrate the rod.
+    cfl_number : float
+        Default is 0.5.
+
+    Returns
+    -------
+    bool
+
+    """
+    return _check_divergence(
+        rod.position_collection,
+        rod.velocity_collection,
+        rod.omega_collection,
+        rod.lengths,
+        np.float64(time_step),
+        np.float64(cfl_number),
+    )
+
+
+@njit(cache=True)
+def _check_divergence(
+    position_collection,
+    velocity_collection,
+    omega_collection,
+    lengths,
+    time_step,
+    cfl_number,
+):
+    """
+    This function checks the divergence of the rod, see check_divergence.
+
+    Parameters
+    ----------
+    position_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    velocity_collection : numpy.ndarray
+        2D (3, n_nodes) array containing data with 'float' type.
+    omega_collection : numpy.ndarray
+        2D (3, n_elems) array containing data with 'float' type.
+    lengths : numpy.ndarray
+        1D (n_elems,) array containing data with 'float' type.
+    time_step : float
+    cfl_number : float
+
+    Returns
+    -------
+    bool
+
+    """
+    min_length = np.inf
+    for k in range(lengths.shape[0]):
+        if not np.isfinite(lengths[k]):
+            return True
+        min_length = min(min_length, lengths[k])
+
+    for k in range(position_collection.shape[1]):
+        velocity = np.sqrt(
+            velocity_collection[0, k] ** 2
+            + velocity_collection[1, k] ** 2
+            + velocity_collection[2, k] ** 2
+        )
+        if not (
+            np.isfinite(position_collection[0, k])
+            and np.isfinite(position_collection[1, k])
+            and np.isfinite(position_collection[2, k])
+            and velocity * time_step <= cfl_number * min_length
+        ):
+            return True
+
+    for k in range(omega_collection.shape[1]):
+        omega = np.sqrt(
+            omega_collection[0, k] ** 2
+            + omega_collection[1, k] ** 2
+            + omega_collection[2, k] ** 2
+        )
+        if not omega * time_step <= cfl_number:
+            return True
+
+    return False
@@ -0,0 +1,319 @@
+__doc__ = """This file is for stopping dominated configurations of a training sweep early. Configurations of a sweep are
+the commands without their seed, i.e. algorithm and batch size. Learning curves of the running commands are read from
+their monitor files as the files grow, and configurations are pruned with asynchronous successive halving (ASHA):
+when a command reaches a rung, i.e. a number of training time steps, the mean reward of its configuration at that
+rung is compared with the other configurations which reached the rung, and the configuration is stopped if it is
+not in the best 1 / reduction_factor of them. Compute of the pruned commands goes to the remaining commands."""
+
+import glob
+import os
+
+import numpy as np
+
+from sweep_scheduler import parse_command
+
+
+def get_configuration(command):
+    """
+    Returns the configuration of a training command, which is the script and options of the command except its
+    seed, i.e. "logging_bio_args.py --algo=PPO --timesteps_per_batch=16000 --total_timesteps=10000000.0".
+
+    Parameters
+    ----------
+    command : str
+
+    Returns
+    -------
+    str
+
+    """
+    script, _, options = parse_command(command)
+    return " ".join(
+        [script]
+        + [
+            "--%s=%s" % (name, value)
+            for name, value in sorted(options.items())
+            if name != "SEED"
+        ]
+    )
+
+
+class MonitorProgress:
+    """
+    Learning curve of a command, read from the monitor files in its monitor directory. Vectorized environments
+    write a monitor file for each environment, so episodes of all files are merged in the order they end. Only the
+    lines written since the last update are read.
+
+    Attributes
+    ----------
+    monitor_directory : str
+    offsets : dict
+        Position of the first unread line of each monitor file.
+    episodes : list
+        Wall time, length and reward of each finished episode.
+    """
+
+    def __init__(self, monitor_directory):
+        """
+
+        Parameters
+        ----------
+        monitor_directory : str
+            Directory of the monitor files, which are named monitor.csv or <rank>.monitor.csv.
+        """
+        self.monitor_directory = monitor_directory
+        self.offsets = {}
+        self.episodes = []
+
+    def update(self):
+        """
+        This method reads the episodes written to the monitor files since the last update. Line which is being
+        written is read in the next update.
+
+        Returns
+        -------
+
+        """
+        filenames = glob.glob(os.path.join(self.monitor_directory, "*monitor.csv"))
+        for filename in filenames:
+            with open(filename) as file:
+                file.seek(self.offsets.get(filename, 0))
+                while True:
+                    line = file.readline()
+                    if not line.endswith("\n"):
+                        break
+                    self.offsets[filename] = file.tell()
+                    # Lines of the metadata and the header of the columns are skipped.
+                    if line.startswith("#") or line.startswith("r,"):
+                        continue
+                    reward, length, wall_time = line.split(",")[:3]
+                    self.episodes.append(
+                        (float(wall_time), float(length), float(reward))
+                    )
+
+    def get_reward(self, timesteps, window):
+        """
+        Returns mean reward of the last window episodes which ended before timesteps training time steps. If
+        training has not reached timesteps yet, returns None.
+
+        Parameters
+        ----------
+        timesteps : float
+            Number of training time steps.
+        window : int
+            Number of averaged episodes.
+
+        Returns
+        -------
+        float
+
+        """
+        if not self.episodes:
+            return None
+        episodes = np.array(sorted(self.episodes))
+        ends = np.cumsum(episodes[:, 1])
+        if ends[-1] < timesteps:
+            return None
+        n_episodes = np.searchsorted(ends, timesteps, side="right")
+        if n_episodes == 0:
+            return None
+        return float(np.mean(episodes[max(n_episodes - window, 0) : n_episodes, 2]))
+
+
+class SuccessiveHalving:
+    """
+    Asynchronous successive halving rule of a sweep, see run_sweep. Rungs are at min_timesteps,
+    min_timesteps * reduction_factor, min_timesteps * reduction_factor ** 2, ... training time steps, below the
+    total time steps of the command. A configuration is pruned at a rung if at least min_configurations
+    configurations reached the rung and its mean reward over its seeds is not in the best
+    1 / reduction_factor of them. A pruned configuration is not pruned again, its running commands are stopped and
+    its pending commands are skipped.
+
+    Attributes
+    ----------
+    min_timesteps : float
+        Training time steps of the first rung.
+    reduction_factor : float
+        Ratio of consecutive rungs, and inverse of the fraction of configurations kept at a rung.
+    min_configurations : int
+        Configurations are not pruned at a rung until this number of configurations reached it.
+    reward_window : int
+        Reward of a command at a rung is the mean reward of its last reward_window episodes.
+    poll_interval : float
+        Seconds between reads of the monitor files.
+    progress : dict
+        Learning curve of each running command.
+    """
+
+    def __init__(
+        self,
+        min_timesteps=5.0e5,
+        reduction_factor=3,
+        min_configurations=None,
+        reward_window=100,
+        poll_interval=60.0,
+    ):
+        """
+
+        Parameters
+        ----------
+        min_timesteps : float
+            Training time steps of the first rung. Default is 5e5.
+        reduction_factor : float
+            Ratio of consecutive rungs. Default is 3, one third of the configurations is kept at each rung.
+        min_configurations : int
+            Number of configurations which have to reach a rung before configurations are pruned at it. Default
+            is None, reduction_factor configurations.
+        reward_window : int
+            Number of episodes averaged for the reward at a rung. Default is 100.
+        poll_interval : float
+            Seconds between reads of the monitor files. Default is 60.
+        """
+        if reduction_factor <= 1:
+            raise ValueError("reduction_factor has to be larger than 1.")
+        self.min_timesteps = float(min_timesteps)
+        self.reduction_factor = reduction_factor
+        self.min_configurations = (
+            int(np.ceil(reduction_factor))
+            if min_configurations is None
+            else min_configurations
+        )
+        self.reward_window = reward_window
+        self.poll_interval = poll_interval
+        self.progress = {}
+
+    def get_rungs(self, total_timesteps):
+        """
+        Returns training time steps of the rungs of a command with total_timesteps time steps.
+
+        Parameters
+        ----------
+        total_timesteps : float
+
+        Returns
+        -------
+        list
+
+        """
+        rungs = []
+        rung = self.min_timesteps
+        while rung < total_timesteps:
+            rungs.append(rung)
+            rung *= self.reduction_factor
+        return rungs
+
+    def is_pruned(self, command, status):
+        """
+        Returns True if the configuration of a command is pruned.
+
+        Parameters
+        ----------
+        command : str
+        status : dict
+            Status of the commands of the sweep.
+
+        Returns
+        -------
+        bool
+
+        """
+        configuration = get_configuration(command)
+        return any(
+            command_status.get("pruned") or command_status.get("state") == "pruned"
+            for other_command, command_status in status.items()
+            if get_configuration(other_command) == configuration
+        )
+
+    def is_dominated(self, configuration, rung, status):
+        """
+        Returns True if the mean reward of a configuration at a rung is not in the best 1 / reduction_factor of the
+        configurations which reached the rung.
+
+        Parameters
+        ----------
+        configuration : str
+        rung : str
+            Training time steps of the rung, key of the rung_rewards of the command status.
+        status : dict
+            Status of the commands of the sweep.
+
+        Returns
+        -------
+        bool
+
+        """
+        rewards = {}
+        for command, command_status in status.items():
+            reward = command_status.get("rung_rewards", {}).get(rung)
+            if reward is not None:
+                rewards.setdefault(get_configuration(command), []).append(reward)
+        if configuration not in rewards or len(rewards) < self.min_configurations:
+            return False
+
+        mean_rewards = sorted(
+            (np.mean(values) for values in rewards.values()), reverse=True
+        )
+        n_kept = max(int(len(mean_rewards) / self.reduction_factor), 1)
+        return np.mean(rewards[configuration]) < mean_rewards[n_kept - 1]
+
+    def update(self, status, running_commands, finished_commands=()):
+        """
+        This method reads the learning curves of the running and just finished commands, records their rewards
+        at the rungs they reached in their status and returns the running commands which have to be stopped.
+
+        Parameters
+        ----------
+        status : dict
+            Status of the commands of the sweep. Monitor directory of a running command is in its status once the
+            training script called get_stop_callback.
+        running_commands : list
+        finished_commands : list
+            Commands finished since the last update, end of their learning curves is read. Default is ().
+
+        Returns
+        -------
+        list
+            Running commands of the configurations pruned in this update.
+
+        """
+        pruned_configurations = set()
+        for command in list(running_commands) + list(finished_commands):
+            command_status = status[command]
+            if command_status.get("pruned") or "monitor_directory" not in command_status:
+                continue
+            key = (command, command_status["monitor_directory"])
+            if key not in self.progress:
+                self.progress[key] = MonitorProgress(command_status["monitor_directory"])
+            progress = self.progress[key]
+            progress.update()
+
+            _, _, options = parse_command(command)
+            rung_rewards = command_status.setdefault("rung_rewards", {})
+            for rung in self.get_rungs(float(options.get("total_timesteps", np.inf))):
+                rung = "%d" % rung
+                if rung in rung_rewards:
+                    continue
+                reward = progress.get_reward(float(rung), self.reward_window)
+                if reward is None:
+                    break
+                rung_rewards[rung] = reward
+                configuration = get_configuration(command)
+                if self.is_dominated(configuration, rung, status):
+                    pruned_configurations.add(configuration)
+                    break
+
+        # Progress of finished commands is not read again.
+        running_keys = {
+            (command, status[command].get("monitor_directory"))
+            for command in running_commands
+        }
+        for key in list(self.progress):
+            if key not in running_keys:
+                del self.progress[key]
+
+        return [
+            command
+            for command in running_commands
+            if not status[command].get("pruned")
+            and get_configuration(command) in pruned_configurations
+        ]
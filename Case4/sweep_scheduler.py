@@ -0,0 +1,649 @@
+__doc__ = """This file is for running a sweep of training commands (seeds, algorithms, batch sizes) on a pool of
+long-lived worker processes. Workers import TensorFlow, stable-baselines, Elastica and the environment before they
+take commands, and they run training scripts in their own interpreter, so modules are imported and numba kernels are
+compiled once per worker instead of once per command. Each command runs in a fresh TensorFlow graph. Commands are
+started from the most expensive one, workers are pinned to their own cores, failed commands are retried and the
+status of each command is saved, so an interrupted sweep is resumed from where it stopped. If a pruning rule is
+given (see sweep_pruning.py), commands of dominated configurations are stopped early."""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+import gc
+import importlib
+import json
+import multiprocessing
+import os
+import shlex
+import sys
+import time
+import traceback
+
+# Relative cost of one training time step of each algorithm. Off-policy algorithms update the networks at every
+# time step, so they are more expensive than on-policy algorithms updating once in a batch.
+ALGORITHM_COSTS = {
+    "PPO": 1.0,
+    "TRPO": 1.0,
+    "DDPG": 4.0,
+    "TD3": 4.0,
+    "SAC": 5.0,
+}
+OFF_POLICY_ALGORITHMS = ("DDPG", "TD3", "SAC")
+
+# Replay buffer size, at which the cost of an off-policy time step is doubled.
+REFERENCE_BUFFER_SIZE = 1.0e7
+
+# Environment variables limiting the number of threads of numerical libraries, set before they are imported, see
+# limit_threads.
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMBA_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+)
+
+# Modules imported by each worker before it takes commands. Modules which cannot be imported are skipped.
+PRELOADED_MODULES = (
+    "numpy",
+    "tensorflow",
+    "stable_baselines",
+    "elastica",
+    "set_environment",
+    "batched_environment",
+)
+
+# Environment variable with the job file of the running command. Training script writes its monitor directory in the
+# job file, and sweep stops the command by creating the stop file next to it, see get_stop_callback.
+JOB_FILE_VARIABLE = "SWEEP_JOB_FILE"
+
+# Number of training steps between checks of the stop file.
+STOP_CHECK_INTERVAL = 1000
+
+
+def parse_command(command):
+    """
+    Returns the script and arguments of a training command, i.e.
+    "python3 logging_bio_args.py --total_timesteps=1e6 --SEED=0 --timesteps_per_batch=16000 --algo=PPO".
+
+    Parameters
+    ----------
+    command : str
+
+    Returns
+    -------
+    script : str
+    argv : list
+        Arguments passed to the script.
+    options : dict
+        Values of the --name=value arguments.
+    """
+    words = shlex.split(command)
+    if words[0].startswith("python"):
+        words = words[1:]
+    script, argv = words[0], words[1:]
+    options = {}
+    for word in argv:
+        if word.startswith("--") and "=" in word:
+            name, value = word[2:].split("=", 1)
+            options[name] = value
+    return script, argv, options
+
+
+def get_algorithm(options):
+    return options.get("algo_name", options.get("algo", "TRPO"))
+
+
+def estimate_command_cost(command, seconds_per_timestep=None):
+    """
+    Returns estimated cost of a training command. If durations of finished commands of the same algorithm are
+    known, cost is the estimated duration in seconds, otherwise it is in relative units.
+
+    Parameters
+    ----------
+    command : str
+    seconds_per_timestep : dict
+        Measured seconds per training time step of each algorithm. Default is None.
+
+    Returns
+    -------
+    float
+
+    """
+    _, _, options = parse_command(command)
+    algorithm = get_algorithm(options)
+    total_timesteps = float(options.get("total_timesteps", 1.0e6))
+    if seconds_per_timestep and algorithm in seconds_per_timestep:
+        return total_timesteps * seconds_per_timestep[algorithm]
+
+    cost = total_timesteps * ALGORITHM_COSTS.get(algorithm, 1.0)
+    if algorithm in OFF_POLICY_ALGORITHMS:
+        # timesteps_per_batch is the replay buffer size of off-policy algorithms.
+        buffer_size = float(options.get("timesteps_per_batch", 0.0))
+        cost *= 1.0 + buffer_size / REFERENCE_BUFFER_SIZE
+    if seconds_per_timestep:
+        # Relative costs are scaled to seconds by the mean of the measured algorithms.
+        cost *= sum(seconds_per_timestep.values()) / sum(
+            ALGORITHM_COSTS.get(name, 1.0) for name in seconds_per_timestep
+        )
+    return cost
+
+
+def load_status(status_file):
+    if not os.path.exists(status_file):
+        return {}
+    with open(status_file) as file:
+        return json.load(file)
+
+
+def save_status(status_file, status):
+    # Status is written to a temporary file and renamed, so an interrupted sweep never leaves a partial file.
+    temporary_file = "%s.%d.tmp" % (status_file, os.getpid())
+    with open(temporary_file, "w") as file:
+        json.dump(status, file, indent=1, sort_keys=True)
+    os.replace(temporary_file, status_file)
+
+
+def get_seconds_per_timestep(status):
+    """
+    Returns mean measured seconds per training time step of each algorithm, from the finished commands.
+
+    Parameters
+    ----------
+    status : dict
+        Status of the commands.
+
+    Returns
+    -------
+    dict
+
+    """
+    durations = {}
+    for command, command_status in status.items():
+        if command_status.get("state") != "done":
+            continue
+        _, _, options = parse_command(command)
+        algorithm = get_algorithm(options)
+        total_timesteps = float(options.get("total_timesteps", 1.0e6))
+        durations.setdefault(algorithm, []).append(
+            command_status["duration"] / total_timesteps
+        )
+    return {
+        algorithm: sum(values) / len(values) for algorithm, values in durations.items()
+    }
+
+
+def _get_job_files(log_filename):
+    # Job and stop files of a command are next to its log file.
+    base = os.path.splitext(log_filename)[0]
+    return base + ".job.json", base + ".stop"
+
+
+def get_stop_callback(monitor_directory):
+    """
+    This function tells the sweep running this training command where the monitor files of the command are, and
+    returns a callback for model.learn, which stops training when the sweep prunes the command. Training script
+    continues after model.learn returns, so the stopped policy and learning curve are saved.
+
+    Parameters
+    ----------
+    monitor_directory : str
+        Directory of the monitor files of the training environment.
+
+    Returns
+    -------
+    callable
+        Callback of stable-baselines, None if the command is not run by a sweep.
+
+    """
+    job_file = os.environ.get(JOB_FILE_VARIABLE)
+    if job_file is None:
+        return None
+    temporary_file = "%s.%d.tmp" % (job_file, os.getpid())
+    with open(temporary_file, "w") as file:
+        json.dump(dict(monitor_directory=os.path.abspath(monitor_directory)), file)
+    os.replace(temporary_file, job_file)
+
+    stop_file = job_file[: -len(".job.json")] + ".stop"
+    n_calls = [0]
+
+    def callback(locals_, globals_):
+        n_calls[0] += 1
+        if n_calls[0] % STOP_CHECK_INTERVAL:
+            return True
+        return not os.path.exists(stop_file)
+
+    return callback
+
+
+def get_available_cores():
+    """
+    Returns the cores this process can run on.
+
+    Returns
+    -------
+    list
+
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def limit_threads(num_procs, threads_per_worker=None):
+    """
+    This function sets THREAD_VARIABLES to the number of threads of each worker of a sweep. Numpy creates the
+    thread pools of OpenBLAS or MKL when it is imported, and workers are forked from the sweep process, so they
+    keep the thread pools of the sweep process. It has to be called at the top of the sweep script, before numpy
+    is imported (sweep_pruning imports numpy).
+
+    Parameters
+    ----------
+    num_procs : int
+        Number of worker processes.
+    threads_per_worker : int
+        Number of cores of each worker. Default is None, available cores are divided by num_procs.
+
+    Returns
+    -------
+    int
+        Number of threads of each worker, to be given to run_sweep.
+    """
+    if "numpy" in sys.modules:
+        print(
+            "numpy is imported before limit_threads is called, sweep workers keep its thread pools and "
+            "can oversubscribe their cores"
+        )
+    if threads_per_worker is None:
+        threads_per_worker = max(len(get_available_cores()) // num_procs, 1)
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads_per_worker)
+    return threads_per_worker
+
+
+def _initialize_worker(core_sets, threads_per_worker, preload_modules, warm_up):
+    # Each worker takes its own set of cores. Thread pools of numpy are created in the sweep process, see
+    # limit_threads, libraries imported first by the worker create their thread pools with this number of threads.
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads_per_worker)
+    cores = core_sets.get()
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    start = time.time()
+    for module in preload_modules:
+        try:
+            importlib.import_module(module)
+        except ImportError as error:
+            print("Worker %d cannot preload %s: %s" % (os.getpid(), module, error))
+    if warm_up is not None:
+        warm_up()
+    print(
+        "Worker %d is ready in %.1f seconds, cores %s"
+        % (os.getpid(), time.time() - start, cores)
+    )
+
+
+@contextmanager
+def _fresh_graph():
+    # Graphs created by the command are added to a new default graph, which is released after the command.
+    tensorflow = sys.modules.get("tensorflow")
+    if tensorflow is None or not hasattr(tensorflow, "Graph"):
+        yield
+        return
+    with tensorflow.Graph().as_default():
+        yield
+
+
+def _release_command(run_globals):
+    """
+    This function closes the environment and the TensorFlow session of a finished command and releases its
+    variables, so they are not kept by the long-lived worker. Training scripts name them env and model.
+
+    Parameters
+    ----------
+    run_globals : dict
+        Global variables of the training script.
+
+    Returns
+    -------
+
+    """
+    resources = [
+        run_globals.get("env"),
+        getattr(run_globals.get("model"), "sess", None),
+    ]
+    for resource in resources:
+        if resource is not None and hasattr(resource, "close"):
+            try:
+                resource.close()
+            except Exception:
+                traceback.print_exc()
+    run_globals.clear()
+    gc.collect()
+
+
+def _run_command(command, log_filename):
+    """
+    This function runs a training command in the worker process and returns its duration and error.
+
+    Parameters
+    ----------
+    command : str
+    log_filename : str
+        Standard output and error of the command are written in this file.
+
+    Returns
+    -------
+    duration : float
+        Duration of the command in seconds.
+    error : str
+        Traceback if the command raised an exception, otherwise None.
+    """
+    script, argv, _ = parse_command(command)
+    script_directory = os.path.dirname(os.path.abspath(script))
+    if script_directory not in sys.path:
+        sys.path.insert(0, script_directory)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+    saved_argv = sys.argv
+    job_file, _ = _get_job_files(log_filename)
+    os.environ[JOB_FILE_VARIABLE] = os.path.abspath(job_file)
+    run_globals = {
+        "__name__": "__main__",
+        "__file__": script,
+        "__builtins__": __builtins__,
+    }
+    error = None
+    start = time.time()
+    with open(log_filename, "a") as log_file:
+        # Output of TensorFlow and numba is written to the file descriptors, not to sys.stdout.
+        os.dup2(log_file.fileno(), 1)
+        os.dup2(log_file.fileno(), 2)
+        try:
+            sys.argv = [script] + argv
+            with open(script) as file:
+                code = compile(file.read(), script, "exec")
+            with _fresh_graph():
+                exec(code, run_globals)
+        except SystemExit as exception:
+            if exception.code not in (None, 0):
+                error = traceback.format_exc()
+                print(error)
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+        finally:
+            sys.argv = saved_argv
+            os.environ.pop(JOB_FILE_VARIABLE, None)
+            _release_command(run_globals)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+    duration = time.time() - start
+
+    # Graphs and figures of the finished command are released, modules stay imported for the next command.
+    if "tensorflow" in sys.modules:
+        tensorflow = sys.modules["tensorflow"]
+        if hasattr(tensorflow, "reset_default_graph"):
+            tensorflow.reset_default_graph()
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+    return duration, error
+
+
+def run_sweep(
+    commands,
+    num_procs=8,
+    threads_per_worker=None,
+    status_file="sweep_status.json",
+    log_directory="sweep_logs",
+    max_attempts=2,
+    preload_modules=PRELOADED_MODULES,
+    warm_up=None,
+    pruning=None,
+):
+    """
+    This function runs training commands on num_procs worker processes. Commands are started in the order of
+    decreasing estimated cost, so long off-policy commands do not start last and delay the end of the sweep.
+    Commands finished in a previous sweep with the same status file are skipped, failed commands are retried
+    up to max_attempts times in total. If a worker crashes, workers are restarted and the command is retried.
+    If pruning is given, learning curves of the running commands are checked every pruning.poll_interval
+    seconds, commands of dominated configurations are stopped and their pending commands are skipped.
+
+    Parameters
+    ----------
+    commands : list
+        Training commands, i.e. "python3 logging_bio_args.py --SEED=0 --algo=PPO".
+    num_procs : int
+        Number of worker processes. Default is 8.
+    threads_per_worker : int
+        Number of cores of each worker, workers are pinned to their cores and numerical libraries use this
+        number of threads. Thread pools of numpy are limited only if limit_threads is called with the same
+        number before numpy is imported. Default is None, available cores are divided by num_procs.
+    status_file : str
+        State, number of attempts and duration of each command are saved in this file after each command.
+        Default is "sweep_status.json".
+    log_directory : str
+        Output of each command is written in a file in this directory. Default is "sweep_logs".
+    max_attempts : int
+        Maximum number of times a command is run. Default is 2.
+    preload_modules : tuple
+        Modules imported by each worker before it takes commands. Default is PRELOADED_MODULES.
+    warm_up : callable
+        If given, it is called by each worker after preloading modules, i.e. to compile numba kernels by
+        running an environment step. Default is None.
+    pruning : SuccessiveHalving
+        Rule pruning dominated configurations, see sweep_pruning.py. Default is None, commands are not pruned.
+
+    Returns
+    -------
+    dict
+        Status of the commands.
+    """
+    os.makedirs(log_directory, exist_ok=True)
+    status = load_status(status_file)
+    seconds_per_timestep = get_seconds_per_timestep(status)
+    pending = [
+        command
+        for command in dict.fromkeys(commands)
+        if status.get(command, {}).get("state") not in ("done", "pruned")
+        and status.get(command, {}).get("attempts", 0) < max_attempts
+    ]
+    pending.sort(
+        key=lambda command: estimate_command_cost(command, seconds_per_timestep),
+        reverse=True,
+    )
+    n_skipped = len(dict.fromkeys(commands)) - len(pending)
+
+    def prune_pending():
+        # Pending commands of pruned configurations are not run.
+        for command in list(pending):
+            if pruning.is_pruned(command, status):
+                pending.remove(command)
+                status.setdefault(command, {"attempts": 0})["state"] = "pruned"
+
+    if pruning is not None:
+        prune_pending()
+    print(
+        "Sweep of %d commands, %d commands finished, pruned or failed in previous sweeps are skipped"
+        % (len(pending), n_skipped)
+    )
+
+    cores = get_available_cores()
+    if threads_per_worker is None:
+        threads_per_worker = max(len(cores) // num_procs, 1)
+
+    # Workers are forked like the multiprocessing Pool, so this script is not executed again in the workers.
+    context = multiprocessing.get_context("fork")
+
+    def start_workers():
+        core_sets = context.Queue()
+        for i in range(num_procs):
+            core_sets.put(
+                cores[i * threads_per_worker : (i + 1) * threads_per_worker]
+                if (i + 1) * threads_per_worker <= len(cores)
+                else None
+            )
+        return ProcessPoolExecutor(
+            num_procs,
+            mp_context=context,
+            initializer=_initialize_worker,
+            initargs=(core_sets, threads_per_worker, preload_modules, warm_up),
+        )
+
+    start = time.time()
+    n_finished = 0
+    n_pruned = 0
+    finished_timesteps = 0.0
+    executor = start_workers()
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < num_procs:
+                command = pending.pop(0)
+                command_status = status.setdefault(command, {"attempts": 0})
+                command_status["attempts"] += 1
+                command_status["state"] = "running"
+                if "log" not in command_status:
+                    # Status only grows, so each command has its own log file, also in resumed sweeps.
+                    command_status["log"] = os.path.join(
+                        log_directory, "%d.log" % (len(status) - 1)
+                    )
+                log_filename = command_status["log"]
+                # Files and learning curve of the previous attempt are not used.
+                for filename in _get_job_files(log_filename):
+                    if os.path.exists(filename):
+                        os.remove(filename)
+                for key in ("monitor_directory", "rung_rewards", "pruned"):
+                    command_status.pop(key, None)
+                print(command)
+                print("command started at:", datetime.now())
+                running[executor.submit(_run_command, command, log_filename)] = command
+            save_status(status_file, status)
+
+            done, _ = wait(
+                running,
+                timeout=None if pruning is None else pruning.poll_interval,
+                return_when=FIRST_COMPLETED,
+            )
+            broken = False
+            finished_commands = []
+            for future in done:
+                command = running.pop(future)
+                command_status = status[command]
+                try:
+                    duration, error = future.result()
+                except BrokenProcessPool:
+                    duration, error = None, "Worker process crashed."
+                    broken = True
+
+                if command_status.get("pruned"):
+                    command_status["state"] = "pruned"
+                    command_status["duration"] = duration
+                    n_pruned += 1
+                elif error is None:
+                    command_status["state"] = "done"
+                    command_status["duration"] = duration
+                    n_finished += 1
+                    finished_commands.append(command)
+                    _, _, options = parse_command(command)
+                    finished_timesteps += float(options.get("total_timesteps", 0.0))
+                else:
+                    command_status["state"] = "failed"
+                    command_status["error"] = error.strip().splitlines()[-1]
+                    if command_status["attempts"] < max_attempts:
+                        pending.insert(0, command)
+
+                elapsed = time.time() - start
+                print(
+                    "command %s at: %s %s"
+                    % (
+                        "finished"
+                        if command_status["state"] == "done"
+                        else command_status["state"],
+                        datetime.now(),
+                        command,
+                    )
+                )
+                print(
+                    "%d commands finished, %d pruned, %d pending, %d running, %.2f commands per hour, "
+                    "%.0f training time steps per second"
+                    % (
+                        n_finished,
+                        n_pruned,
+                        len(pending),
+                        len(running),
+                        3600.0 * n_finished / elapsed,
+                        finished_timesteps / elapsed,
+                    )
+                )
+                print()
+
+            if broken:
+                # Other commands of the crashed pool are lost, they are run again on new workers.
+                for command in running.values():
+                    status[command]["attempts"] -= 1
+                    pending.insert(0, command)
+                running = {}
+                executor.shutdown(wait=False)
+                executor = start_workers()
+
+            if pruning is not None:
+                for command in list(running.values()) + finished_commands:
+                    command_status = status[command]
+                    job_file, _ = _get_job_files(command_status["log"])
+                    if "monitor_directory" not in command_status and os.path.exists(
+                        job_file
+                    ):
+                        with open(job_file) as file:
+                            command_status.update(json.load(file))
+                for command in pruning.update(
+                    status, list(running.values()), finished_commands
+                ):
+                    # Command stops at its next check of the stop file.
+                    status[command]["pruned"] = True
+                    _, stop_file = _get_job_files(status[command]["log"])
+                    open(stop_file, "w").close()
+                    print("command stopped at: %s %s" % (datetime.now(), command))
+                prune_pending()
+            save_status(status_file, status)
+    finally:
+        for command in running.values():
+            status[command]["state"] = "interrupted"
+            status[command]["attempts"] -= 1
+        save_status(status_file, status)
+        # Commands that have not started are not run, shutdown has no cancel_futures before Python 3.9.
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=not running)
+
+    print(
+        "Sweep finished in %.2f hours, %d commands finished, %d pruned, %d failed"
+        % (
+            (time.time() - start) / 3600.0,
+            sum(
+                1
+                for command in dict.fromkeys(commands)
+                if status.get(command, {}).get("state") == "done"
+            ),
+            sum(
+                1
+                for command in dict.fromkeys(commands)
+                if status.get(command, {}).get("state") == "pruned"
+            ),
+            sum(
+                1
+                for command in dict.fromkeys(commands)
+                if status.get(command, {}).get("state") == "failed"
+            ),
+        )
+    )
+    return status
@@ -0,0 +1,668 @@
+__doc__ = """This script is to benchmark the simulation cost of the environments of all cases. For each case and
+configuration, reset and step times are measured and step time is split into integration, muscle forcing,
+contact, call backs, get_state and reward. Steps per second are measured for different numbers of elements,
+numbers of obstacles and simulation time steps. Results are written to a JSON file, so they can be compared
+across versions.
+
+Each configuration runs in a separate process, with the case folder as the first module search path and a
+temporary working directory, so modules of different cases are not mixed and files written by environments
+(e.g. obstacle nests) do not change the repository.
+
+Example, benchmark Case 1 and Case 4 for 20 and 50 elements:
+    python benchmarks/benchmark_environments.py --cases Case1 Case4 --n_elem 20 50 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Environment arguments of each case, same as the training scripts (logging_bio_args.py) except final_time,
+# which is set from the number of benchmarked steps. num_obstacles are the numbers of obstacles case supports.
+CASES = {
+    "Case1": dict(
+        env_kwargs=dict(
+            num_steps_per_update=7,
+            number_of_control_points=6,
+            alpha=75,
+            beta=75,
+            mode=4,
+            target_position=[-0.4, 0.6, 0.2],
+            target_v=0.5,
+            boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+            E=1e7,
+            sim_dt=2.0e-4,
+            n_elem=20,
+            NU=30,
+            num_obstacles=0,
+            dim=3.0,
+            precompute_spline_basis=True,
+            reuse_simulator=True,
+            block_integration=True,
+            rollback_on_nan=True,
+        ),
+        num_obstacles=(0,),
+    ),
+    "Case2": dict(
+        env_kwargs=dict(
+            num_steps_per_update=7,
+            number_of_control_points=6,
+            alpha=75,
+            beta=75,
+            mode=2,
+            target_position=[-0.4, 0.6, 0.2],
+            target_v=0.5,
+            boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+            E=1e7,
+            sim_dt=2.0e-4,
+            n_elem=20,
+            NU=30,
+            dim=3.5,
+            precompute_spline_basis=True,
+            reuse_simulator=True,
+            block_integration=True,
+            rollback_on_nan=True,
+        ),
+        num_obstacles=(),
+    ),
+    "Case3/ReacherSoft_Case3_main-text": dict(
+        env_kwargs=dict(
+            num_steps_per_update=14,
+            number_of_control_points=2,
+            alpha=75,
+            beta=75,
+            mode=1,
+            target_position=[-0.8, 0.5, 0.15],
+            target_v=0.5,
+            boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+            E=1e7,
+            sim_dt=1e-4,
+            n_elem=50,
+            NU=30,
+            num_obstacles=8,
+            precompute_spline_basis=True,
+            reuse_simulator=True,
+            block_integration=True,
+            rollback_on_nan=True,
+            contact_broad_phase=True,
+            static_obstacles=True,
+        ),
+        num_obstacles=(0, 8),
+    ),
+    "Case3/ReacherSoft_Case3_SI-ctrl_pts": dict(
+        env_kwargs=dict(
+            num_steps_per_update=14,
+            number_of_control_points=4,
+            alpha=75,
+            beta=75,
+            mode=1,
+            target_position=[-0.8, 0.5, 0.15],
+            target_v=0.5,
+            boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+            E=1e7,
+            sim_dt=1e-4,
+            n_elem=50,
+            NU=30,
+            num_obstacles=8,
+            precompute_spline_basis=True,
+            reuse_simulator=True,
+            block_integration=True,
+            rollback_on_nan=True,
+            contact_broad_phase=True,
+            static_obstacles=True,
+        ),
+        num_obstacles=(0, 8),
+    ),
+    "Case4": dict(
+        env_kwargs=dict(
+            num_steps_per_update=14,
+            number_of_control_points=2,
+            alpha=75,
+            beta=75,
+            mode=1,
+            target_position=[-0.8, 0.5, 0.35],
+            target_v=0.5,
+            boundary=[-0.6, 0.6, 0.3, 0.9, -0.6, 0.6],
+            E=1e7,
+            sim_dt=1e-4,
+            n_elem=50,
+            NU=30,
+            num_obstacles=12,
+            GENERATE_NEW_OBSTACLES=True,
+            precompute_spline_basis=True,
+            reuse_simulator=True,
+            block_integration=True,
+            rollback_on_nan=True,
+            contact_broad_phase=True,
+            static_obstacles=True,
+        ),
+        num_obstacles=(0, 4, 8, 12),
+    ),
+}
+
+# Parts of the step time. Integration does not contain muscle forcing, contact and call backs. Other is the rest
+# of the step time, e.g. checkpoints and divergence checks of rollback_on_nan.
+STEP_COMPONENTS = (
+    "set_action",
+    "integration",
+    "muscle_forcing",
+    "contact",
+    "callbacks",
+    "get_state",
+    "reward",
+    "other",
+)
+
+
+def get_configurations(args):
+    """
+    Returns the benchmarked configurations. For each case, base configuration is benchmarked and number of
+    elements, number of obstacles and simulation time step are changed one at a time. When simulation time
+    step is changed, number of time steps per update is changed so that control interval is not changed.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    list
+        Configurations, dictionaries of case, changed parameter and environment arguments.
+
+    """
+    configurations = []
+    for case in args.cases:
+        base_kwargs = dict(CASES[case]["env_kwargs"])
+        base_kwargs["block_integration"] = not args.stepper
+        base_kwargs["COLLECT_DATA_FOR_POSTPROCESSING"] = False
+
+        variations = [("base", None)]
+        variations += [("n_elem", n_elem) for n_elem in args.n_elem]
+        variations += [
+            ("num_obstacles", num_obstacles)
+            for num_obstacles in args.num_obstacles
+            if num_obstacles in CASES[case]["num_obstacles"]
+        ]
+        variations += [("sim_dt", sim_dt) for sim_dt in args.sim_dt]
+        if args.callbacks:
+            variations.append(("COLLECT_DATA_FOR_POSTPROCESSING", True))
+
+        for parameter, value in variations:
+            env_kwargs = dict(base_kwargs)
+            if parameter == "sim_dt":
+                control_interval = env_kwargs["num_steps_per_update"] * env_kwargs["sim_dt"]
+                env_kwargs["num_steps_per_update"] = max(
+                    int(round(control_interval / value)), 1
+                )
+            if parameter != "base":
+                if parameter != "COLLECT_DATA_FOR_POSTPROCESSING" and value == base_kwargs[parameter]:
+                    continue
+                env_kwargs[parameter] = value
+
+            # Episode is long enough for warm-up and benchmarked steps of one episode.
+            env_kwargs["final_time"] = (
+                (args.n_warmup_steps + args.n_steps + 1)
+                * env_kwargs["num_steps_per_update"]
+                * env_kwargs["sim_dt"]
+            )
+            configurations.append(
+                dict(
+                    case=case,
+                    parameter=parameter,
+                    value=value,
+                    n_steps=args.n_steps,
+                    n_warmup_steps=args.n_warmup_steps,
+                    n_resets=args.n_resets,
+                    seed=args.seed,
+                    env_kwargs=env_kwargs,
+                )
+            )
+    return configurations
+
+
+def run_configuration(configuration, timeout=None):
+    """
+    This function benchmarks a configuration in a new process and returns the results.
+
+    Parameters
+    ----------
+    configuration : dict
+    timeout : float
+        Time limit of the process in seconds. Default is None.
+
+    Returns
+    -------
+    dict
+
+    """
+    with tempfile.TemporaryDirectory() as working_directory:
+        configuration_file = os.path.join(working_directory, "configuration.json")
+        result_file = os.path.join(working_directory, "result.json")
+        with open(configuration_file, "w") as file:
+            json.dump(configuration, file)
+
+        start = time.perf_counter()
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--worker",
+                configuration_file,
+                result_file,
+            ],
+            cwd=working_directory,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            timeout=timeout,
+        )
+        if process.returncode != 0 or not os.path.exists(result_file):
+            return dict(
+                error="Benchmark process failed with return code %d" % process.returncode,
+                output=process.stdout[-5000:],
+                wall_time=time.perf_counter() - start,
+            )
+        with open(result_file) as file:
+            result = json.load(file)
+        result["wall_time"] = time.perf_counter() - start
+        return result
+
+
+class _Timer:
+    """
+    Accumulates time spent in wrapped functions.
+
+    Attributes
+    ----------
+    totals : defaultdict(float)
+        Total time of each component in seconds.
+    wrapped : set
+        Ids of objects whose methods are wrapped.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.wrapped = set()
+
+    def wrap(self, component, function):
+        def wrapped_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.totals[component] += time.perf_counter() - start
+
+        return wrapped_function
+
+    def wrap_methods(self, component, instance, names):
+        if id(instance) in self.wrapped:
+            return
+        self.wrapped.add(id(instance))
+        for name in names:
+            setattr(instance, name, self.wrap(component, getattr(instance, name)))
+
+
+def _get_forcing_component(forcing):
+    # Obstacle fields are forcings acting on the arm, they are contact.
+    try:
+        from static_obstacle_field import StaticObstacleField
+    except ImportError:
+        # Cases without obstacles do not have static_obstacle_field.
+        return "muscle_forcing"
+
+    if isinstance(forcing, StaticObstacleField):
+        return "contact"
+    return "muscle_forcing"
+
+
+def _wrap_simulator(env, timer):
+    """
+    Wraps forcings, connections and call backs of the simulator of the environment, so that their time is
+    measured when the simulator is integrated by the Elastica stepper.
+    """
+    simulator = env.simulator
+    for _, forcing in simulator._ext_forces_torques:
+        timer.wrap_methods(
+            _get_forcing_component(forcing), forcing, ("apply_forces", "apply_torques")
+        )
+    for connection in simulator._connections:
+        timer.wrap_methods("contact", connection[-1], ("apply_forces", "apply_torques"))
+    for _, callback in simulator._callbacks:
+        timer.wrap_methods("callbacks", callback, ("make_callback",))
+
+
+def _without_contact(contacts, static_obstacles, distance_grid):
+    # Kernel applies contact only if there are connections, obstacles or grid nodes.
+    return (
+        tuple(array[:0] for array in contacts),
+        static_obstacles[:2] + (static_obstacles[2][:0],) + static_obstacles[3:],
+        (distance_grid[0][:0],) + distance_grid[1:],
+    )
+
+
+def _without_muscles(muscles):
+    # Kernel computes muscle torques of each direction, there are no directions.
+    (
+        points_cached,
+        target_points,
+        spline_knots,
+        spline_coefficient_matrix,
+        muscle_torque_scale,
+        torque_magnitude,
+        directions,
+        max_rate_of_change_of_activation,
+        step_skip,
+        _,
+        muscle_flags,
+    ) = muscles
+    return (
+        points_cached,
+        target_points[:0],
+        spline_knots,
+        spline_coefficient_matrix,
+        muscle_torque_scale,
+        torque_magnitude[:0],
+        directions[:0],
+        max_rate_of_change_of_activation,
+        step_skip,
+        False,
+        muscle_flags,
+    )
+
+
+def _measure_block_components(env, checkpoint, number_of_steps, time_step, totals):
+    """
+    Measures the muscle forcing and contact time of a step integrated by the BlockIntegrator, whose forcings
+    are applied inside a compiled kernel. Step is integrated again from the checkpoint before the step,
+    with all forcings, without contact and without contact and muscle torques, and differences of integration
+    times are the contact and muscle forcing times. Simulation is restored to the state after the step
+    afterwards.
+    """
+    integrator = env.block_integrator
+    state = integrator.state
+    after_step = env.save_checkpoint()
+
+    contacts, static_obstacles, distance_grid = _without_contact(
+        integrator.contacts, integrator.static_obstacles, integrator.distance_grid
+    )
+    without_contact = integrator.build_state(
+        contacts=contacts, static_obstacles=static_obstacles, distance_grid=distance_grid
+    )
+    without_contact_and_muscles = integrator.build_state(
+        contacts=contacts,
+        static_obstacles=static_obstacles,
+        distance_grid=distance_grid,
+        muscles=_without_muscles(integrator.muscles),
+    )
+
+    times = []
+    for variant in (state, without_contact, without_contact_and_muscles):
+        env.restore_checkpoint(checkpoint)
+        integrator.state = variant
+        start = time.perf_counter()
+        integrator.integrate(checkpoint[0], number_of_steps, time_step)
+        times.append(time.perf_counter() - start)
+    integrator.state = state
+    env.restore_checkpoint(after_step)
+
+    totals["contact"] += times[0] - times[1]
+    totals["muscle_forcing"] += times[1] - times[2]
+
+
+def benchmark_configuration(configuration):
+    """
+    This function creates the environment of a configuration and measures reset and step times. It runs in
+    the benchmark process, case folder has to be the first module search path.
+
+    Parameters
+    ----------
+    configuration : dict
+
+    Returns
+    -------
+    dict
+
+    """
+    from set_environment import Environment
+
+    np.random.seed(configuration["seed"])
+    start = time.perf_counter()
+    env = Environment(**configuration["env_kwargs"])
+    construction_time = time.perf_counter() - start
+
+    reset_times = []
+    start = time.perf_counter()
+    env.reset()
+    reset_times.append(time.perf_counter() - start)
+
+    timer = _Timer()
+    number_of_time_steps = []
+    time_steps = []
+    integrate = env.integrate
+
+    def counted_integrate(number_of_steps, time_step):
+        number_of_time_steps.append(number_of_steps)
+        time_steps.append(time_step)
+        return integrate(number_of_steps, time_step)
+
+    env.integrate = timer.wrap("integrate", counted_integrate)
+    env.set_action = timer.wrap("set_action", env.set_action)
+    env.get_state = timer.wrap("get_state", env.get_state)
+    env.finish_step = timer.wrap("finish_step", env.finish_step)
+
+    # Actions are deterministic, smooth in time and different for each control point.
+    n_actions = env.action_space.shape[0]
+    actions = [
+        0.8 * np.sin(0.3 * k + np.arange(n_actions))
+        for k in range(configuration["n_warmup_steps"] + configuration["n_steps"])
+    ]
+
+    block_integration = getattr(env, "block_integrator", None) is not None
+    block_totals = defaultdict(float)
+
+    def run_step(action):
+        if not block_integration:
+            _wrap_simulator(env, timer)
+            checkpoint = None
+        else:
+            checkpoint = env.save_checkpoint()
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        elapsed_time = time.perf_counter() - start
+        if block_integration:
+            _measure_block_components(
+                env, checkpoint, number_of_time_steps[-1], time_steps[-1], block_totals
+            )
+        if done:
+            env.reset()
+        return elapsed_time
+
+    # Warm-up steps compile the kernels and they are not measured.
+    for action in actions[: configuration["n_warmup_steps"]]:
+        run_step(action)
+
+    timer.totals.clear()
+    block_totals.clear()
+    del number_of_time_steps[:]
+    step_time = 0.0
+    for action in actions[configuration["n_warmup_steps"] :]:
+        step_time += run_step(action)
+
+    for _ in range(configuration["n_resets"]):
+        start = time.perf_counter()
+        env.reset()
+        reset_times.append(time.perf_counter() - start)
+
+    n_steps = configuration["n_steps"]
+    totals = timer.totals
+    if block_integration:
+        totals["muscle_forcing"] = block_totals["muscle_forcing"]
+        totals["contact"] = block_totals["contact"]
+    components = dict(
+        set_action=totals["set_action"],
+        integration=totals["integrate"]
+        - totals["muscle_forcing"]
+        - totals["contact"]
+        - totals["callbacks"],
+        muscle_forcing=totals["muscle_forcing"],
+        contact=totals["contact"],
+        callbacks=totals["callbacks"],
+        get_state=totals["get_state"],
+        # finish_step updates the target, computes the state, reward and done.
+        reward=totals["finish_step"] - totals["get_state"],
+    )
+    components["other"] = step_time - sum(components.values())
+    return dict(
+        case=configuration["case"],
+        parameter=configuration["parameter"],
+        value=configuration["value"],
+        env_kwargs=configuration["env_kwargs"],
+        block_integration=block_integration,
+        # If block integration is used, muscle forcing and contact times are differences of integration
+        # times with and without them, since they are applied in a compiled kernel.
+        component_method="differential" if block_integration else "instrumented",
+        n_steps=n_steps,
+        n_time_steps=int(np.sum(number_of_time_steps)),
+        construction_time=construction_time,
+        first_reset_time=reset_times[0],
+        reset_time=float(np.mean(reset_times[1:])) if len(reset_times) > 1 else None,
+        step_time=step_time / n_steps,
+        step_components={name: components[name] / n_steps for name in STEP_COMPONENTS},
+        steps_per_second=n_steps / step_time,
+        time_steps_per_second=np.sum(number_of_time_steps) / step_time,
+    )
+
+
+def get_metadata():
+    """
+    Returns the versions and machine information stored with the results.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPOSITORY_DIRECTORY,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+
+    versions = {}
+    for name in ("numpy", "numba", "pyelastica", "gym"):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+
+    return dict(
+        date=datetime.now().isoformat(),
+        commit=commit or None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        versions=versions,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cases", nargs="*", default=list(CASES), choices=list(CASES),
+    )
+    parser.add_argument(
+        "--n_elem", nargs="*", type=int, default=[20, 50, 100],
+    )
+    parser.add_argument(
+        "--num_obstacles", nargs="*", type=int, default=[0, 4, 8, 12],
+    )
+    parser.add_argument(
+        "--sim_dt", nargs="*", type=float, default=[2.0e-4, 1.0e-4, 5.0e-5],
+    )
+    parser.add_argument(
+        "--callbacks",
+        action="store_true",
+        help="Also benchmark each case with call backs, COLLECT_DATA_FOR_POSTPROCESSING=True.",
+    )
+    parser.add_argument(
+        "--stepper",
+        action="store_true",
+        help="Integrate with the Elastica stepper instead of the BlockIntegrator.",
+    )
+    parser.add_argument(
+        "--n_steps", type=int, default=50,
+    )
+    parser.add_argument(
+        "--n_warmup_steps", type=int, default=5,
+    )
+    parser.add_argument(
+        "--n_resets", type=int, default=3,
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None,
+    )
+    parser.add_argument(
+        "--output", type=str, default="benchmark_results.json",
+    )
+    parser.add_argument(
+        "--worker", nargs=2, default=None, help=argparse.SUPPRESS,
+    )
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        configuration_file, result_file = args.worker
+        with open(configuration_file) as file:
+            configuration = json.load(file)
+        sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, configuration["case"]))
+        result = benchmark_configuration(configuration)
+        with open(result_file, "w") as file:
+            json.dump(result, file, default=float)
+        return
+
+    results = []
+    for configuration in get_configurations(args):
+        result = run_configuration(configuration, args.timeout)
+        result.setdefault("case", configuration["case"])
+        result.setdefault("parameter", configuration["parameter"])
+        result.setdefault("value", configuration["value"])
+        results.append(result)
+        if "error" in result:
+            print(
+                " %s %s=%s failed: %s"
+                % (result["case"], result["parameter"], result["value"], result["error"])
+            )
+        else:
+            print(
+                " %s %s=%s: reset %.3es, step %.3es, %.1f steps/s"
+                % (
+                    result["case"],
+                    result["parameter"],
+                    result["value"],
+                    result["reset_time"] or result["first_reset_time"],
+                    result["step_time"],
+                    result["steps_per_second"],
+                )
+            )
+
+    with open(args.output, "w") as file:
+        json.dump(dict(metadata=get_metadata(), results=results), file, indent=2)
+    print(" Benchmark results are written to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
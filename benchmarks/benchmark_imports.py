@@ -0,0 +1,160 @@
+__doc__ = """This script is to measure the import time of the modules used in training mode for all cases, and to check
+it against a budget. Training processes never render, so modules of the plotting stack (matplotlib, mpl_toolkits and
+post_processing) must not be imported by them, they are imported when post_processing or plot_results is called.
+
+Each case is measured in a separate process, with the case folder as the first module search path, so modules are
+not in the cache of the interpreter. Modules which cannot be imported, e.g. modules that need stable-baselines when
+it is not installed, are reported and not measured. Script exits with status 1 if a case is over the budget or
+imports a plotting module.
+
+Example, measure Case 1 and Case 4 with a budget of 0.5 seconds:
+    python benchmarks/benchmark_imports.py --cases Case1 Case4 --budget 0.5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = (
+    "Case1",
+    "Case2",
+    "Case3/ReacherSoft_Case3_main-text",
+    "Case3/ReacherSoft_Case3_SI-ctrl_pts",
+    "Case4",
+)
+
+# Modules imported by training processes, in import order.
+TRAINING_MODULES = (
+    "numba_warm_up",
+    "set_environment",
+    "batched_environment",
+    "shared_memory_vec_env",
+)
+
+# Top-level packages of the plotting stack, which training processes must not import.
+PLOTTING_MODULES = ("matplotlib", "mpl_toolkits", "post_processing")
+
+# Code run in the measured process, it prints the results as JSON in the last line.
+_WORKER_CODE = """
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+import_times = {}
+skipped = {}
+for module in %r:
+    start = time.perf_counter()
+    try:
+        __import__(module)
+    except ImportError as error:
+        skipped[module] = str(error)
+        continue
+    import_times[module] = time.perf_counter() - start
+plotting_modules = sorted({name.split(".")[0] for name in sys.modules} & set(%r))
+print(json.dumps(dict(import_times=import_times, skipped=skipped, plotting_modules=plotting_modules)))
+"""
+
+
+def measure_case(case, repeats=3):
+    """
+    This function measures the import time of the training modules of a case in new processes, and returns the
+    smallest time of the repeats.
+
+    Parameters
+    ----------
+    case : str
+        Folder of the case in the repository.
+    repeats : int
+        Number of measured processes. Default is 3.
+
+    Returns
+    -------
+    dict
+
+    """
+    result = None
+    for _ in range(repeats):
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                _WORKER_CODE % (TRAINING_MODULES, PLOTTING_MODULES),
+            ],
+            cwd=os.path.join(REPOSITORY_DIRECTORY, case),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode != 0:
+            return dict(case=case, error=process.stderr[-5000:])
+        measurement = json.loads(process.stdout.strip().splitlines()[-1])
+        measurement["import_time"] = sum(measurement["import_times"].values())
+        if result is None or measurement["import_time"] < result["import_time"]:
+            result = measurement
+    result["case"] = case
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cases", nargs="*", default=list(CASES), choices=list(CASES),
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.4,
+        help="Largest import time of the training modules of a case in seconds.",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3,
+    )
+    parser.add_argument(
+        "--output", type=str, default=None,
+    )
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for case in args.cases:
+        result = measure_case(case, args.repeats)
+        results.append(result)
+        if "error" in result:
+            failed = True
+            print(" %s failed: %s" % (case, result["error"]))
+            continue
+
+        result["within_budget"] = (
+            result["import_time"] <= args.budget and not result["plotting_modules"]
+        )
+        failed = failed or not result["within_budget"]
+        print(
+            " %s: %.3fs (%s)%s%s"
+            % (
+                case,
+                result["import_time"],
+                ", ".join(
+                    "%s %.3fs" % item for item in result["import_times"].items()
+                ),
+                ", imports " + ", ".join(result["plotting_modules"])
+                if result["plotting_modules"]
+                else "",
+                ", over budget of %.3fs" % args.budget
+                if result["import_time"] > args.budget
+                else "",
+            )
+        )
+        for module, error in result["skipped"].items():
+            print("   %s is not measured: %s" % (module, error))
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(dict(budget=args.budget, results=results), file, indent=2)
+        print(" Import times are written to " + args.output)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()